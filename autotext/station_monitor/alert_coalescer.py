@@ -0,0 +1,136 @@
+"""
+Alert Coalescer - Per-station cooldown and digest notifications
+"""
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+class AlertCoalescer:
+    """
+    Sits in front of NotificationManager during alert storms. The first alert
+    for a station goes out immediately; further alerts for that station within
+    the cooldown window are held and combined, across all stations, into one
+    digest sent every digest_interval seconds (or sooner if max_digest
+    alerts pile up). Each named metric of a station counts as a station of
+    its own here.
+    """
+    
+    def __init__(self, notification_manager, config):
+        coalescing_config = config.config.get("notifications", {}).get("coalescing", {})
+        self.notification_manager = notification_manager
+        self.enabled = coalescing_config.get("enabled", True)
+        self.cooldown = coalescing_config.get("cooldown", 300)
+        self.digest_interval = coalescing_config.get("digest_interval", 300)
+        self.max_digest = coalescing_config.get("max_digest", 50)
+        
+        self._lock = threading.Lock()
+        self._last_sent: Dict[Tuple[str, Optional[int]], float] = {}
+        self._pending: Dict[Tuple[str, Optional[int]], Dict] = {}
+        self._pending_count = 0
+        self._timer: Optional[threading.Timer] = None
+        
+        self.sent_immediately = 0
+        self.coalesced = 0
+        self.digests_sent = 0
+    
+    @staticmethod
+    def _key(station_data: Dict) -> Tuple[str, Optional[int]]:
+        """A station's own alerts and each of its metrics have separate cooldowns"""
+        return station_data.get('phone_number') or station_data.get('name', ''), station_data.get('metric_id')
+    
+    def admit(self, station_data: Dict, value: float) -> bool:
+        """
+        Decide whether an alert should be sent now. Returns False if it was
+        held for the next digest instead.
+        """
+        if not self.enabled:
+            return True
+        
+        key = self._key(station_data)
+        now = time.monotonic()
+        flush_now = False
+        
+        with self._lock:
+            last = self._last_sent.get(key)
+            if last is None or now - last >= self.cooldown:
+                self._last_sent[key] = now
+                self.sent_immediately += 1
+                return True
+            
+            entry = self._pending.get(key)
+            if entry is None:
+                entry = self._pending[key] = {
+                    'station': dict(station_data),
+                    'count': 0,
+                    'lowest': value,
+                    'highest': value
+                }
+            entry['count'] += 1
+            entry['latest'] = value
+            entry['lowest'] = min(entry['lowest'], value)
+            entry['highest'] = max(entry['highest'], value)
+            self._pending_count += 1
+            self.coalesced += 1
+            
+            if self._pending_count >= self.max_digest:
+                flush_now = True
+            elif self._timer is None:
+                self._timer = threading.Timer(self.digest_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        
+        if flush_now:
+            threading.Thread(target=self.flush, daemon=True).start()
+        return False
+    
+    def _take_pending(self) -> List[Dict]:
+        """Cancel the timer and take the held alerts, counting them as a digest sent"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            entries = list(self._pending.values())
+            self._pending = {}
+            self._pending_count = 0
+            if not entries:
+                return []
+            # The digest counts as this station's notification
+            now = time.monotonic()
+            for entry in entries:
+                self._last_sent[self._key(entry['station'])] = now
+            self.digests_sent += 1
+            return entries
+    
+    def flush(self) -> List:
+        """Send held alerts as one digest. Returns the delivery results."""
+        entries = self._take_pending()
+        if not entries:
+            return []
+        try:
+            return self.notification_manager.dispatch_digest(entries)
+        except Exception as e:
+            print(f"Error sending alert digest: {e}")
+            return []
+    
+    def stop(self):
+        """
+        Cancel the digest timer. Held alerts go to the notification outbox as
+        one digest, or are sent now if there is no outbox.
+        """
+        entries = self._take_pending()
+        if not entries:
+            return
+        try:
+            if not self.notification_manager.defer_digest(entries):
+                self.notification_manager.dispatch_digest(entries)
+        except Exception as e:
+            print(f"Error saving held alerts: {e}")
+    
+    def get_metrics(self) -> Dict:
+        with self._lock:
+            return {
+                'sent_immediately': self.sent_immediately,
+                'coalesced': self.coalesced,
+                'pending': self._pending_count,
+                'digests_sent': self.digests_sent
+            }
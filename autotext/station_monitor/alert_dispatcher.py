@@ -0,0 +1,164 @@
+"""
+Alert Dispatcher - Send alert notifications off the receiver threads
+"""
+import queue
+import threading
+import time
+from typing import Dict, Optional
+
+class AlertDispatcher:
+    """
+    Queue out-of-range alerts and send them from worker threads, so a slow
+    SMTP server or SMS API never delays ingestion of other messages.
+    """
+    
+    def __init__(self, config, notification_manager=None, workers: Optional[int] = None,
+                 max_queue: Optional[int] = None, coalescer=None):
+        from notifications import NotificationManager
+        
+        dispatch_config = config.config.get("alert_dispatch", {})
+        self.config = config
+        self.notification_manager = notification_manager or NotificationManager(config)
+        self.coalescer = coalescer
+        self.workers = workers or dispatch_config.get("workers", 2)
+        self.batch_size = dispatch_config.get("batch_size", 10)
+        self.queue = queue.Queue(maxsize=max_queue or dispatch_config.get("max_queue", 1000))
+        self.running = False
+        self.threads = []
+        
+        self._metrics_lock = threading.Lock()
+        self._enqueued = 0
+        self._dispatched = 0
+        self._failed = 0
+        self._dropped = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+        self._latency_last = 0.0
+    
+    def start(self):
+        """Start the worker threads"""
+        if self.running:
+            return
+        
+        self.running = True
+        self.threads = [
+            threading.Thread(target=self._worker, name=f"alert-dispatch-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in self.threads:
+            thread.start()
+    
+    def stop(self, timeout: float = 5):
+        """
+        Stop the workers after they finish the alert in hand. Alerts still
+        queued are stored in the notification outbox, if there is one, and
+        sent after the next start. The coalescer stops last, once no worker
+        can hold another alert in it.
+        """
+        self.running = False
+        for thread in self.threads:
+            thread.join(timeout=timeout)
+        self.threads = []
+        
+        leftover = []
+        while True:
+            try:
+                _, station_data, value = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            leftover.append((station_data, value))
+            self.queue.task_done()
+        if leftover:
+            try:
+                stored = self.notification_manager.defer_alerts(leftover)
+                if not stored:
+                    print(f"Discarded {len(leftover)} queued alerts on shutdown")
+            except Exception as e:
+                print(f"Error saving queued alerts: {e}")
+        if self.coalescer:
+            self.coalescer.stop()
+    
+    def enqueue(self, station: Dict, value: float) -> bool:
+        """
+        Queue an alert for a station reading. Never blocks; returns False if
+        the queue is full and the alert was dropped.
+        """
+        station_data = {
+            'name': station['name'],
+            'phone_number': station['phone_number'],
+            'min_value': station['min_value'],
+            'max_value': station['max_value'],
+            'metric_id': station.get('metric_id'),
+            'value': value
+        }
+        
+        try:
+            self.queue.put_nowait((time.perf_counter(), station_data, value))
+        except queue.Full:
+            with self._metrics_lock:
+                self._dropped += 1
+            print(f"Alert queue full, dropped alert for {station['name']}")
+            return False
+        
+        with self._metrics_lock:
+            self._enqueued += 1
+        return True
+    
+    def _worker(self):
+        """Send queued alerts until stopped, batching whatever has backed up"""
+        while self.running:
+            try:
+                batch = [self.queue.get(timeout=0.5)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            
+            success = False
+            try:
+                alerts = [(station_data, value) for _, station_data, value in batch]
+                if self.coalescer:
+                    # Alerts inside a station's cooldown wait for the digest
+                    alerts = [alert for alert in alerts if self.coalescer.admit(*alert)]
+                results = self.notification_manager.dispatch_alerts(alerts) if alerts else []
+                success = all(result.success for result in results)
+            except Exception as e:
+                print(f"Error sending notifications: {e}")
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+            
+            now = time.perf_counter()
+            with self._metrics_lock:
+                for enqueued_at, _, _ in batch:
+                    latency = now - enqueued_at
+                    self._dispatched += 1
+                    if not success:
+                        self._failed += 1
+                    self._latency_total += latency
+                    self._latency_max = max(self._latency_max, latency)
+                    self._latency_last = latency
+    
+    def get_metrics(self) -> Dict:
+        """
+        Queue depth plus counters and dispatch latency (seconds from enqueue
+        until every channel has been tried)
+        """
+        with self._metrics_lock:
+            dispatched = self._dispatched
+            metrics = {
+                'queue_depth': self.queue.qsize(),
+                'enqueued': self._enqueued,
+                'dispatched': dispatched,
+                'failed': self._failed,
+                'dropped': self._dropped,
+                'latency_avg': self._latency_total / dispatched if dispatched else 0.0,
+                'latency_max': self._latency_max,
+                'latency_last': self._latency_last
+            }
+        if self.coalescer:
+            metrics['coalescing'] = self.coalescer.get_metrics()
+        return metrics
@@ -0,0 +1,90 @@
+"""
+Benchmark reading ingestion throughput.
+
+Compares the old connect-per-call pattern against the pooled Database
+connections. Run from the station_monitor directory:
+
+    python benchmarks/bench_database.py [--readings 2000]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+
+
+def add_reading_connect_per_call(db_path: str, station_id: int, value: float, raw_message: str) -> int:
+    """Reproduction of the original add_reading, one connection per call"""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("SELECT min_value, max_value FROM stations WHERE id=?", (station_id,))
+    station = cursor.fetchone()
+    is_alert = 0
+    if station:
+        min_val, max_val = station
+        is_alert = 1 if (value < min_val or value > max_val) else 0
+    cursor.execute("""
+        INSERT INTO readings (station_id, value, raw_message, is_alert)
+        VALUES (?, ?, ?, ?)
+    """, (station_id, value, raw_message, is_alert))
+    reading_id = cursor.lastrowid
+    if is_alert:
+        cursor.execute("INSERT INTO alerts (reading_id) VALUES (?)", (reading_id,))
+    conn.commit()
+    conn.close()
+    return reading_id
+
+
+def run(label: str, count: int, add):
+    start = time.perf_counter()
+    for i in range(count):
+        value = 50.0 + (i % 40)
+        add(value, f"Station 1 - {value}")
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {count:>7} readings  {elapsed:8.3f}s  {count / elapsed:10.1f} readings/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--readings", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Before: rollback journal, fresh connection per reading
+        before_path = os.path.join(tmp, "before.db")
+        db = Database(before_path)
+        station_id = db.add_station("Bench", "+15550000000", 40.0, 80.0)
+        db.close()
+        conn = sqlite3.connect(before_path)
+        conn.execute("PRAGMA journal_mode=DELETE")
+        conn.close()
+        run("connect per call", args.readings,
+            lambda value, raw: add_reading_connect_per_call(before_path, station_id, value, raw))
+
+        # After: pooled per-thread connection with WAL
+        db = Database(os.path.join(tmp, "after.db"))
+        station_id = db.add_station("Bench", "+15550000000", 40.0, 80.0)
+        run("pooled Database", args.readings,
+            lambda value, raw: db.add_reading(station_id, value, raw))
+        db.close()
+
+        # Bulk: one transaction for the whole backlog
+        db = Database(os.path.join(tmp, "bulk.db"))
+        station_id = db.add_station("Bench", "+15550000000", 40.0, 80.0)
+        rows = [(station_id, 50.0 + (i % 40), f"Station 1 - {50.0 + (i % 40)}", None)
+                for i in range(args.readings)]
+        start = time.perf_counter()
+        db.add_readings_bulk(rows)
+        elapsed = time.perf_counter() - start
+        print(f"{'add_readings_bulk':<28} {args.readings:>7} readings  {elapsed:8.3f}s  "
+              f"{args.readings / elapsed:10.1f} readings/s")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
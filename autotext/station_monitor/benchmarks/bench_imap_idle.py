@@ -0,0 +1,238 @@
+"""
+Benchmark email ingest latency against a local IMAP stand-in server.
+
+Delivers forwarded-SMS emails to an in-memory mailbox and measures the
+time until each reading is in the database, with EmailReceiver waiting in
+IDLE versus polling every --interval seconds. Run from the station_monitor
+directory:
+
+    python benchmarks/bench_imap_idle.py [--messages 5] [--interval 5]
+"""
+import argparse
+import os
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from database import Database
+from imap_client import FETCH_HEADERS
+from sms_receiver import EmailReceiver
+
+FETCHED_HEADERS = [name.encode() for name in FETCH_HEADERS.split()]
+
+
+class Mailbox:
+    """Messages as [uid, raw bytes, seen] shared by every session"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.messages = []
+        self.next_uid = 1
+        self.uidvalidity = 1
+        self.idlers = []
+
+    def deliver(self, raw: bytes):
+        with self.lock:
+            self.messages.append([self.next_uid, raw, False])
+            self.next_uid += 1
+            count = len(self.messages)
+            idlers = list(self.idlers)
+        for notify in idlers:
+            notify(count)
+
+
+class IMAPStandIn(socketserver.StreamRequestHandler):
+    """Just enough IMAP4rev1 plus IDLE for EmailReceiver"""
+
+    mailbox: Mailbox = None
+    capabilities = "IMAP4rev1 IDLE"
+    disable_nagle_algorithm = True
+
+    reported = 0  # message count last announced to this session
+
+    def send(self, text: str):
+        self.wfile.write(text.encode() + b"\r\n")
+        self.wfile.flush()
+
+    def handle(self):
+        self.write_lock = threading.Lock()
+        self.send(f"* OK [CAPABILITY {self.capabilities}] stand-in ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            tag, command, *rest = line.decode().rstrip("\r\n").split(" ", 2)
+            args = rest[0] if rest else ""
+            command = command.upper()
+            if command == "UID":
+                command, _, args = args.partition(" ")
+                command = "UID " + command.upper()
+            handler = getattr(self, "do_" + command.replace(" ", "_"), None)
+            if handler is None:
+                self.send(f"{tag} BAD unsupported")
+            elif handler(tag, args) is False:
+                return
+
+    def do_CAPABILITY(self, tag, args):
+        self.send(f"* CAPABILITY {self.capabilities}")
+        self.send(f"{tag} OK done")
+
+    def do_LOGIN(self, tag, args):
+        self.send(f"{tag} OK logged in")
+
+    def do_SELECT(self, tag, args):
+        with self.mailbox.lock:
+            self.reported = len(self.mailbox.messages)
+            self.send(f"* {self.reported} EXISTS")
+            self.send(f"* OK [UIDVALIDITY {self.mailbox.uidvalidity}] valid")
+            self.send(f"* OK [UIDNEXT {self.mailbox.next_uid}] next")
+        self.send(f"{tag} OK [READ-WRITE] selected")
+
+    def do_NOOP(self, tag, args):
+        with self.mailbox.lock:
+            self.reported = len(self.mailbox.messages)
+            self.send(f"* {self.reported} EXISTS")
+        self.send(f"{tag} OK noop")
+
+    def do_UID_SEARCH(self, tag, args):
+        with self.mailbox.lock:
+            found = [str(uid) for uid, _, seen in self.mailbox.messages
+                     if args.upper() != "UNSEEN" or not seen]
+        self.send("* SEARCH " + " ".join(found))
+        self.send(f"{tag} OK search")
+
+    def _uid_matches(self, uid_set: str, uid: int, highest: int) -> bool:
+        for part in uid_set.split(","):
+            low, _, high = part.partition(":")
+            low = int(low)
+            high = low if not high else (highest if high == "*" else int(high))
+            if min(low, high) <= uid <= max(low, high):
+                return True
+        return False
+
+    def do_UID_FETCH(self, tag, args):
+        uid_set = args.split(" ", 1)[0]
+        with self.mailbox.lock:
+            highest = self.mailbox.messages[-1][0] if self.mailbox.messages else 0
+            for seq, (uid, raw, _) in enumerate(self.mailbox.messages, 1):
+                if not self._uid_matches(uid_set, uid, highest):
+                    continue
+                head, _, text = raw.partition(b"\r\n\r\n")
+                wanted = [line for line in head.split(b"\r\n")
+                          if line.split(b":")[0].upper() in FETCHED_HEADERS]
+                header = b"\r\n".join(wanted) + b"\r\n\r\n"
+                self.wfile.write(
+                    f"* {seq} FETCH (UID {uid} BODY[HEADER.FIELDS ({FETCH_HEADERS})] "
+                    f"{{{len(header)}}}\r\n".encode() + header +
+                    f" BODY[TEXT] {{{len(text)}}}\r\n".encode() + text + b")\r\n"
+                )
+        self.send(f"{tag} OK fetch")
+
+    def do_UID_STORE(self, tag, args):
+        uid_set = args.split(" ", 1)[0]
+        with self.mailbox.lock:
+            highest = self.mailbox.messages[-1][0] if self.mailbox.messages else 0
+            for message in self.mailbox.messages:
+                if self._uid_matches(uid_set, message[0], highest) and "\\Seen" in args:
+                    message[2] = True
+        self.send(f"{tag} OK store")
+
+    def do_IDLE(self, tag, args):
+        def notify(count):
+            with self.write_lock:
+                self.reported = count
+                self.send(f"* {count} EXISTS")
+        self.send("+ idling")
+        with self.mailbox.lock:
+            self.mailbox.idlers.append(notify)
+            # Announce mail that arrived since this session last heard
+            if len(self.mailbox.messages) > self.reported:
+                notify(len(self.mailbox.messages))
+        try:
+            self.rfile.readline()  # DONE
+        finally:
+            with self.mailbox.lock:
+                self.mailbox.idlers.remove(notify)
+        with self.write_lock:
+            self.send(f"{tag} OK idle done")
+
+    def do_CLOSE(self, tag, args):
+        self.send(f"{tag} OK closed")
+
+    def do_LOGOUT(self, tag, args):
+        self.send("* BYE logging out")
+        self.send(f"{tag} OK bye")
+        return False
+
+
+class StandInServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def forwarded_sms(phone: str, text: str) -> bytes:
+    return (f"From: {phone}@sms.example.com\r\nTo: monitor@example.com\r\n"
+            f"Message-ID: <{time.time_ns()}@sms.example.com>\r\n"
+            f"Subject: SMS\r\nContent-Type: text/plain\r\n\r\n{text}\r\n").encode()
+
+
+def run(label: str, use_idle: bool, count: int, interval: float):
+    mailbox = Mailbox()
+    handler = type("Handler", (IMAPStandIn,), {"mailbox": mailbox})
+    server = StandInServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    workdir = tempfile.mkdtemp()
+    db = Database(os.path.join(workdir, "bench.db"))
+    db.init_database()
+    db.add_station("Bench", "+15550000000", 0, 1000)
+
+    config = Config(os.path.join(workdir, "missing.json"))
+    config.config["email"].update({
+        "imap_server": "127.0.0.1", "imap_port": server.server_address[1], "imap_ssl": False,
+        "email_address": "monitor@example.com", "password": "x",
+        "use_idle": use_idle, "check_interval": interval
+    })
+
+    received = threading.Event()
+    receiver = EmailReceiver(config, db, lambda station, value, text: received.set())
+    receiver.start()
+    time.sleep(0.5)
+
+    latencies = []
+    try:
+        for i in range(count):
+            received.clear()
+            start = time.perf_counter()
+            mailbox.deliver(forwarded_sms("5550000000", f"{50 + i}"))
+            if not received.wait(interval * 2 + 5):
+                print(f"{label}: message {i} not received")
+                continue
+            latencies.append(time.perf_counter() - start)
+    finally:
+        receiver.stop()
+        server.shutdown()
+        db.close()
+
+    if latencies:
+        print(f"{label:<10} {len(latencies):>3} messages  avg {sum(latencies) / len(latencies) * 1000:9.1f} ms"
+              f"  max {max(latencies) * 1000:9.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=5)
+    parser.add_argument("--interval", type=float, default=5)
+    args = parser.parse_args()
+
+    run("IDLE", True, args.messages, args.interval)
+    run("polling", False, args.messages, args.interval)
+
+
+if __name__ == "__main__":
+    main()
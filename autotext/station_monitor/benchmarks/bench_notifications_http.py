@@ -0,0 +1,86 @@
+"""
+Benchmark notification HTTP throughput against a local stand-in server.
+
+Compares a bare requests.post per message (a new connection each time)
+with NotificationManager's pooled keep-alive sessions. The stand-in speaks
+plain HTTP, so real providers gain more: each reused connection also skips
+a TLS handshake. Run from the station_monitor directory:
+
+    python benchmarks/bench_notifications_http.py [--messages 500] [--concurrency 8]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from notifications import NotificationManager
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Accepts any POST with 200 OK, keeping the connection open"""
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without this, Nagle plus
+    # delayed ACKs stall every keep-alive response by ~40ms
+    disable_nagle_algorithm = True
+    
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+
+def run(label: str, count: int, concurrency: int, send):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda i: send(i), range(count)))
+    elapsed = time.perf_counter() - start
+    failures = results.count(False)
+    print(f"{label:<24} {count:>6} messages  {elapsed:8.3f}s  {count / elapsed:10.1f} msg/s  failures={failures}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/push"
+
+    config = Config(os.path.join(tempfile.gettempdir(), "bench_notifications_missing.json"))
+    config.config["notifications"]["push"]["webhook_url"] = url
+    config.config["http"]["pool_size"] = args.concurrency
+    manager = NotificationManager(config)
+    station = {"name": "Bench", "phone_number": "+15550000000", "min_value": 40.0, "max_value": 80.0, "value": 90.0}
+    payload = {"title": "Alert", "message": "Bench", "type": "alert"}
+
+    try:
+        run("bare requests.post", args.messages, args.concurrency,
+            lambda i: requests.post(url, json=payload, timeout=10).status_code == 200)
+        run("pooled session", args.messages, args.concurrency,
+            lambda i: manager.send_push_notification("Alert", "Bench", station))
+    finally:
+        manager.close()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
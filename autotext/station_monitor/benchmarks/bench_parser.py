@@ -0,0 +1,121 @@
+"""
+Benchmark message parsing over a corpus of real message formats.
+
+Compares the original parse_value (two regexes through the re module
+cache, first number wins) with the compiled MessageParser, one message at
+a time and through parse_many, and lists the messages whose parsed value
+changed. Run from the station_monitor directory:
+
+    python benchmarks/bench_parser.py [--messages 100000]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from message_parser import MessageParser
+
+# (format, station template or None); {v} is replaced by a reading
+CORPUS_FORMATS = [
+    ("{v}", None),
+    (" {v}\n", None),
+    ("Station 1 - {v}", None),
+    ("Station 12 - {v}", None),
+    ("Stn #4: {v}", None),
+    ("Reading: {v}", None),
+    ("Value is {v}", None),
+    ("Level {v} ft", None),
+    ("LIFT STATION 3 WET WELL {v} FT", "WET WELL {value} FT"),
+    ("Pump 2 on, pressure {v} psi", "pressure {value} psi"),
+    ("Tank A2 {v}% full", "{value}%"),
+]
+
+# Station labels next to the reading: (message, expected value)
+LABEL_CASES = [
+    ("Station 56.893", 56.893),
+    ("Site 12.5", 12.5),
+    ("station 7.25 ft", 7.25),
+    ("Stn 3.5", 3.5),
+    ("Unit 42 psi", 42.0),
+    ("unit 5", 5.0),
+    ("Station 3", 3.0),
+    ("Station 1 - 56.893", 56.893),
+    ("Stn #4: 12", 12.0),
+    ("Site A2 7.5", 7.5),
+]
+
+
+def parse_value_original(message: str):
+    """Reproduction of the original parse_value"""
+    patterns = [
+        r'[-]?\d+\.\d+',  # Decimal number
+        r'[-]?\d+',       # Integer
+    ]
+    for pattern in patterns:
+        match = re.search(pattern, message)
+        if match:
+            try:
+                return float(match.group())
+            except ValueError:
+                continue
+    return None
+
+
+def build_corpus(count: int, seed: int = 7):
+    rng = random.Random(seed)
+    messages, templates = [], []
+    for _ in range(count):
+        text, template = rng.choice(CORPUS_FORMATS)
+        reading = f"{rng.uniform(0, 150):.3f}" if rng.random() < 0.7 else str(rng.randint(0, 150))
+        messages.append(text.replace("{v}", reading))
+        templates.append(template)
+    return messages, templates
+
+
+def timed(label: str, count: int, func):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed * 1000:9.1f} ms  {count / elapsed:12,.0f} msg/s")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=100000)
+    args = parser.parse_args()
+
+    messages, templates = build_corpus(args.messages)
+    engine = MessageParser()
+
+    original = timed("original parse_value", len(messages),
+                     lambda: [parse_value_original(m) for m in messages])
+    timed("compiled parse_value", len(messages),
+          lambda: [engine.parse_value(m) for m in messages])
+    single = timed("  with station templates", len(messages),
+                   lambda: [engine.parse_value(m, t) for m, t in zip(messages, templates)])
+    batch = timed("parse_many", len(messages),
+                  lambda: engine.parse_many(messages, templates))
+    assert batch == single
+
+    changed = {}
+    for message, old, new in zip(messages, original, single):
+        if old != new:
+            changed.setdefault(message, (old, new))
+    print(f"\n{len(changed)} distinct messages parse differently, e.g.:")
+    for message, (old, new) in list(changed.items())[:8]:
+        print(f"  {message.strip()!r:<36} {old} -> {new}")
+
+    print("\nStation labels:")
+    for message, expected in LABEL_CASES:
+        value = engine.parse_value(message)
+        status = "ok" if value == expected else f"WRONG, expected {expected}"
+        print(f"  {message!r:<36} {value}  {status}")
+
+
+if __name__ == "__main__":
+    main()
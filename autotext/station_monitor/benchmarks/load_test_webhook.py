@@ -0,0 +1,141 @@
+"""
+Load test the webhook receiver and report sustained requests per second.
+
+By default starts a WebhookReceiver in-process on a free port with a
+temporary database and one station per --stations. Keep-alive clients
+POST readings for --duration seconds; the report covers acknowledged
+requests, acknowledgement latency, and how fast the writer stored the
+readings. Use --url to load an already running app instead. Run from the
+station_monitor directory:
+
+    python benchmarks/load_test_webhook.py [--duration 10] [--concurrency 32] [--batch 1]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from database import Database
+
+
+def phone_for(station: int) -> str:
+    return f"+1555{station:07d}"
+
+
+async def client(host: str, port: int, path: str, deadline: float, batch: int,
+                 stations: int, worker: int, latencies: list, statuses: dict):
+    reader, writer = await asyncio.open_connection(host, port)
+    sent = 0
+    try:
+        while time.perf_counter() < deadline:
+            messages = [
+                {"phone": phone_for((worker + sent + i) % stations), "message": f"{50 + (sent + i) % 40}",
+                 "id": f"{worker}-{sent + i}"}
+                for i in range(batch)
+            ]
+            body = json.dumps(messages[0] if batch == 1 else {"messages": messages}).encode()
+            request = (f"POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                       f"Content-Length: {len(body)}\r\n\r\n").encode() + body
+            start = time.perf_counter()
+            writer.write(request)
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            for line in head.split(b"\r\n"):
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":", 1)[1])
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - start)
+            status = int(head.split(b" ", 2)[1])
+            statuses[status] = statuses.get(status, 0) + 1
+            sent += batch
+    finally:
+        writer.close()
+
+
+async def load(url: str, duration: float, concurrency: int, batch: int, stations: int):
+    parts = urlsplit(url)
+    latencies, statuses = [], {}
+    deadline = time.perf_counter() + duration
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        client(parts.hostname, parts.port or 80, parts.path or "/webhook", deadline, batch,
+               stations, worker, latencies, statuses)
+        for worker in range(concurrency)
+    ))
+    return time.perf_counter() - start, latencies, statuses
+
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", help="load an already running receiver, e.g. http://localhost:5000/webhook")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--batch", type=int, default=1, help="messages per request")
+    parser.add_argument("--stations", type=int, default=200)
+    args = parser.parse_args()
+
+    receiver = db = None
+    url = args.url
+    if url is None:
+        from webhook_receiver import WebhookReceiver
+
+        workdir = tempfile.mkdtemp()
+        db = Database(os.path.join(workdir, "load_test.db"))
+        db.init_database()
+        for station in range(args.stations):
+            db.add_station(f"Station {station}", phone_for(station), 40.0, 80.0)
+        config = Config(os.path.join(workdir, "missing.json"))
+        config.config["webhook"].update({"host": "127.0.0.1", "port": 0})
+        receiver = WebhookReceiver(config, db)
+        receiver.start()
+        receiver.ready.wait(5)
+        receiver_started = time.perf_counter()
+        url = f"http://127.0.0.1:{receiver.port}/webhook"
+
+    # The receiver prints every reading; keep the report readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        elapsed, latencies, statuses = asyncio.run(
+            load(url, args.duration, args.concurrency, args.batch, args.stations)
+        )
+        if receiver is not None:
+            # Let the writer catch up, then see how fast it stored readings
+            while receiver.get_metrics()['processed'] < receiver.get_metrics()['accepted']:
+                time.sleep(0.01)
+            stored_in = time.perf_counter() - receiver_started
+            receiver.stop()
+
+    requests_done = len(latencies)
+    print(f"{requests_done} requests in {elapsed:.2f}s with {args.concurrency} connections, "
+          f"{args.batch} message(s) per request")
+    print(f"  sustained   {requests_done / elapsed:10.1f} req/s  {requests_done * args.batch / elapsed:10.1f} msg/s")
+    print(f"  ack latency p50 {percentile(latencies, 0.5) * 1000:.2f} ms  "
+          f"p99 {percentile(latencies, 0.99) * 1000:.2f} ms")
+    print(f"  statuses    {statuses}")
+
+    if receiver is not None:
+        metrics = receiver.get_metrics()
+        print(f"  stored      {metrics['processed']} of {metrics['accepted']} accepted messages in {stored_in:.2f}s "
+              f"({metrics['processed'] / stored_in:.1f} msg/s), {metrics['rejected']} rejected as queue full")
+        print(f"  {'stage':<10} {'batch avg':>9} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+        for name, stage in receiver.ingestion.get_metrics()['stages'].items():
+            latency = stage['latency']
+            print(f"  {name:<10} {stage['processed'] / max(stage['batches'], 1):9.1f} {latency['p50'] * 1000:8.2f} "
+                  f"{latency['p99'] * 1000:8.2f} {latency['max'] * 1000:8.2f}")
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -8,11 +8,15 @@ class Config:
         self.config_file = config_file
         self.default_config = {
             "sms_method": "manual",  # manual, twilio, email, webhook
+            "receivers": [],  # methods run together, e.g. ["email", "webhook"]; empty means sms_method
             "twilio": {
                 "account_sid": "",
                 "auth_token": "",
                 "phone_number": "",
-                "enabled": False
+                "enabled": False,
+                "webhook_path": "/twilio/sms",  # served on the webhook port
+                "webhook_url": "",  # public URL set in the Twilio console, if behind a proxy
+                "validate_signature": True
             },
             "email": {
                 "imap_server": "",
@@ -20,11 +24,54 @@ class Config:
                 "email_address": "",
                 "password": "",
                 "enabled": False,
-                "check_interval": 60  # seconds
+                "check_interval": 60,  # seconds; only used if the server lacks IDLE
+                "imap_ssl": True,
+                "use_idle": True,
+                "idle_timeout": 300,  # seconds before IDLE is renewed
+                "reconnect_max_backoff": 300,  # seconds
+                "flush_timeout": 60  # seconds to wait for readings to be stored
             },
             "webhook": {
                 "port": 5000,
-                "enabled": False
+                "enabled": False,
+                "host": "0.0.0.0",
+                "api_key": "",  # if set, requests need "Authorization: Bearer <api_key>"
+                "max_body": 1048576  # bytes
+            },
+            "parsing": {
+                "formats": []  # extra regexes with a (?P<value>...) group, tried before the defaults
+            },
+            "ingestion": {
+                "max_queue": 10000,  # messages waiting at each stage
+                "batch_size": 200,  # messages handled together at each stage
+                # workers, batch_size and max_queue for single stages: receive,
+                # parse, enrich, persist, evaluate, notify
+                "stages": {
+                    "persist": {"workers": 1},  # SQLite writes one transaction at a time
+                    "notify": {"workers": 1, "batch_size": 50}
+                }
+            },
+            "dedup": {
+                "lru_size": 10000,  # recent message IDs held in memory
+                "max_entries": 200000,  # message IDs kept in the database
+                "retention_days": 30,
+                "error_rate": 0.001,  # Bloom filter false positive rate
+                "prune_interval": 3600  # seconds
+            },
+            "alert_dispatch": {
+                "workers": 2,
+                "max_queue": 1000,
+                "batch_size": 10,  # alerts sent together when the queue backs up
+                "fanout_workers": 16,  # concurrent sends per alert
+                "deadline": 30  # seconds to wait for all recipients
+            },
+            "http": {
+                "pool_size": 16,  # keep-alive connections per provider host
+                "retries": 2,
+                "backoff_factor": 0.5
+            },
+            "ui": {
+                "frame_rate": 10  # receiver updates applied to the dashboard per second, at most
             },
             "notifications": {
                 "email": {
@@ -33,7 +80,9 @@ class Config:
                     "smtp_port": 587,
                     "from_email": "",
                     "password": "",
-                    "to_emails": []
+                    "to_emails": [],
+                    "use_tls": True,
+                    "idle_timeout": 60  # seconds before an unused SMTP connection is closed
                 },
                 "sms": {
                     "enabled": False,
@@ -44,6 +93,26 @@ class Config:
                     "enabled": False,
                     "webhook_url": "",
                     "api_key": ""
+                },
+                "coalescing": {
+                    "enabled": True,
+                    "cooldown": 300,  # seconds between immediate alerts per station
+                    "digest_interval": 300,  # seconds between digests of held alerts
+                    "max_digest": 50  # send the digest early once this many are held
+                },
+                "outbox": {
+                    "poll_interval": 5,  # seconds between checks for due retries
+                    "batch_size": 20,
+                    "max_attempts": 8,
+                    "backoff_base": 30,  # seconds before the first retry, doubled each time
+                    "backoff_max": 3600,
+                    "retention_days": 7,  # delivered entries are purged after this
+                    "rate_limits": {  # sends per minute per provider
+                        "smtp": 30,
+                        "twilio": 60,
+                        "vonage": 30,
+                        "push": 120
+                    }
                 }
             },
             "sms_providers": {
@@ -111,6 +180,11 @@ class Config:
         """Get current SMS reception method"""
         return self.config.get("sms_method", "manual")
     
+    def get_receiver_methods(self):
+        """SMS methods to run receivers for, all at once"""
+        methods = self.config.get("receivers") or [self.get_sms_method()]
+        return [method for method in dict.fromkeys(methods) if method != "manual"]
+    
     def set_sms_method(self, method):
         """Set SMS reception method"""
         if method in ["manual", "twilio", "email", "webhook"]:
@@ -1,15 +1,308 @@
 import sqlite3
 import json
+import threading
+import time
+import weakref
+import calendar
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Iterable, Tuple, Union, NamedTuple, Any
+from station_registry import StationRegistry
+
+# Pragmas applied to every connection. WAL lets the dashboard read while
+# receiver threads write; NORMAL sync is durable across app crashes in WAL mode.
+CONNECTION_PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-8000",  # ~8 MB page cache
+    "PRAGMA busy_timeout=5000",
+]
+
+# Schema migrations, applied in order on startup. The applied version is kept
+# in PRAGMA user_version so existing monitoring.db files upgrade in place.
+# Append new (version, statements) entries; never edit a released one.
+MIGRATIONS = [
+    (1, [
+        # get_station_history / graph queries: WHERE station_id ORDER BY received_at
+        "CREATE INDEX IF NOT EXISTS idx_readings_station_received ON readings (station_id, received_at)",
+        # get_active_alerts: WHERE acknowledged = 0
+        "CREATE INDEX IF NOT EXISTS idx_alerts_acknowledged ON alerts (acknowledged)",
+        # add_resolution_notes and history joins: alerts by reading_id
+        "CREATE INDEX IF NOT EXISTS idx_alerts_reading_id ON alerts (reading_id)",
+    ]),
+    (2, [
+        # Latest reading per station, kept current by trigger so the dashboard
+        # query is O(stations) regardless of history size
+        """
+        CREATE TABLE IF NOT EXISTS station_latest (
+            station_id INTEGER PRIMARY KEY,
+            reading_id INTEGER NOT NULL,
+            value REAL NOT NULL,
+            is_alert INTEGER DEFAULT 0,
+            received_at TIMESTAMP
+        )
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_readings_latest AFTER INSERT ON readings
+        BEGIN
+            INSERT OR REPLACE INTO station_latest (station_id, reading_id, value, is_alert, received_at)
+            VALUES (NEW.station_id, NEW.id, NEW.value, NEW.is_alert, NEW.received_at);
+        END
+        """,
+        """
+        INSERT OR REPLACE INTO station_latest (station_id, reading_id, value, is_alert, received_at)
+        SELECT station_id, id, value, is_alert, received_at FROM readings
+        WHERE id IN (SELECT MAX(id) FROM readings GROUP BY station_id)
+        """,
+    ]),
+    (3, [
+        # Per-station minute/hour/day aggregates, maintained by trigger.
+        # bucket_start is epoch seconds (UTC) rounded down to the resolution.
+        """
+        CREATE TABLE IF NOT EXISTS reading_rollups (
+            station_id INTEGER NOT NULL,
+            resolution INTEGER NOT NULL,
+            bucket_start INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            min_value REAL NOT NULL,
+            max_value REAL NOT NULL,
+            sum_value REAL NOT NULL,
+            sum_squares REAL NOT NULL,
+            alert_count INTEGER NOT NULL,
+            PRIMARY KEY (station_id, resolution, bucket_start)
+        ) WITHOUT ROWID
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_readings_rollup AFTER INSERT ON readings
+        BEGIN
+            INSERT INTO reading_rollups (station_id, resolution, bucket_start, count,
+                                         min_value, max_value, sum_value, sum_squares, alert_count)
+            SELECT NEW.station_id, r.column1,
+                   CAST(strftime('%s', NEW.received_at) AS INTEGER) / r.column1 * r.column1,
+                   1, NEW.value, NEW.value, NEW.value, NEW.value * NEW.value, NEW.is_alert
+            FROM (VALUES (60), (3600), (86400)) r WHERE 1
+            ON CONFLICT (station_id, resolution, bucket_start) DO UPDATE SET
+                count = count + 1,
+                min_value = MIN(min_value, excluded.min_value),
+                max_value = MAX(max_value, excluded.max_value),
+                sum_value = sum_value + excluded.sum_value,
+                sum_squares = sum_squares + excluded.sum_squares,
+                alert_count = alert_count + excluded.alert_count;
+        END
+        """,
+        """
+        INSERT OR REPLACE INTO reading_rollups
+        SELECT station_id, r.column1,
+               CAST(strftime('%s', received_at) AS INTEGER) / r.column1 * r.column1 AS bucket_start,
+               COUNT(*), MIN(value), MAX(value), SUM(value), SUM(value * value), SUM(is_alert)
+        FROM readings CROSS JOIN (VALUES (60), (3600), (86400)) r
+        GROUP BY station_id, r.column1, bucket_start
+        """,
+    ]),
+    (4, [
+        # Notifications waiting to be (re)sent by NotificationOutbox.
+        # status is pending, delivered or failed; next_attempt_at is epoch seconds.
+        """
+        CREATE TABLE IF NOT EXISTS notification_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            idempotency_key TEXT NOT NULL UNIQUE,
+            channel TEXT NOT NULL,
+            provider TEXT NOT NULL,
+            recipient TEXT NOT NULL,
+            subject TEXT,
+            message TEXT,
+            payload TEXT,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at INTEGER NOT NULL,
+            last_error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            delivered_at TIMESTAMP
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_outbox_status_due ON notification_outbox (status, next_attempt_at)",
+    ]),
+    (5, [
+        # Sync position of each receiver (e.g. IMAP UIDVALIDITY and last UID),
+        # as JSON, so a restart resumes where it left off
+        """
+        CREATE TABLE IF NOT EXISTS receiver_state (
+            name TEXT PRIMARY KEY,
+            state TEXT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    ]),
+    (6, [
+        # Provider message IDs already ingested, for DedupStore.
+        # processed_at is epoch seconds; pruning walks it oldest first.
+        """
+        CREATE TABLE IF NOT EXISTS processed_messages (
+            source TEXT NOT NULL,
+            message_id TEXT NOT NULL,
+            processed_at INTEGER NOT NULL,
+            PRIMARY KEY (source, message_id)
+        ) WITHOUT ROWID
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_processed_messages_at ON processed_messages (processed_at)",
+    ]),
+    (7, [
+        # Optional per-station message format for MessageParser, e.g. "Reading: {value} ft"
+        "ALTER TABLE stations ADD COLUMN message_template TEXT",
+    ]),
+    (8, [
+        # Named channels of a station (e.g. pH, temperature, chlorine from one
+        # RTU message), each with optional thresholds. key is lower case, as
+        # produced by MessageParser.parse_metrics.
+        """
+        CREATE TABLE IF NOT EXISTS metrics (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            station_id INTEGER NOT NULL,
+            key TEXT NOT NULL,
+            name TEXT NOT NULL,
+            unit TEXT DEFAULT '',
+            min_value REAL,
+            max_value REAL,
+            FOREIGN KEY (station_id) REFERENCES stations (id),
+            UNIQUE (station_id, key)
+        )
+        """,
+        # NULL for the station's own reading, so existing rows and queries keep
+        # their meaning; metric readings are extra rows from the same message
+        "ALTER TABLE readings ADD COLUMN metric_id INTEGER REFERENCES metrics (id)",
+        "CREATE INDEX IF NOT EXISTS idx_readings_metric_received ON readings (metric_id, received_at) "
+        "WHERE metric_id IS NOT NULL",
+        # station_latest and the rollups describe the station's own reading only
+        "DROP TRIGGER IF EXISTS trg_readings_latest",
+        """
+        CREATE TRIGGER trg_readings_latest AFTER INSERT ON readings
+        WHEN NEW.metric_id IS NULL
+        BEGIN
+            INSERT OR REPLACE INTO station_latest (station_id, reading_id, value, is_alert, received_at)
+            VALUES (NEW.station_id, NEW.id, NEW.value, NEW.is_alert, NEW.received_at);
+        END
+        """,
+        "DROP TRIGGER IF EXISTS trg_readings_rollup",
+        """
+        CREATE TRIGGER trg_readings_rollup AFTER INSERT ON readings
+        WHEN NEW.metric_id IS NULL
+        BEGIN
+            INSERT INTO reading_rollups (station_id, resolution, bucket_start, count,
+                                         min_value, max_value, sum_value, sum_squares, alert_count)
+            SELECT NEW.station_id, r.column1,
+                   CAST(strftime('%s', NEW.received_at) AS INTEGER) / r.column1 * r.column1,
+                   1, NEW.value, NEW.value, NEW.value, NEW.value * NEW.value, NEW.is_alert
+            FROM (VALUES (60), (3600), (86400)) r WHERE 1
+            ON CONFLICT (station_id, resolution, bucket_start) DO UPDATE SET
+                count = count + 1,
+                min_value = MIN(min_value, excluded.min_value),
+                max_value = MAX(max_value, excluded.max_value),
+                sum_value = sum_value + excluded.sum_value,
+                sum_squares = sum_squares + excluded.sum_squares,
+                alert_count = alert_count + excluded.alert_count;
+        END
+        """,
+    ]),
+]
+
+# Rollup bucket sizes in seconds (minute, hour, day), finest first
+ROLLUP_RESOLUTIONS = (60, 3600, 86400)
+
+# A rollup may serve a time range only if its bucket is at most this fraction
+# of the range, bounding the error from partial buckets at the edges to ~1%
+ROLLUP_MAX_EDGE_FRACTION = 0.01
+
+# Columns get_station_readings_between may return
+READING_COLUMNS = ("id", "station_id", "metric_id", "value", "raw_message", "is_alert", "received_at")
+
+class ReadingSeries(NamedTuple):
+    """Columnar readings: parallel NumPy arrays ordered by time"""
+    timestamps: Any  # int64 epoch seconds (UTC)
+    values: Any      # float64
+    is_alert: Any    # bool
+
+class RollupSeries(NamedTuple):
+    """Columnar rollup buckets: parallel NumPy arrays ordered by time"""
+    resolution: int     # bucket size in seconds
+    bucket_start: Any   # int64 epoch seconds (UTC)
+    count: Any          # int64
+    min_value: Any      # float64
+    max_value: Any      # float64
+    mean: Any           # float64
+    std: Any            # float64
+    alert_count: Any    # int64
+
+# (station_id, value, raw_message, received_at[, metric_id]) as accepted by add_readings_bulk
+ReadingRow = Union[Tuple[int, float, str, Optional[Union[datetime, str]]],
+                   Tuple[int, float, str, Optional[Union[datetime, str]], Optional[int]]]
+
+def _format_timestamp(value: Optional[Union[datetime, str]]) -> Optional[str]:
+    """Format a timestamp the way SQLite's CURRENT_TIMESTAMP stores it"""
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return value
+
+def _to_epoch(value: Union[datetime, str]) -> int:
+    """Convert a naive UTC datetime or stored timestamp string to epoch seconds"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return calendar.timegm(value.timetuple())
+
+class _ConnectionOwner:
+    """Stored beside a thread's connection; its finalizer closes the connection"""
 
 class Database:
     def __init__(self, db_path: str = "monitoring.db"):
         self.db_path = db_path
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self.stations = StationRegistry(self._load_stations)
         self.init_database()
     
+    def _get_connection(self) -> sqlite3.Connection:
+        """Return this thread's long-lived connection, opening it on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Each connection is only used by the thread that opened it;
+            # check_same_thread is off so close() can run from the GUI thread.
+            conn = sqlite3.connect(self.db_path, timeout=5.0, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            for pragma in CONNECTION_PRAGMAS:
+                conn.execute(pragma)
+            self._local.conn = conn
+            # Thread-local values are dropped when their thread exits; close
+            # the connection then, so restarted workers don't pile them up
+            self._local.owner = _ConnectionOwner()
+            weakref.finalize(self._local.owner, self._release, self._connections_lock, self._connections, conn)
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+    
+    @staticmethod
+    def _release(lock: threading.Lock, connections: List[sqlite3.Connection], conn: sqlite3.Connection):
+        with lock:
+            if conn in connections:
+                connections.remove(conn)
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+    
+    def close(self):
+        """Close every connection opened by this Database"""
+        with self._connections_lock:
+            connections = list(self._connections)
+            self._connections.clear()
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+    
     def init_database(self):
-        conn = sqlite3.connect(self.db_path)
+        conn = self._get_connection()
         cursor = conn.cursor()
         
         # Stations table
@@ -52,67 +345,140 @@ class Database:
         """)
         
         conn.commit()
-        conn.close()
+        
+        self.migrate()
     
-    def add_station(self, name: str, phone_number: str, min_value: float, max_value: float) -> int:
-        conn = sqlite3.connect(self.db_path)
+    def get_schema_version(self) -> int:
+        """Get the schema version recorded in the database file"""
+        conn = self._get_connection()
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+    
+    def migrate(self):
+        """Apply any migrations newer than the recorded schema version"""
+        conn = self._get_connection()
+        current = self.get_schema_version()
+        
+        for version, statements in MIGRATIONS:
+            if version <= current:
+                continue
+            # Each migration and its version bump commit together
+            with conn:
+                conn.execute("BEGIN")
+                for statement in statements:
+                    conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {version}")
+            print(f"Database migrated to schema version {version}")
+    
+    def add_station(self, name: str, phone_number: str, min_value: float, max_value: float,
+                    message_template: Optional[str] = None) -> int:
+        conn = self._get_connection()
         cursor = conn.cursor()
         cursor.execute("""
-            INSERT INTO stations (name, phone_number, min_value, max_value)
-            VALUES (?, ?, ?, ?)
-        """, (name, phone_number, min_value, max_value))
+            INSERT INTO stations (name, phone_number, min_value, max_value, message_template)
+            VALUES (?, ?, ?, ?, ?)
+        """, (name, phone_number, min_value, max_value, message_template or None))
         station_id = cursor.lastrowid
         conn.commit()
-        conn.close()
+        self.stations.invalidate()
         return station_id
     
     def update_station(self, station_id: int, name: str, phone_number: str, 
-                      min_value: float, max_value: float, enabled: bool):
-        conn = sqlite3.connect(self.db_path)
+                      min_value: float, max_value: float, enabled: bool,
+                      message_template: Optional[str] = None):
+        conn = self._get_connection()
         cursor = conn.cursor()
         cursor.execute("""
             UPDATE stations 
-            SET name=?, phone_number=?, min_value=?, max_value=?, enabled=?
+            SET name=?, phone_number=?, min_value=?, max_value=?, enabled=?, message_template=?
             WHERE id=?
-        """, (name, phone_number, min_value, max_value, 1 if enabled else 0, station_id))
+        """, (name, phone_number, min_value, max_value, 1 if enabled else 0,
+              message_template or None, station_id))
         conn.commit()
-        conn.close()
+        self.stations.invalidate()
     
     def delete_station(self, station_id: int):
-        conn = sqlite3.connect(self.db_path)
+        conn = self._get_connection()
         cursor = conn.cursor()
         cursor.execute("DELETE FROM stations WHERE id=?", (station_id,))
+        cursor.execute("DELETE FROM station_latest WHERE station_id=?", (station_id,))
+        cursor.execute("SELECT id FROM metrics WHERE station_id=?", (station_id,))
+        self._delete_metrics(cursor, [row['id'] for row in cursor.fetchall()])
+        cursor.execute("DELETE FROM reading_rollups WHERE station_id=?", (station_id,))
         conn.commit()
-        conn.close()
+        self.stations.invalidate()
     
-    def get_all_stations(self) -> List[Dict]:
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+    def _load_stations(self) -> List[Dict]:
+        conn = self._get_connection()
         cursor = conn.cursor()
         cursor.execute("SELECT * FROM stations ORDER BY name")
-        rows = cursor.fetchall()
-        conn.close()
-        return [dict(row) for row in rows]
+        stations = [dict(row) for row in cursor.fetchall()]
+        
+        # Each station carries its metrics by key, for ingestion and thresholds
+        metrics: Dict[int, Dict[str, Dict]] = {}
+        cursor.execute("SELECT * FROM metrics ORDER BY id")
+        for row in cursor.fetchall():
+            metrics.setdefault(row['station_id'], {})[row['key']] = dict(row)
+        for station in stations:
+            station['metrics'] = metrics.get(station['id'], {})
+        return stations
     
-    def get_station_by_phone(self, phone_number: str) -> Optional[Dict]:
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+    @staticmethod
+    def _delete_metrics(cursor, metric_ids: List[int]):
+        """
+        Delete metrics with their readings and alerts, inside the caller's
+        transaction, so no alert is left pointing at a missing metric
+        """
+        for metric_id in metric_ids:
+            cursor.execute(
+                "DELETE FROM alerts WHERE reading_id IN (SELECT id FROM readings WHERE metric_id=?)",
+                (metric_id,)
+            )
+            cursor.execute("DELETE FROM readings WHERE metric_id=?", (metric_id,))
+            cursor.execute("DELETE FROM metrics WHERE id=?", (metric_id,))
+    
+    def set_station_metrics(self, station_id: int,
+                            metrics: Iterable[Tuple[str, Optional[float], Optional[float]]]):
+        """
+        Make (key, min_value, max_value) the station's full set of metrics in
+        one transaction: new keys are added, existing ones get the new
+        thresholds and keys not listed are deleted with their readings.
+        """
+        wanted = {key.lower(): (min_value, max_value) for key, min_value, max_value in metrics}
+        conn = self._get_connection()
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM stations WHERE phone_number=?", (phone_number,))
-        row = cursor.fetchone()
-        conn.close()
-        return dict(row) if row else None
+        with conn:
+            cursor.execute("SELECT id, key FROM metrics WHERE station_id=?", (station_id,))
+            existing = {row['key']: row['id'] for row in cursor.fetchall()}
+            self._delete_metrics(cursor, [metric_id for key, metric_id in existing.items() if key not in wanted])
+            for key, (min_value, max_value) in wanted.items():
+                if key in existing:
+                    cursor.execute("UPDATE metrics SET min_value=?, max_value=? WHERE id=?",
+                                   (min_value, max_value, existing[key]))
+                else:
+                    cursor.execute("""
+                        INSERT INTO metrics (station_id, key, name, min_value, max_value)
+                        VALUES (?, ?, ?, ?, ?)
+                    """, (station_id, key, key, min_value, max_value))
+        self.stations.invalidate()
+    
+    def get_all_stations(self) -> List[Dict]:
+        return self.stations.all()
+    
+    def get_station_by_phone(self, phone_number: str) -> Optional[Dict]:
+        return self.stations.by_phone(phone_number)
+    
+    def get_station_by_name(self, name: str) -> Optional[Dict]:
+        return self.stations.by_name(name)
     
     def add_reading(self, station_id: int, value: float, raw_message: str = "") -> int:
-        conn = sqlite3.connect(self.db_path)
+        conn = self._get_connection()
         cursor = conn.cursor()
         
         # Check if reading is out of range
-        cursor.execute("SELECT min_value, max_value FROM stations WHERE id=?", (station_id,))
-        station = cursor.fetchone()
+        station = self.stations.by_id(station_id)
         is_alert = 0
         if station:
-            min_val, max_val = station
+            min_val, max_val = station['min_value'], station['max_value']
             is_alert = 1 if (value < min_val or value > max_val) else 0
         
         cursor.execute("""
@@ -126,62 +492,317 @@ class Database:
             cursor.execute("INSERT INTO alerts (reading_id) VALUES (?)", (reading_id,))
         
         conn.commit()
-        conn.close()
         return reading_id
     
+    def add_readings_bulk(self, readings: Iterable[ReadingRow]) -> List[int]:
+        """
+        Insert many readings in a single transaction.
+        Each item is (station_id, value, raw_message, received_at), plus an
+        optional metric_id for a metric reading; a None received_at uses the
+        current time. Thresholds (the station's, or the metric's) are
+        evaluated in memory and alerts are written alongside. Returns the new
+        reading ids in order.
+        """
+        rows = list(readings)
+        if not rows:
+            return []
+        
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        # Thresholds come from the station registry, not a query per reading
+        ranges = self.stations.ranges()
+        metric_ranges = self.stations.metric_ranges()
+        
+        params = []
+        alert_flags = []
+        for station_id, value, raw_message, received_at, *metric in rows:
+            metric_id = metric[0] if metric else None
+            if metric_id is None:
+                min_val, max_val = ranges.get(station_id, (None, None))
+            else:
+                min_val, max_val = metric_ranges.get(metric_id, (None, None))
+            is_alert = 1 if ((min_val is not None and value < min_val) or
+                             (max_val is not None and value > max_val)) else 0
+            alert_flags.append(is_alert)
+            params.append((station_id, metric_id, value, raw_message or "", is_alert,
+                           _format_timestamp(received_at)))
+        
+        with conn:
+            cursor.executemany("""
+                INSERT INTO readings (station_id, metric_id, value, raw_message, is_alert, received_at)
+                VALUES (?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+            """, params)
+            # Rows inserted by one writer in one transaction get consecutive ids
+            last_id = cursor.execute("SELECT last_insert_rowid()").fetchone()[0]
+            reading_ids = list(range(last_id - len(params) + 1, last_id + 1))
+            
+            alert_ids = [(reading_id,) for reading_id, is_alert in zip(reading_ids, alert_flags) if is_alert]
+            if alert_ids:
+                cursor.executemany("INSERT INTO alerts (reading_id) VALUES (?)", alert_ids)
+        
+        return reading_ids
+    
     def get_latest_readings(self) -> List[Dict]:
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        conn = self._get_connection()
         cursor = conn.cursor()
         cursor.execute("""
             SELECT s.id as station_id, s.name, s.phone_number, s.min_value, s.max_value,
-                   r.value, r.is_alert, r.received_at, s.enabled
+                   l.value, l.is_alert, l.received_at, s.enabled
             FROM stations s
-            LEFT JOIN readings r ON s.id = r.station_id
-            WHERE r.id IN (
-                SELECT MAX(id) FROM readings GROUP BY station_id
-            ) OR r.id IS NULL
+            LEFT JOIN station_latest l ON s.id = l.station_id
             ORDER BY s.name
         """)
         rows = cursor.fetchall()
-        conn.close()
         return [dict(row) for row in rows]
     
     def get_station_history(self, station_id: int, limit: int = 100) -> List[Dict]:
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        conn = self._get_connection()
         cursor = conn.cursor()
         cursor.execute("""
             SELECT r.*, a.resolution_notes, a.resolved_by, a.acknowledged_at
             FROM readings r
             LEFT JOIN alerts a ON r.id = a.reading_id
-            WHERE r.station_id=? 
+            WHERE r.station_id=? AND r.metric_id IS NULL
             ORDER BY r.received_at DESC 
             LIMIT ?
         """, (station_id, limit))
         rows = cursor.fetchall()
-        conn.close()
         return [dict(row) for row in rows]
     
+    def _reading_range_where(self, station_id: int,
+                             start: Optional[Union[datetime, str]],
+                             end: Optional[Union[datetime, str]],
+                             metric_id: Optional[int] = None) -> Tuple[str, list]:
+        """
+        WHERE clause selecting a station's own readings, or one metric's,
+        with start <= received_at < end
+        """
+        if metric_id is None:
+            where = "station_id=? AND metric_id IS NULL"
+            params = [station_id]
+        else:
+            where = "metric_id=?"
+            params = [metric_id]
+        if start is not None:
+            where += " AND received_at >= ?"
+            params.append(_format_timestamp(start))
+        if end is not None:
+            where += " AND received_at < ?"
+            params.append(_format_timestamp(end))
+        return where, params
+    
+    def get_station_readings_between(self, station_id: int,
+                                     start: Optional[Union[datetime, str]] = None,
+                                     end: Optional[Union[datetime, str]] = None,
+                                     columns: Iterable[str] = ("received_at", "value"),
+                                     metric_id: Optional[int] = None) -> List[Dict]:
+        """
+        Get a station's readings with start <= received_at < end, oldest first.
+        Either bound may be None for an open range. Only the requested columns
+        are returned; the (station_id, received_at) index serves the range.
+        With metric_id, that metric's readings are returned instead of the
+        station's own.
+        """
+        columns = list(columns)
+        unknown = [c for c in columns if c not in READING_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown reading columns: {', '.join(unknown)}")
+        
+        where, params = self._reading_range_where(station_id, start, end, metric_id)
+        query = f"SELECT {', '.join(columns)} FROM readings WHERE {where} ORDER BY received_at"
+        
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+        return [dict(row) for row in rows]
+    
+    def get_station_series(self, station_id: int,
+                           start: Optional[Union[datetime, str]] = None,
+                           end: Optional[Union[datetime, str]] = None,
+                           metric_id: Optional[int] = None) -> ReadingSeries:
+        """
+        Columnar variant of get_station_readings_between: returns timestamps,
+        values and alert flags as NumPy arrays without per-row dicts.
+        """
+        import numpy as np
+        
+        where, params = self._reading_range_where(station_id, start, end, metric_id)
+        query = f"""
+            SELECT CAST(strftime('%s', received_at) AS INTEGER), value, is_alert
+            FROM readings WHERE {where}
+            ORDER BY received_at
+        """
+        
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        cursor.row_factory = None  # plain tuples feed NumPy directly
+        cursor.execute(query, params)
+        rows = np.array(cursor.fetchall(), dtype=[("t", "i8"), ("v", "f8"), ("a", "?")])
+        return ReadingSeries(
+            timestamps=np.ascontiguousarray(rows["t"]),
+            values=np.ascontiguousarray(rows["v"]),
+            is_alert=np.ascontiguousarray(rows["a"])
+        )
+    
+    def choose_rollup_resolution(self, start: Optional[Union[datetime, str]] = None,
+                                 end: Optional[Union[datetime, str]] = None,
+                                 resolution: Optional[float] = None) -> Optional[int]:
+        """
+        Pick the coarsest rollup whose buckets are no larger than the requested
+        resolution (seconds) and small enough for the time range to be accurate.
+        Returns None when only raw readings are fine-grained enough.
+        """
+        span = None
+        if start is not None:
+            end_epoch = _to_epoch(end) if end is not None else int(time.time())
+            span = end_epoch - _to_epoch(start)
+        
+        chosen = None
+        for candidate in ROLLUP_RESOLUTIONS:
+            if resolution is not None and candidate > resolution:
+                break
+            if span is not None and candidate > span * ROLLUP_MAX_EDGE_FRACTION:
+                break
+            chosen = candidate
+        return chosen
+    
+    def _rollup_where(self, station_id: int, resolution: int,
+                      start: Optional[Union[datetime, str]],
+                      end: Optional[Union[datetime, str]]) -> Tuple[str, list]:
+        """WHERE clause selecting the buckets that overlap [start, end)"""
+        where = "station_id=? AND resolution=?"
+        params = [station_id, resolution]
+        if start is not None:
+            start_epoch = _to_epoch(start)
+            where += " AND bucket_start >= ?"
+            params.append(start_epoch - start_epoch % resolution)
+        if end is not None:
+            where += " AND bucket_start < ?"
+            params.append(_to_epoch(end))
+        return where, params
+    
+    def get_rollup_series(self, station_id: int,
+                          start: Optional[Union[datetime, str]] = None,
+                          end: Optional[Union[datetime, str]] = None,
+                          resolution: Optional[float] = None) -> Optional[RollupSeries]:
+        """
+        Get pre-aggregated buckets for a station from the coarsest rollup that
+        satisfies the time range and requested resolution (seconds between
+        points). Returns None if the caller should read raw readings instead.
+        """
+        import numpy as np
+        
+        rollup = self.choose_rollup_resolution(start, end, resolution)
+        if rollup is None:
+            return None
+        
+        where, params = self._rollup_where(station_id, rollup, start, end)
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        cursor.execute(f"""
+            SELECT bucket_start, count, min_value, max_value, sum_value, sum_squares, alert_count
+            FROM reading_rollups WHERE {where}
+            ORDER BY bucket_start
+        """, params)
+        rows = np.array(cursor.fetchall(), dtype=[
+            ("t", "i8"), ("n", "i8"), ("lo", "f8"), ("hi", "f8"),
+            ("sum", "f8"), ("sumsq", "f8"), ("alerts", "i8")
+        ])
+        
+        count = rows["n"]
+        mean = rows["sum"] / np.maximum(count, 1)
+        variance = np.maximum(rows["sumsq"] / np.maximum(count, 1) - mean * mean, 0.0)
+        return RollupSeries(
+            resolution=rollup,
+            bucket_start=np.ascontiguousarray(rows["t"]),
+            count=np.ascontiguousarray(count),
+            min_value=np.ascontiguousarray(rows["lo"]),
+            max_value=np.ascontiguousarray(rows["hi"]),
+            mean=mean,
+            std=np.sqrt(variance),
+            alert_count=np.ascontiguousarray(rows["alerts"])
+        )
+    
+    def get_station_stats(self, station_id: int,
+                          start: Optional[Union[datetime, str]] = None,
+                          end: Optional[Union[datetime, str]] = None,
+                          metric_id: Optional[int] = None) -> Dict:
+        """
+        Summary statistics for a station's readings in [start, end): count,
+        min_value, max_value, mean, std, alert_count, first_at and last_at.
+        Served from rollups when one is accurate enough for the range;
+        rollups cover the station's own readings, not metrics.
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        rollup = self.choose_rollup_resolution(start, end) if metric_id is None else None
+        if rollup is not None:
+            where, params = self._rollup_where(station_id, rollup, start, end)
+            cursor.execute(f"""
+                SELECT SUM(count), MIN(min_value), MAX(max_value), SUM(sum_value),
+                       SUM(sum_squares), SUM(alert_count)
+                FROM reading_rollups WHERE {where}
+            """, params)
+        else:
+            where, params = self._reading_range_where(station_id, start, end, metric_id)
+            cursor.execute(f"""
+                SELECT COUNT(*), MIN(value), MAX(value), SUM(value),
+                       SUM(value * value), SUM(is_alert)
+                FROM readings WHERE {where}
+            """, params)
+        count, min_value, max_value, total, total_squares, alert_count = cursor.fetchone()
+        
+        stats = {
+            'count': count or 0,
+            'min_value': min_value,
+            'max_value': max_value,
+            'mean': None,
+            'std': None,
+            'alert_count': alert_count or 0,
+            'first_at': None,
+            'last_at': None
+        }
+        if not count:
+            return stats
+        
+        mean = total / count
+        stats['mean'] = mean
+        stats['std'] = max(total_squares / count - mean * mean, 0.0) ** 0.5
+        
+        # Range ends are single index probes on (station_id, received_at)
+        bounds, params = self._reading_range_where(station_id, start, end, metric_id)
+        cursor.execute(f"SELECT MIN(received_at) FROM readings WHERE {bounds}", params)
+        stats['first_at'] = cursor.fetchone()[0]
+        cursor.execute(f"SELECT MAX(received_at) FROM readings WHERE {bounds}", params)
+        stats['last_at'] = cursor.fetchone()[0]
+        return stats
+    
     def get_active_alerts(self) -> List[Dict]:
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        conn = self._get_connection()
         cursor = conn.cursor()
         cursor.execute("""
-            SELECT a.id as alert_id, s.name, s.phone_number, r.value, 
-                   s.min_value, s.max_value, r.received_at
+            SELECT a.id as alert_id,
+                   CASE WHEN r.metric_id IS NULL THEN s.name ELSE s.name || ' ' || m.name END as name,
+                   s.phone_number, r.value,
+                   CASE WHEN r.metric_id IS NULL THEN s.min_value ELSE m.min_value END as min_value,
+                   CASE WHEN r.metric_id IS NULL THEN s.max_value ELSE m.max_value END as max_value,
+                   r.received_at
             FROM alerts a
             JOIN readings r ON a.reading_id = r.id
             JOIN stations s ON r.station_id = s.id
-            WHERE a.acknowledged = 0
+            LEFT JOIN metrics m ON r.metric_id = m.id
+            WHERE a.acknowledged = 0 AND (r.metric_id IS NULL OR m.id IS NOT NULL)
             ORDER BY r.received_at DESC
         """)
         rows = cursor.fetchall()
-        conn.close()
         return [dict(row) for row in rows]
     
     def acknowledge_alert(self, alert_id: int):
-        conn = sqlite3.connect(self.db_path)
+        conn = self._get_connection()
         cursor = conn.cursor()
         cursor.execute("""
             UPDATE alerts 
@@ -189,11 +810,10 @@ class Database:
             WHERE id=?
         """, (alert_id,))
         conn.commit()
-        conn.close()
     
     def add_resolution_notes(self, reading_id: int, notes: str, resolved_by: str = ""):
         """Add resolution notes to a reading's alert"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._get_connection()
         cursor = conn.cursor()
         
         # Find alert for this reading
@@ -208,12 +828,10 @@ class Database:
             """, (notes, resolved_by, alert[0]))
         
         conn.commit()
-        conn.close()
     
     def get_reading_with_notes(self, reading_id: int) -> dict:
         """Get reading with resolution notes"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        conn = self._get_connection()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -224,5 +842,178 @@ class Database:
         """, (reading_id,))
         
         row = cursor.fetchone()
-        conn.close()
         return dict(row) if row else None
+    
+    def enqueue_notification(self, idempotency_key: str, channel: str, provider: str,
+                             recipient: str, subject: str, message: str,
+                             payload: Optional[Dict] = None, error: str = "", attempts: int = 0,
+                             next_attempt_at: Optional[float] = None) -> bool:
+        """
+        Store a notification for the outbox worker. Returns False if one with
+        the same idempotency key is already stored.
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT OR IGNORE INTO notification_outbox
+                (idempotency_key, channel, provider, recipient, subject, message,
+                 payload, attempts, next_attempt_at, last_error)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (idempotency_key, channel, provider, recipient, subject, message,
+              json.dumps(payload or {}), attempts,
+              int(next_attempt_at if next_attempt_at is not None else time.time()), error))
+        conn.commit()
+        return cursor.rowcount == 1
+    
+    def get_due_notifications(self, limit: int = 50, now: Optional[float] = None) -> List[Dict]:
+        """Pending outbox entries whose next attempt is due, oldest first"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT * FROM notification_outbox
+            WHERE status = 'pending' AND next_attempt_at <= ?
+            ORDER BY next_attempt_at, id
+            LIMIT ?
+        """, (int(now if now is not None else time.time()), limit))
+        entries = []
+        for row in cursor.fetchall():
+            entry = dict(row)
+            entry['payload'] = json.loads(entry['payload'] or "{}")
+            entries.append(entry)
+        return entries
+    
+    def mark_notification_delivered(self, outbox_id: int):
+        conn = self._get_connection()
+        conn.execute("""
+            UPDATE notification_outbox
+            SET status = 'delivered', attempts = attempts + 1, last_error = NULL,
+                delivered_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        """, (outbox_id,))
+        conn.commit()
+    
+    def reschedule_notification(self, outbox_id: int, next_attempt_at: float,
+                                error: str = "", attempted: bool = True, give_up: bool = False):
+        """
+        Record a failed or postponed attempt. give_up marks the entry failed
+        so it is no longer retried.
+        """
+        conn = self._get_connection()
+        conn.execute("""
+            UPDATE notification_outbox
+            SET status = ?, attempts = attempts + ?, next_attempt_at = ?,
+                last_error = COALESCE(NULLIF(?, ''), last_error)
+            WHERE id = ?
+        """, ('failed' if give_up else 'pending', 1 if attempted else 0,
+              int(next_attempt_at), error, outbox_id))
+        conn.commit()
+    
+    def get_outbox_counts(self) -> Dict[str, int]:
+        """Number of outbox entries per status"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT status, COUNT(*) FROM notification_outbox GROUP BY status")
+        counts = {'pending': 0, 'delivered': 0, 'failed': 0}
+        counts.update({status: count for status, count in cursor.fetchall()})
+        return counts
+    
+    def purge_delivered_notifications(self, older_than_days: int = 7) -> int:
+        """Delete delivered outbox entries older than the given age"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            DELETE FROM notification_outbox
+            WHERE status = 'delivered' AND delivered_at < datetime('now', ?)
+        """, (f"-{int(older_than_days)} days",))
+        conn.commit()
+        return cursor.rowcount
+    
+    def get_receiver_state(self, name: str) -> Optional[Dict]:
+        """Saved sync state for a receiver, or None if it has none yet"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT state FROM receiver_state WHERE name=?", (name,))
+        row = cursor.fetchone()
+        return json.loads(row[0]) if row else None
+    
+    def set_receiver_state(self, name: str, state: Dict):
+        conn = self._get_connection()
+        conn.execute("""
+            INSERT INTO receiver_state (name, state, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT (name) DO UPDATE SET state = excluded.state, updated_at = excluded.updated_at
+        """, (name, json.dumps(state)))
+        conn.commit()
+    
+    def add_processed_message(self, source: str, message_id: str) -> bool:
+        """Record a processed message ID. Returns False if it was already recorded."""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT OR IGNORE INTO processed_messages (source, message_id, processed_at)
+            VALUES (?, ?, ?)
+        """, (source, message_id, int(time.time())))
+        conn.commit()
+        return cursor.rowcount == 1
+    
+    def add_processed_messages(self, source: str, message_ids: Iterable[str]) -> List[bool]:
+        """Record several message IDs in one transaction. Returns which were new."""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        now = int(time.time())
+        stored = []
+        with conn:
+            for message_id in message_ids:
+                cursor.execute("""
+                    INSERT OR IGNORE INTO processed_messages (source, message_id, processed_at)
+                    VALUES (?, ?, ?)
+                """, (source, message_id, now))
+                stored.append(cursor.rowcount == 1)
+        return stored
+    
+    def has_processed_message(self, source: str, message_id: str) -> bool:
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1 FROM processed_messages WHERE source=? AND message_id=?",
+                       (source, message_id))
+        return cursor.fetchone() is not None
+    
+    def delete_processed_message(self, source: str, message_id: str):
+        conn = self._get_connection()
+        conn.execute("DELETE FROM processed_messages WHERE source=? AND message_id=?",
+                     (source, message_id))
+        conn.commit()
+    
+    def iter_processed_messages(self) -> Iterable[Tuple[str, str]]:
+        """Every recorded (source, message_id), streamed"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        cursor.execute("SELECT source, message_id FROM processed_messages")
+        while True:
+            rows = cursor.fetchmany(5000)
+            if not rows:
+                return
+            yield from rows
+    
+    def prune_processed_messages(self, older_than_days: int, max_entries: int) -> int:
+        """
+        Delete processed message IDs older than the given age, then the
+        oldest beyond max_entries. Returns the number deleted.
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        cutoff = int(time.time()) - older_than_days * 86400
+        cursor.execute("DELETE FROM processed_messages WHERE processed_at < ?", (cutoff,))
+        removed = cursor.rowcount
+        cursor.execute("SELECT COUNT(*) FROM processed_messages")
+        excess = cursor.fetchone()[0] - max_entries
+        if excess > 0:
+            cursor.execute("""
+                DELETE FROM processed_messages WHERE (source, message_id) IN (
+                    SELECT source, message_id FROM processed_messages
+                    ORDER BY processed_at LIMIT ?
+                )
+            """, (excess,))
+            removed += cursor.rowcount
+        conn.commit()
+        return removed
@@ -0,0 +1,215 @@
+"""
+Dedup Store - Remember which provider messages have already been ingested
+"""
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings; no false negatives"""
+    
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.size = max(64, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+    
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (first + i * second) % self.size
+    
+    def add(self, key: str):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+    
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+    
+    def clear(self):
+        self.bits = bytearray(len(self.bits))
+
+class DedupStore:
+    """
+    Message IDs already processed, per source (e.g. "email", "google_voice").
+    The IDs live in the processed_messages table, so they survive restarts.
+    A small LRU of recent IDs and a Bloom filter over the whole table sit in
+    front of it: most lookups of new IDs never touch the database, and
+    memory stays fixed however long the app runs. The table is pruned by
+    age and size, and the filter is rebuilt after each prune on a
+    background thread, so lookups and claims never wait for the rebuild.
+    The first build starts with the store; until it is done, lookups that
+    miss the LRU go to the database.
+    """
+    
+    def __init__(self, db, config=None):
+        dedup_config = config.config.get("dedup", {}) if config else {}
+        self.db = db
+        self.lru_size = dedup_config.get("lru_size", 10000)
+        self.retention_days = dedup_config.get("retention_days", 30)
+        self.max_entries = dedup_config.get("max_entries", 200000)
+        self.prune_interval = dedup_config.get("prune_interval", 3600)
+        self.error_rate = dedup_config.get("error_rate", 0.001)
+        self.bloom = BloomFilter(self.max_entries, self.error_rate)
+        self._bloom_ready = False
+        
+        self._lock = threading.Lock()
+        self._recent: "OrderedDict[Tuple[str, str], None]" = OrderedDict()
+        self._next_prune = 0.0
+        self._pruning = False
+        # Bloom keys recorded while a new filter is being built, or None
+        self._added_during_prune: Optional[List[str]] = None
+        
+        self.lru_hits = 0
+        self.bloom_misses = 0
+        self.db_lookups = 0
+        self.duplicates = 0
+        self.stored = 0
+        
+        self._prune_in_background()
+    
+    @staticmethod
+    def _bloom_key(source: str, message_id: str) -> str:
+        return f"{source}\x00{message_id}"
+    
+    def _add_to_bloom(self, source: str, message_id: str):
+        """Call with the lock held"""
+        bloom_key = self._bloom_key(source, message_id)
+        self.bloom.add(bloom_key)
+        if self._added_during_prune is not None:
+            self._added_during_prune.append(bloom_key)
+    
+    def _remember(self, key: Tuple[str, str]):
+        self._recent[key] = None
+        self._recent.move_to_end(key)
+        if len(self._recent) > self.lru_size:
+            self._recent.popitem(last=False)
+    
+    def seen(self, source: str, message_id: str) -> bool:
+        """True if the message ID was already processed for this source"""
+        key = (source, message_id)
+        with self._lock:
+            if key in self._recent:
+                self._recent.move_to_end(key)
+                self.lru_hits += 1
+                return True
+            if self._bloom_ready and self._bloom_key(source, message_id) not in self.bloom:
+                self.bloom_misses += 1
+                return False
+            self.db_lookups += 1
+            found = self.db.has_processed_message(source, message_id)
+            if found:
+                self._remember(key)
+            return found
+    
+    def add(self, source: str, message_id: str) -> bool:
+        """
+        Record a message ID. Returns False if it was already recorded, so
+        callers can claim a message before processing it.
+        """
+        if self.seen(source, message_id):
+            with self._lock:
+                self.duplicates += 1
+            return False
+        
+        with self._lock:
+            stored = self.db.add_processed_message(source, message_id)
+            self._remember((source, message_id))
+            self._add_to_bloom(source, message_id)
+            if stored:
+                self.stored += 1
+            else:
+                self.duplicates += 1
+            prune_due = time.monotonic() >= self._next_prune
+        
+        if prune_due:
+            self._prune_in_background()
+        return stored
+    
+    def add_many(self, source: str, message_ids: List[str]) -> List[bool]:
+        """Record several message IDs with one commit. Returns which were new."""
+        new = [not self.seen(source, message_id) for message_id in message_ids]
+        candidates = [message_id for message_id, is_new in zip(message_ids, new) if is_new]
+        
+        with self._lock:
+            stored = iter(self.db.add_processed_messages(source, candidates))
+            results = []
+            for message_id, is_new in zip(message_ids, new):
+                ok = is_new and next(stored)
+                if is_new:
+                    self._remember((source, message_id))
+                    self._add_to_bloom(source, message_id)
+                if ok:
+                    self.stored += 1
+                else:
+                    self.duplicates += 1
+                results.append(ok)
+            prune_due = time.monotonic() >= self._next_prune
+        
+        if prune_due:
+            self._prune_in_background()
+        return results
+    
+    def discard(self, source: str, message_id: str):
+        """Forget a claimed ID whose processing failed, so it can be retried"""
+        with self._lock:
+            self._recent.pop((source, message_id), None)
+            self.db.delete_processed_message(source, message_id)
+    
+    def _prune_in_background(self):
+        with self._lock:
+            if self._pruning:
+                return
+            # Set here so the next claims don't start another thread
+            self._next_prune = time.monotonic() + self.prune_interval
+        threading.Thread(target=self.prune, name="dedup-prune", daemon=True).start()
+    
+    def prune(self) -> int:
+        """
+        Drop IDs past retention or over max_entries and rebuild the filter.
+        The new filter is built without the lock and swapped in at the end,
+        with any IDs recorded meanwhile added to it.
+        """
+        with self._lock:
+            if self._pruning:
+                return 0
+            self._pruning = True
+            self._next_prune = time.monotonic() + self.prune_interval
+            self._added_during_prune = []
+        
+        try:
+            removed = self.db.prune_processed_messages(self.retention_days, self.max_entries)
+            bloom = BloomFilter(self.max_entries, self.error_rate)
+            for source, message_id in self.db.iter_processed_messages():
+                bloom.add(self._bloom_key(source, message_id))
+        except Exception:
+            with self._lock:
+                self._pruning = False
+                self._added_during_prune = None
+            raise
+        
+        with self._lock:
+            for bloom_key in self._added_during_prune:
+                bloom.add(bloom_key)
+            self.bloom = bloom
+            self._bloom_ready = True
+            self._added_during_prune = None
+            self._pruning = False
+            if removed:
+                self._recent.clear()
+        return removed
+    
+    def get_metrics(self) -> Dict:
+        with self._lock:
+            return {
+                'stored': self.stored,
+                'duplicates': self.duplicates,
+                'lru_hits': self.lru_hits,
+                'bloom_misses': self.bloom_misses,
+                'db_lookups': self.db_lookups,
+                'recent_size': len(self._recent)
+            }
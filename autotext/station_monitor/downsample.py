@@ -0,0 +1,105 @@
+"""
+Downsampling - Reduce long reading series to roughly one point per pixel
+"""
+from typing import Optional
+import numpy as np
+
+MODES = ("minmax", "lttb")
+
+def _bucket_ids(n: int, n_buckets: int) -> np.ndarray:
+    """Assign n points to n_buckets contiguous, near-equal buckets"""
+    return (np.arange(n) * n_buckets) // n
+
+
+def _group_extremes(values: np.ndarray, groups: np.ndarray) -> np.ndarray:
+    """
+    Indices of the minimum and maximum value within each run of equal group
+    ids. groups must be sorted.
+    """
+    if len(values) == 0:
+        return np.empty(0, dtype=np.int64)
+    
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+    sizes = np.diff(np.r_[starts, len(values)])
+    
+    indices = []
+    for reduce in (np.minimum, np.maximum):
+        extremes = np.repeat(reduce.reduceat(values, starts), sizes)
+        hits = np.flatnonzero(values == extremes)
+        # First hit in each group
+        _, first = np.unique(groups[hits], return_index=True)
+        indices.append(hits[first])
+    return np.union1d(indices[0], indices[1])
+
+
+def minmax(values: np.ndarray, n_out: int) -> np.ndarray:
+    """Keep the lowest and highest point of each of n_out / 2 buckets"""
+    n = len(values)
+    if n <= n_out:
+        return np.arange(n)
+    groups = _bucket_ids(n, max(1, n_out // 2))
+    return _group_extremes(values, groups)
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: keep the first and last points plus, from
+    each bucket in between, the point forming the largest triangle with the
+    previously kept point and the average of the next bucket.
+    """
+    n = len(y)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+    
+    x = x.astype(np.float64)
+    # Interior points split into n_out - 2 buckets
+    edges = 1 + (np.arange(n_out - 1) * (n - 2)) // (n_out - 2)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    
+    prev = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x = x[end:edges[i + 2]].mean()
+            next_y = y[end:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        
+        # Twice the triangle area; the constant factor doesn't change argmax
+        areas = np.abs(
+            (x[prev] - next_x) * (y[start:end] - y[prev])
+            - (x[prev] - x[start:end]) * (next_y - y[prev])
+        )
+        prev = start + int(np.argmax(areas))
+        selected[i + 1] = prev
+    
+    return selected
+
+
+def downsample(x: np.ndarray, y: np.ndarray, n_out: int, mode: str = "minmax",
+               keep: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Choose indices of at most about n_out points to plot, in time order.
+    keep is an optional bool mask (e.g. out-of-range readings); the most
+    extreme kept points of every bucket are always included, so alert spikes
+    stay visible at any zoom level.
+    """
+    n = len(y)
+    if n <= n_out:
+        return np.arange(n)
+    
+    if mode == "lttb":
+        indices = lttb(x, y, n_out)
+    elif mode == "minmax":
+        indices = minmax(y, n_out)
+    else:
+        raise ValueError(f"Unknown downsampling mode: {mode}")
+    
+    if keep is not None and keep.any():
+        kept = np.flatnonzero(keep)
+        groups = _bucket_ids(n, max(1, n_out // 2))[kept]
+        indices = np.union1d(indices, kept[_group_extremes(y[kept], groups)])
+    
+    return indices
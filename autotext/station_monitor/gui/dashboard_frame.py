@@ -1,6 +1,6 @@
 import customtkinter as ctk
 from tkinter import messagebox
-from typing import Dict
+from typing import Dict, Iterable, Tuple
 
 class StationCard(ctk.CTkFrame):
     def __init__(self, parent, station_data: Dict, on_call_click):
@@ -8,35 +8,26 @@ class StationCard(ctk.CTkFrame):
         
         self.station_data = station_data
         self.on_call_click = on_call_click
+        self._shown = None
         
         self.grid_columnconfigure(0, weight=1)
         
         # Status indicator
-        status_color = self.get_status_color()
-        self.status_indicator = ctk.CTkFrame(self, height=5, fg_color=status_color)
+        self.status_indicator = ctk.CTkFrame(self, height=5)
         self.status_indicator.grid(row=0, column=0, sticky="ew", padx=0, pady=0)
         
         # Station name
-        name = station_data.get('name', 'Unknown')
         self.name_label = ctk.CTkLabel(
             self, 
-            text=name,
+            text="",
             font=ctk.CTkFont(size=16, weight="bold")
         )
         self.name_label.grid(row=1, column=0, padx=15, pady=(10, 5), sticky="w")
         
         # Current value
-        value = station_data.get('value')
-        if value is not None:
-            value_text = f"{value:.2f}"
-            status_text = self.get_status_text()
-        else:
-            value_text = "No data"
-            status_text = "Waiting for data"
-        
         self.value_label = ctk.CTkLabel(
             self,
-            text=value_text,
+            text="",
             font=ctk.CTkFont(size=32, weight="bold")
         )
         self.value_label.grid(row=2, column=0, padx=15, pady=5)
@@ -44,47 +35,70 @@ class StationCard(ctk.CTkFrame):
         # Status text
         self.status_label = ctk.CTkLabel(
             self,
-            text=status_text,
+            text="",
             font=ctk.CTkFont(size=12)
         )
         self.status_label.grid(row=3, column=0, padx=15, pady=5)
         
         # Range info
-        min_val = station_data.get('min_value', 0)
-        max_val = station_data.get('max_value', 0)
-        range_text = f"Range: {min_val:.1f} - {max_val:.1f}"
         self.range_label = ctk.CTkLabel(
             self,
-            text=range_text,
+            text="",
             font=ctk.CTkFont(size=11),
             text_color="gray"
         )
         self.range_label.grid(row=4, column=0, padx=15, pady=5)
         
         # Phone number
-        phone = station_data.get('phone_number', '')
         self.phone_label = ctk.CTkLabel(
             self,
-            text=f"📞 {phone}",
+            text="",
             font=ctk.CTkFont(size=11),
             text_color="gray"
         )
         self.phone_label.grid(row=5, column=0, padx=15, pady=5)
         
-        # Call button (only show if alert)
+        # Call button (only shown while alerting), else a spacer in its row
+        self.call_btn = ctk.CTkButton(
+            self,
+            text="📞 Call Technician",
+            command=lambda: self.on_call_click(self.station_data),
+            fg_color="#d32f2f",
+            hover_color="#b71c1c"
+        )
+        self.spacer = ctk.CTkLabel(self, text="")
+        
+        self.update_data(station_data)
+    
+    def update_data(self, station_data: Dict):
+        """Show new data in the existing widgets; nothing is redrawn if it is unchanged"""
+        if station_data == self._shown:
+            return
+        self.station_data = station_data
+        self._shown = station_data
+        
+        self.status_indicator.configure(fg_color=self.get_status_color())
+        self.name_label.configure(text=station_data.get('name', 'Unknown'))
+        
+        value = station_data.get('value')
+        if value is not None:
+            self.value_label.configure(text=f"{value:.2f}")
+            self.status_label.configure(text=self.get_status_text())
+        else:
+            self.value_label.configure(text="No data")
+            self.status_label.configure(text="Waiting for data")
+        
+        min_val = station_data.get('min_value', 0)
+        max_val = station_data.get('max_value', 0)
+        self.range_label.configure(text=f"Range: {min_val:.1f} - {max_val:.1f}")
+        self.phone_label.configure(text=f"📞 {station_data.get('phone_number', '')}")
+        
         if station_data.get('is_alert'):
-            self.call_btn = ctk.CTkButton(
-                self,
-                text="📞 Call Technician",
-                command=lambda: self.on_call_click(station_data),
-                fg_color="#d32f2f",
-                hover_color="#b71c1c"
-            )
+            self.spacer.grid_remove()
             self.call_btn.grid(row=6, column=0, padx=15, pady=(5, 15), sticky="ew")
         else:
-            # Spacer
-            spacer = ctk.CTkLabel(self, text="")
-            spacer.grid(row=6, column=0, pady=10)
+            self.call_btn.grid_remove()
+            self.spacer.grid(row=6, column=0, pady=10)
     
     def get_status_color(self):
         if not self.station_data.get('enabled'):
@@ -120,6 +134,7 @@ class DashboardFrame(ctk.CTkFrame):
     def __init__(self, parent, db):
         super().__init__(parent, corner_radius=0, fg_color="transparent")
         self.db = db
+        self.cards: Dict[int, StationCard] = {}
         
         self.grid_columnconfigure(0, weight=1)
         self.grid_rowconfigure(1, weight=1)
@@ -155,12 +170,19 @@ class DashboardFrame(ctk.CTkFrame):
         self.refresh_btn.grid(row=0, column=1, padx=10)
     
     def refresh(self):
+        # Get latest readings
+        readings = self.db.get_latest_readings()
+        
+        # Same stations in the same order: update the cards in place
+        if readings and [reading['station_id'] for reading in readings] == list(self.cards):
+            for reading in readings:
+                self.cards[reading['station_id']].update_data(reading)
+            return
+        
         # Clear existing cards
         for widget in self.scroll_frame.winfo_children():
             widget.destroy()
-        
-        # Get latest readings
-        readings = self.db.get_latest_readings()
+        self.cards = {}
         
         if not readings:
             no_data = ctk.CTkLabel(
@@ -178,12 +200,31 @@ class DashboardFrame(ctk.CTkFrame):
         for reading in readings:
             card = StationCard(self.scroll_frame, reading, self.handle_call_click)
             card.grid(row=row, column=col, padx=10, pady=10, sticky="nsew")
+            self.cards[reading['station_id']] = card
             
             col += 1
             if col > 2:
                 col = 0
                 row += 1
     
+    def apply_readings(self, readings: Iterable[Tuple[Dict, float]]):
+        """
+        Show the latest (station, value) of each station that reported since
+        the last frame. Only those cards change; a station without a card
+        yet rebuilds the dashboard once.
+        """
+        for station, value in readings:
+            card = self.cards.get(station['id'])
+            if card is None:
+                self.refresh()
+                return
+            is_alert = value < station['min_value'] or value > station['max_value']
+            card.update_data(dict(
+                card.station_data, name=station['name'], phone_number=station['phone_number'],
+                min_value=station['min_value'], max_value=station['max_value'],
+                enabled=station['enabled'], value=value, is_alert=int(is_alert)
+            ))
+    
     def handle_call_click(self, station_data):
         phone = station_data.get('phone_number', '')
         name = station_data.get('name', '')
@@ -0,0 +1,51 @@
+"""
+Event Bus - Hand events from receiver threads to the Tk main loop
+"""
+import threading
+from typing import Any, Dict, Hashable, Tuple
+
+class EventBus:
+    """
+    Receiver threads post events here instead of touching widgets, which Tk
+    only allows from the main loop's thread. The main loop drains the bus
+    with after() once per frame. An event replaces any pending one with the
+    same topic and key, so a burst of readings becomes one update per
+    station, with its latest value.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Dict[Hashable, Any]] = {}
+        self._count = 0
+        self.posted = 0
+        self.drains = 0
+        self.delivered = 0
+    
+    def post(self, topic: str, key: Hashable, payload: Any):
+        """Queue an event; safe to call from any thread"""
+        with self._lock:
+            self._pending.setdefault(topic, {})[key] = payload
+            self._count += 1
+            self.posted += 1
+    
+    def drain(self) -> Tuple[Dict[str, Dict[Hashable, Any]], int]:
+        """
+        Take the pending events as {topic: {key: latest payload}}, and how
+        many were posted since the last drain
+        """
+        with self._lock:
+            pending, count = self._pending, self._count
+            self._pending, self._count = {}, 0
+            if count:
+                self.drains += 1
+                self.delivered += sum(len(events) for events in pending.values())
+        return pending, count
+    
+    def get_metrics(self) -> Dict:
+        with self._lock:
+            return {
+                'pending': self._count,
+                'posted': self.posted,
+                'drains': self.drains,
+                'delivered': self.delivered
+            }
@@ -4,9 +4,15 @@ import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
 import matplotlib.dates as mdates
-from datetime import datetime, timedelta
+from downsample import downsample
+from datetime import datetime, timedelta, timezone
 
 class GraphsFrame(ctk.CTkFrame):
+    SAMPLING_MODES = {"Min/Max": "minmax", "LTTB": "lttb"}
+    
+    # Draw point markers only when there are few enough to tell apart
+    MAX_MARKED_POINTS = 500
+    
     def __init__(self, parent, db):
         super().__init__(parent, corner_radius=0, fg_color="transparent")
         self.db = db
@@ -82,6 +88,23 @@ class GraphsFrame(ctk.CTkFrame):
         )
         self.timerange_filter.pack(side="left", padx=(0, 20))
         
+        # Downsampling mode
+        ctk.CTkLabel(
+            controls,
+            text="Sampling:",
+            font=ctk.CTkFont(size=12, weight="bold")
+        ).pack(side="left", padx=(0, 10))
+        
+        self.sampling_var = ctk.StringVar(value="Min/Max")
+        self.sampling_filter = ctk.CTkOptionMenu(
+            controls,
+            variable=self.sampling_var,
+            values=list(self.SAMPLING_MODES.keys()),
+            command=lambda x: self.update_graph(),
+            width=110
+        )
+        self.sampling_filter.pack(side="left", padx=(0, 20))
+        
         # Show range checkbox
         self.show_range_var = ctk.BooleanVar(value=True)
         self.show_range_check = ctk.CTkCheckBox(
@@ -148,55 +171,35 @@ class GraphsFrame(ctk.CTkFrame):
             return
         
         # Get station
-        stations = self.db.get_all_stations()
-        station = next((s for s in stations if s['name'] == station_name), None)
+        station = self.db.get_station_by_name(station_name)
         
         if not station:
             self.show_no_data_message()
             return
         
-        # Get time range
-        timerange = self.timerange_var.get()
-        limit = self.get_limit_for_timerange(timerange)
-        
-        # Get readings
-        readings = self.db.get_station_history(station['id'], limit=limit)
+        # Summary first: it is cheap (served from rollups) and tells us the span
+        start = self.get_start_for_timerange(self.timerange_var.get())
+        stats = self.db.get_station_stats(station['id'], start=start)
         
-        if not readings:
-            self.show_no_data_message("No readings available for this station")
+        if stats['count'] == 0:
+            message = "No readings available for this station" if start is None else "No readings in selected time range"
+            self.show_no_data_message(message)
             return
         
-        # Filter by time range
-        readings = self.filter_by_timerange(readings, timerange)
-        
-        if not readings:
-            self.show_no_data_message("No readings in selected time range")
-            return
-        
-        # Sort by time (oldest first for graph)
-        readings.sort(key=lambda x: x['received_at'])
-        
-        # Extract data
-        timestamps = []
-        values = []
-        
-        for reading in readings:
-            try:
-                dt = datetime.fromisoformat(reading['received_at'])
-                timestamps.append(dt)
-                values.append(reading['value'])
-            except:
-                continue
-        
-        if not timestamps:
-            self.show_no_data_message("Could not parse timestamps")
-            return
+        # Seconds per point the graph can actually show
+        first_time = start or datetime.fromisoformat(stats['first_at'])
+        span = (datetime.now(timezone.utc).replace(tzinfo=None) - first_time).total_seconds()
+        resolution = max(span, 1) / self.get_target_points()
         
         # Clear and plot
         self.ax.clear()
         
-        # Plot readings
-        self.ax.plot(timestamps, values, 'b-', linewidth=2, label='Readings', marker='o', markersize=4)
+        # Long ranges come from pre-aggregated rollups, short ones from raw readings
+        rollups = self.db.get_rollup_series(station['id'], start=start, resolution=resolution)
+        if rollups is not None and len(rollups.count) > 0:
+            self.plot_rollups(rollups, station)
+        else:
+            self.plot_readings(self.db.get_station_series(station['id'], start=start))
         
         # Plot safe range if enabled
         if self.show_range_var.get():
@@ -207,7 +210,7 @@ class GraphsFrame(ctk.CTkFrame):
             self.ax.axhline(y=max_val, color='r', linestyle='--', linewidth=1.5, label=f'Max ({max_val:.1f})', alpha=0.7)
             
             # Fill safe range
-            self.ax.fill_between(timestamps, min_val, max_val, alpha=0.1, color='green', label='Safe Range')
+            self.ax.axhspan(min_val, max_val, alpha=0.1, color='green', label='Safe Range')
         
         # Formatting
         self.ax.set_xlabel('Time', fontsize=11, fontweight='bold')
@@ -227,28 +230,77 @@ class GraphsFrame(ctk.CTkFrame):
         self.canvas.draw()
         
         # Update statistics
-        self.update_statistics(readings, station)
+        self.update_statistics(stats, station)
+    
+    def plot_readings(self, series):
+        """Plot raw readings, downsampled to about one point per pixel"""
+        mode = self.SAMPLING_MODES.get(self.sampling_var.get(), "minmax")
+        indices = downsample(
+            series.timestamps, series.values, self.get_target_points(),
+            mode=mode, keep=series.is_alert
+        )
+        timestamps = series.timestamps[indices].astype('datetime64[s]')
+        values = series.values[indices]
+        is_alert = series.is_alert[indices]
+        
+        marker = 'o' if len(values) <= self.MAX_MARKED_POINTS else None
+        label = 'Readings' if len(indices) == len(series.values) else f'Readings ({len(indices)} of {len(series.values)} shown)'
+        self.ax.plot(timestamps, values, 'b-', linewidth=2, label=label, marker=marker, markersize=4)
+        
+        # Highlight out-of-range readings
+        if is_alert.any():
+            self.ax.plot(timestamps[is_alert], values[is_alert], 'r.', markersize=8, label='Alerts')
     
-    def update_statistics(self, readings, station):
+    def plot_rollups(self, rollups, station):
+        """Plot rollup buckets as a mean line inside a min/max band"""
+        has_alert = rollups.alert_count > 0
+        mode = self.SAMPLING_MODES.get(self.sampling_var.get(), "minmax")
+        indices = downsample(
+            rollups.bucket_start, rollups.mean, self.get_target_points(),
+            mode=mode, keep=has_alert
+        )
+        # Center each bucket on its interval
+        timestamps = (rollups.bucket_start[indices] + rollups.resolution // 2).astype('datetime64[s]')
+        
+        self.ax.fill_between(
+            timestamps, rollups.min_value[indices], rollups.max_value[indices],
+            color='b', alpha=0.2, linewidth=0, label='Min/Max'
+        )
+        self.ax.plot(
+            timestamps, rollups.mean[indices], 'b-', linewidth=2,
+            label=f'Average per {self.format_resolution(rollups.resolution)}'
+        )
+        
+        # Mark out-of-range bucket extremes
+        high = rollups.max_value[indices] > station['max_value']
+        low = rollups.min_value[indices] < station['min_value']
+        if high.any() or low.any():
+            self.ax.plot(timestamps[high], rollups.max_value[indices][high], 'r.', markersize=8, label='Alerts')
+            self.ax.plot(timestamps[low], rollups.min_value[indices][low], 'r.', markersize=8)
+    
+    def format_resolution(self, seconds: int) -> str:
+        """Name a rollup bucket size"""
+        names = {60: "minute", 3600: "hour", 86400: "day"}
+        return names.get(seconds, f"{seconds}s")
+    
+    def update_statistics(self, stats, station):
         """Update statistics panel"""
-        if not readings:
+        count = stats['count']
+        if count == 0:
             return
         
-        values = [r['value'] for r in readings]
-        
-        # Calculate stats
-        count = len(values)
-        avg = sum(values) / count
-        min_reading = min(values)
-        max_reading = max(values)
+        avg = stats['mean']
+        std = stats['std']
+        min_reading = stats['min_value']
+        max_reading = stats['max_value']
         
         # Count alerts
-        alerts = sum(1 for v in values if v < station['min_value'] or v > station['max_value'])
+        alerts = stats['alert_count']
         alert_pct = (alerts / count * 100) if count > 0 else 0
         
         # Time range
-        first_time = datetime.fromisoformat(readings[0]['received_at'])
-        last_time = datetime.fromisoformat(readings[-1]['received_at'])
+        first_time = datetime.fromisoformat(stats['first_at'])
+        last_time = datetime.fromisoformat(stats['last_at'])
         time_span = last_time - first_time
         
         # Format stats
@@ -261,6 +313,7 @@ First Reading: {first_time.strftime('%Y-%m-%d %H:%M:%S')}
 Last Reading: {last_time.strftime('%Y-%m-%d %H:%M:%S')}
 
 Average: {avg:.2f}
+Std Dev: {std:.2f}
 Minimum: {min_reading:.2f}
 Maximum: {max_reading:.2f}
 
@@ -287,44 +340,23 @@ Normal: {count - alerts} ({100 - alert_pct:.1f}%)
         
         return ", ".join(parts) if parts else "< 1 minute"
     
-    def get_limit_for_timerange(self, timerange: str) -> int:
-        """Get database query limit for time range"""
-        limits = {
-            "Last 6 Hours": 500,
-            "Last 24 Hours": 1000,
-            "Last 7 Days": 2000,
-            "Last 30 Days": 5000,
-            "All Time": 10000
-        }
-        return limits.get(timerange, 1000)
+    def get_target_points(self) -> int:
+        """Number of points worth drawing: about the graph's width in pixels"""
+        width = self.canvas.get_tk_widget().winfo_width()
+        return max(width, 1000)
     
-    def filter_by_timerange(self, readings, timerange: str):
-        """Filter readings by time range"""
-        if timerange == "All Time":
-            return readings
-        
-        now = datetime.now()
-        cutoff_times = {
-            "Last 6 Hours": now - timedelta(hours=6),
-            "Last 24 Hours": now - timedelta(hours=24),
-            "Last 7 Days": now - timedelta(days=7),
-            "Last 30 Days": now - timedelta(days=30)
+    def get_start_for_timerange(self, timerange: str):
+        """Get the start of a time range, or None for all time"""
+        # received_at is stored by SQLite in UTC
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        spans = {
+            "Last 6 Hours": timedelta(hours=6),
+            "Last 24 Hours": timedelta(hours=24),
+            "Last 7 Days": timedelta(days=7),
+            "Last 30 Days": timedelta(days=30)
         }
-        
-        cutoff = cutoff_times.get(timerange)
-        if not cutoff:
-            return readings
-        
-        filtered = []
-        for reading in readings:
-            try:
-                dt = datetime.fromisoformat(reading['received_at'])
-                if dt >= cutoff:
-                    filtered.append(reading)
-            except:
-                continue
-        
-        return filtered
+        span = spans.get(timerange)
+        return now - span if span else None
     
     def show_no_data_message(self, message="No data to display"):
         """Show message when no data available"""
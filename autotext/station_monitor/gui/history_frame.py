@@ -227,7 +227,7 @@ class HistoryFrame(ctk.CTkFrame):
             readings_to_show = all_readings[:100]  # Limit to 100 most recent
         else:
             # Get specific station
-            station = next((s for s in stations if s['name'] == selected), None)
+            station = self.db.get_station_by_name(selected)
             if not station:
                 return
             
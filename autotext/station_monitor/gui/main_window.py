@@ -2,7 +2,11 @@ import customtkinter as ctk
 from tkinter import messagebox
 from database import Database
 from config import Config
+from notifications import NotificationManager
+from alert_coalescer import AlertCoalescer
+from notification_outbox import NotificationOutbox
 from gui.dashboard_frame import DashboardFrame
+from gui.event_bus import EventBus
 from gui.stations_frame import StationsFrame
 from gui.manual_entry_frame import ManualEntryFrame
 from gui.history_frame import HistoryFrame
@@ -21,13 +25,25 @@ class MainWindow(ctk.CTk):
         self.db = Database()
         self.config = Config()
         
+        # Shared alert sending, so cooldowns apply across receivers and manual entry
+        self.notif_manager = NotificationManager(self.config)
+        self.alert_coalescer = AlertCoalescer(self.notif_manager, self.config)
+        
+        # Failed notifications are stored and retried in the background
+        self.outbox = NotificationOutbox(self.db, self.notif_manager, self.config)
+        self.notif_manager.outbox = self.outbox
+        self.outbox.start()
+        
+        # Receiver threads post readings here; the main loop applies them once per frame
+        self.event_bus = EventBus()
+        self.frame_interval = max(1, round(1000 / self.config.get("ui", {}).get("frame_rate", 10)))
+        
         # Initialize SMS receiver
         from sms_receiver import ReceiverManager
-        self.receiver_manager = ReceiverManager(self.config, self.db)
+        self.receiver_manager = ReceiverManager(self.config, self.db, self.notif_manager, self.alert_coalescer)
         
-        # Start receiver if configured
-        sms_method = self.config.get_sms_method()
-        if sms_method in ["google_voice", "email"]:
+        # Start receivers if configured; several can run at once
+        if self.config.get_receiver_methods():
             self.receiver_manager.start(self.on_sms_received)
         
         # Configure grid
@@ -50,8 +66,9 @@ class MainWindow(ctk.CTk):
         # Show dashboard by default
         self.show_frame("dashboard")
         
-        # Start auto-refresh
+        # Start auto-refresh and the event loop for receiver updates
         self.auto_refresh()
+        self.after(self.frame_interval, self.drain_events)
     
     def create_sidebar(self):
         self.sidebar = ctk.CTkFrame(self, width=200, corner_radius=0)
@@ -132,7 +149,7 @@ class MainWindow(ctk.CTk):
     def create_frames(self):
         self.frames["dashboard"] = DashboardFrame(self.main_frame, self.db)
         self.frames["stations"] = StationsFrame(self.main_frame, self.db)
-        self.frames["manual"] = ManualEntryFrame(self.main_frame, self.db)
+        self.frames["manual"] = ManualEntryFrame(self.main_frame, self.db, self.alert_coalescer)
         self.frames["history"] = HistoryFrame(self.main_frame, self.db)
         self.frames["graphs"] = GraphsFrame(self.main_frame, self.db)
         self.frames["settings"] = SettingsFrame(self.main_frame, self.db, self.config)
@@ -156,14 +173,25 @@ class MainWindow(ctk.CTk):
         self.after(5000, self.auto_refresh)
     
     def on_sms_received(self, station, value, message):
-        """Callback when SMS is received"""
-        print(f"SMS received from {station['name']}: {value}")
-        # Refresh dashboard to show new reading
-        if hasattr(self.frames["dashboard"], 'refresh'):
-            self.frames["dashboard"].refresh()
+        """Callback when SMS is received; runs on a receiver thread, so only posts to the bus"""
+        self.event_bus.post("reading", station['id'], (station, value))
+    
+    def drain_events(self):
+        """Apply everything posted since the last frame in one dashboard update"""
+        events, _ = self.event_bus.drain()
+        readings = events.get("reading")
+        if readings:
+            self.frames["dashboard"].apply_readings(readings.values())
+        self.after(self.frame_interval, self.drain_events)
     
     def destroy(self):
         """Clean up when closing"""
         if hasattr(self, 'receiver_manager'):
             self.receiver_manager.stop()
+        if hasattr(self, 'outbox'):
+            self.outbox.stop()
+        if hasattr(self, 'notif_manager'):
+            self.notif_manager.close()
+        if hasattr(self, 'db'):
+            self.db.close()
         super().destroy()
@@ -3,14 +3,18 @@ from tkinter import messagebox
 from message_parser import MessageParser
 from config import Config
 from notifications import NotificationManager
+from alert_coalescer import AlertCoalescer
 
 class ManualEntryFrame(ctk.CTkFrame):
-    def __init__(self, parent, db):
+    def __init__(self, parent, db, alert_coalescer=None):
         super().__init__(parent, corner_radius=0, fg_color="transparent")
         self.db = db
         self.parser = MessageParser()
         self.config = Config()
-        self.notif_manager = NotificationManager(self.config)
+        if alert_coalescer is None:
+            alert_coalescer = AlertCoalescer(NotificationManager(self.config), self.config)
+        self.alert_coalescer = alert_coalescer
+        self.notif_manager = alert_coalescer.notification_manager
         
         self.grid_columnconfigure(0, weight=1)
         self.grid_rowconfigure(1, weight=1)
@@ -156,8 +160,7 @@ class ManualEntryFrame(ctk.CTkFrame):
         
         # Extract station name from selection
         station_name = selection.split(" (")[0]
-        stations = self.db.get_all_stations()
-        station = next((s for s in stations if s['name'] == station_name), None)
+        station = self.db.get_station_by_name(station_name)
         
         if station:
             info_text = f"📞 {station['phone_number']}\n"
@@ -170,7 +173,9 @@ class ManualEntryFrame(ctk.CTkFrame):
             messagebox.showwarning("Warning", "Please enter a message to parse")
             return
         
-        value = self.parser.parse_value(message)
+        # Use the selected station's message template, if it has one
+        station = self.db.get_station_by_name(self.station_var.get().split(" (")[0])
+        value = self.parser.parse_value(message, station.get('message_template') if station else None)
         if value is not None:
             self.value_entry.delete(0, "end")
             self.value_entry.insert(0, str(value))
@@ -187,8 +192,7 @@ class ManualEntryFrame(ctk.CTkFrame):
         
         # Get station
         station_name = selection.split(" (")[0]
-        stations = self.db.get_all_stations()
-        station = next((s for s in stations if s['name'] == station_name), None)
+        station = self.db.get_station_by_name(station_name)
         
         if not station:
             messagebox.showerror("Error", "Station not found")
@@ -230,13 +234,15 @@ class ManualEntryFrame(ctk.CTkFrame):
                 'value': value
             }
             
-            results = self.notif_manager.send_alert(station_data, value)
-            
             notif_msg = ""
-            if results:
-                sent = [method for method, success in results.items() if success]
-                if sent:
-                    notif_msg = f"\n\nNotifications sent via: {', '.join(sent)}"
+            if self.alert_coalescer.admit(station_data, value):
+                results = self.notif_manager.send_alert(station_data, value)
+                if results:
+                    sent = [method for method, success in results.items() if success]
+                    if sent:
+                        notif_msg = f"\n\nNotifications sent via: {', '.join(sent)}"
+            else:
+                notif_msg = "\n\nThis station was alerted recently; this reading will be included in the next alert digest."
             
             messagebox.showwarning(
                 "Alert",
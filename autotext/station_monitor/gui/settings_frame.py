@@ -874,21 +874,22 @@ class SettingsFrame(ctk.CTkFrame):
                 messagebox.showerror("Error", "Receiver manager not available")
                 return
             
-            sms_method = self.config.get_sms_method()
+            methods = self.config.get_receiver_methods()
             
-            if sms_method == "manual":
+            if not methods:
                 messagebox.showinfo(
                     "Manual Mode",
                     "Manual entry mode doesn't require a receiver.\n\n"
-                    "Select Google Voice or Email to enable automatic receiving."
+                    "Select Google Voice, Email, Twilio or Webhook to enable automatic receiving."
                 )
                 return
             
-            if sms_method not in ["google_voice", "email"]:
+            unsupported = [method for method in methods if method not in ["google_voice", "email", "webhook", "twilio"]]
+            if unsupported:
                 messagebox.showinfo(
                     "Not Implemented",
-                    f"{sms_method} receiver not yet implemented.\n\n"
-                    "Available: Google Voice, Email"
+                    f"{', '.join(unsupported)} receiver not yet implemented.\n\n"
+                    "Available: Google Voice, Email, Twilio, Webhook"
                 )
                 return
             
@@ -902,7 +903,7 @@ class SettingsFrame(ctk.CTkFrame):
                 messagebox.showinfo(
                     "Started",
                     f"SMS receiver started!\n\n"
-                    f"Method: {sms_method}\n"
+                    f"Methods: {', '.join(methods)}\n"
                     f"The app will now automatically check for incoming messages."
                 )
             
@@ -1,6 +1,7 @@
 import customtkinter as ctk
 from tkinter import messagebox
 import sqlite3
+from message_parser import MessageParser
 
 class StationDialog(ctk.CTkToplevel):
     def __init__(self, parent, db, station_data=None):
@@ -11,9 +12,9 @@ class StationDialog(ctk.CTkToplevel):
         self.result = None
         
         self.title("Add Station" if not station_data else "Edit Station")
-        self.geometry("400x450")
+        self.geometry("400x620")
         self.resizable(True, True)
-        self.minsize(350, 400)
+        self.minsize(350, 560)
         
         # Make modal
         self.transient(parent)
@@ -51,6 +52,16 @@ class StationDialog(ctk.CTkToplevel):
         self.max_entry = ctk.CTkEntry(self, placeholder_text="e.g., 72.5")
         self.max_entry.pack(pady=5, padx=20, fill="x")
         
+        # Message Template
+        ctk.CTkLabel(self, text="Message Template (optional):", font=ctk.CTkFont(size=12, weight="bold")).pack(pady=(15, 5), padx=20, anchor="w")
+        self.template_entry = ctk.CTkEntry(self, placeholder_text="e.g., Reading: {value} ft")
+        self.template_entry.pack(pady=5, padx=20, fill="x")
+        
+        # Metrics: named channels in the same message, name:min:max
+        ctk.CTkLabel(self, text="Metrics (optional):", font=ctk.CTkFont(size=12, weight="bold")).pack(pady=(15, 5), padx=20, anchor="w")
+        self.metrics_entry = ctk.CTkEntry(self, placeholder_text="e.g., ph:6.5:8.5, temp:0:30, cl")
+        self.metrics_entry.pack(pady=5, padx=20, fill="x")
+        
         # Enabled checkbox
         self.enabled_var = ctk.BooleanVar(value=True)
         self.enabled_check = ctk.CTkCheckBox(self, text="Monitoring Enabled", variable=self.enabled_var)
@@ -71,6 +82,12 @@ class StationDialog(ctk.CTkToplevel):
         self.phone_entry.insert(0, self.station_data['phone_number'])
         self.min_entry.insert(0, str(self.station_data['min_value']))
         self.max_entry.insert(0, str(self.station_data['max_value']))
+        self.template_entry.insert(0, self.station_data.get('message_template') or "")
+        self.metrics_entry.insert(0, ", ".join(
+            ":".join([metric['key']] + ["" if bound is None else f"{bound:g}"
+                                        for bound in (metric['min_value'], metric['max_value'])]).rstrip(":")
+            for metric in self.station_data.get('metrics', {}).values()
+        ))
         self.enabled_var.set(bool(self.station_data['enabled']))
     
     def save(self):
@@ -78,6 +95,8 @@ class StationDialog(ctk.CTkToplevel):
         phone = self.phone_entry.get().strip()
         min_val = self.min_entry.get().strip()
         max_val = self.max_entry.get().strip()
+        template = self.template_entry.get().strip()
+        metrics_spec = self.metrics_entry.get().strip()
         
         # Validation
         if not name:
@@ -99,17 +118,32 @@ class StationDialog(ctk.CTkToplevel):
             messagebox.showerror("Error", "Minimum value must be less than maximum value")
             return
         
+        if template:
+            try:
+                MessageParser.compile_template(template)
+            except ValueError as e:
+                messagebox.showerror("Error", f"Invalid message template: {e}")
+                return
+        
+        try:
+            metrics = self.parse_metrics_spec(metrics_spec)
+        except ValueError as e:
+            messagebox.showerror("Error", f"Invalid metrics: {e}")
+            return
+        
         try:
             if self.station_data:
                 # Update existing
                 self.db.update_station(
                     self.station_data['id'],
                     name, phone, min_val, max_val,
-                    self.enabled_var.get()
+                    self.enabled_var.get(), template
                 )
+                station_id = self.station_data['id']
             else:
                 # Add new
-                self.db.add_station(name, phone, min_val, max_val)
+                station_id = self.db.add_station(name, phone, min_val, max_val, template)
+            self.db.set_station_metrics(station_id, metrics)
             
             self.result = True
             self.destroy()
@@ -118,6 +152,18 @@ class StationDialog(ctk.CTkToplevel):
         except Exception as e:
             messagebox.showerror("Error", f"Failed to save station: {str(e)}")
     
+    @staticmethod
+    def parse_metrics_spec(spec: str):
+        """"ph:6.5:8.5, temp::30, cl" -> [(key, min, max)]; empty bounds are None"""
+        metrics = []
+        for item in filter(None, (part.strip() for part in spec.split(","))):
+            key, *bounds = [field.strip() for field in item.split(":")]
+            if not key.isidentifier() or len(bounds) > 2:
+                raise ValueError(f"'{item}' should look like name:min:max")
+            bounds = [float(bound) if bound else None for bound in bounds] + [None, None]
+            metrics.append((key.lower(), bounds[0], bounds[1]))
+        return metrics
+    
     def cancel(self):
         self.result = False
         self.destroy()
@@ -0,0 +1,411 @@
+"""
+Ingestion - Staged pipeline shared by every receiver: receive, parse,
+enrich, persist, evaluate and notify
+"""
+import re
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+from database import Database
+from message_parser import MessageParser
+from pipeline import Stage, chain
+
+# How long per-minute throughput and lag are averaged over
+METRICS_WINDOW = 60
+
+STAGES = ["receive", "parse", "enrich", "persist", "evaluate", "notify"]
+
+class _SourceStats:
+    """Counters for one receiver source"""
+    
+    def __init__(self):
+        self.received = 0
+        self.rejected = 0
+        self.stored = 0
+        self.duplicates = 0
+        self.dropped = 0  # unknown phone number, unparsable or failed to save
+        self.healthy = True
+        self.last_error = ""
+        self.last_received_at: Optional[float] = None
+        self.last_lag = 0.0
+        # (monotonic time, readings stored, summed lag) per persisted batch
+        self.window: Deque[Tuple[float, int, float]] = deque()
+    
+    def trim(self, now: float):
+        while self.window and now - self.window[0][0] > METRICS_WINDOW:
+            self.window.popleft()
+
+class _Message:
+    """One message as it moves through the stages"""
+    
+    __slots__ = ("source", "phone", "text", "message_id", "received_at",
+                 "station", "value", "metric_values", "rows")
+    
+    def __init__(self, source: str, phone: str, text: str, message_id: Optional[str], received_at: float):
+        self.source = source
+        self.phone = phone
+        self.text = text
+        self.message_id = message_id
+        self.received_at = received_at
+        self.station: Optional[Dict] = None
+        self.value: Optional[float] = None
+        self.metric_values: List[Tuple[Dict, float]] = []
+        self.rows: List[tuple] = []
+
+class IngestionPipeline:
+    """
+    Messages from all running receivers pass through six stages, each a
+    bounded queue with its own workers and batch size:
+    
+    - receive: skip message IDs already stored
+    - parse: find the station and parse the reading
+    - enrich: named metrics and the rows to insert
+    - persist: claim message IDs and insert the rows, one commit each
+    - evaluate: UI callback and threshold checks
+    - notify: hand alerts to the dispatcher
+    
+    A full stage makes the one before it wait, back to the receive queue:
+    polling receivers then wait for room, and the webhook server is told
+    no, so it can answer 503.
+    """
+    
+    def __init__(self, config, db: Database, dedup_store, on_message_callback: Optional[Callable] = None,
+                 alert_dispatcher=None):
+        ingestion_config = config.config.get("ingestion", {})
+        self.config = config
+        self.db = db
+        self.dedup = dedup_store
+        self.parser = MessageParser()
+        for pattern in config.config.get("parsing", {}).get("formats", []):
+            try:
+                self.parser.add_format(pattern)
+            except (ValueError, re.error) as e:
+                print(f"Ignoring message format {pattern!r}: {e}")
+        self.on_message_callback = on_message_callback
+        self.alert_dispatcher = alert_dispatcher
+        
+        max_queue = ingestion_config.get("max_queue", 10000)
+        batch_size = ingestion_config.get("batch_size", 200)
+        stages_config = ingestion_config.get("stages", {})
+        handlers = {
+            "receive": self._receive,
+            "parse": self._parse,
+            "enrich": self._enrich,
+            "persist": self._persist,
+            "evaluate": self._evaluate,
+            "notify": self._notify
+        }
+        self.stages: Dict[str, Stage] = {}
+        for name in STAGES:
+            stage_config = stages_config.get(name, {})
+            self.stages[name] = Stage(
+                name, handlers[name],
+                workers=stage_config.get("workers", 1),
+                batch_size=stage_config.get("batch_size", batch_size),
+                max_queue=stage_config.get("max_queue", max_queue),
+                # Messages lost before they are stored still count as handled
+                on_error=self._on_stage_error if STAGES.index(name) <= STAGES.index("persist") else None
+            )
+        chain([self.stages[name] for name in STAGES])
+        self.max_queue = self.stages["receive"].max_queue
+        
+        self._lock = threading.Lock()
+        self._done = threading.Condition(self._lock)
+        self._submitted = 0
+        self._completed = 0
+        self._sources: Dict[str, _SourceStats] = {}
+        self.running = False
+    
+    def start(self):
+        """Start every stage's workers"""
+        if self.running:
+            return
+        self.running = True
+        for name in STAGES:
+            self.stages[name].start()
+    
+    def stop(self):
+        """Finish what is already queued, stage by stage, then stop"""
+        self.running = False
+        for name in STAGES:
+            self.stages[name].stop()
+    
+    def register(self, source: str):
+        """List a source in the metrics before its first message"""
+        with self._lock:
+            self._sources.setdefault(source, _SourceStats())
+    
+    def report_health(self, source: str, healthy: bool, error: str = ""):
+        """Receivers report whether their connection is working"""
+        with self._lock:
+            stats = self._sources.setdefault(source, _SourceStats())
+            stats.healthy = healthy
+            if error:
+                stats.last_error = error
+    
+    def qsize(self) -> int:
+        """Messages waiting to be received"""
+        return self.stages["receive"].qsize()
+    
+    def submit(self, source: str, messages: List[Tuple[str, str, Optional[str]]],
+               block: bool = True, timeout: Optional[float] = None) -> bool:
+        """
+        Queue (phone, text, message_id) messages, all or none. With block,
+        waits up to timeout (forever if None) for room; otherwise returns
+        False straight away if the queue is full.
+        """
+        if not messages:
+            return True
+        
+        received_at = time.monotonic()
+        items = [_Message(source, phone, text, message_id, received_at) for phone, text, message_id in messages]
+        # Count first so a flush from another thread waits for these too
+        with self._lock:
+            stats = self._sources.setdefault(source, _SourceStats())
+            self._submitted += len(items)
+            stats.received += len(items)
+        
+        if not self.stages["receive"].put(items, block, timeout):
+            with self._lock:
+                self._completed += len(items)
+                stats.received -= len(items)
+                stats.rejected += len(items)
+                self._done.notify_all()
+            return False
+        
+        with self._lock:
+            stats.last_received_at = time.time()
+        return True
+    
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until everything submitted so far has been stored or dropped"""
+        with self._lock:
+            target = self._submitted
+            return self._done.wait_for(lambda: self._completed >= target, timeout)
+    
+    def _settle(self, items: List[_Message], duplicates: bool = False, stored: bool = False):
+        """Count messages leaving the pipeline before or at persist"""
+        if not items:
+            return
+        now = time.monotonic()
+        with self._lock:
+            by_source: Dict[str, List[_Message]] = {}
+            for item in items:
+                by_source.setdefault(item.source, []).append(item)
+            for source, source_items in by_source.items():
+                stats = self._sources.setdefault(source, _SourceStats())
+                if stored:
+                    lags = [now - item.received_at for item in source_items]
+                    stats.stored += len(lags)
+                    stats.last_lag = lags[-1]
+                    stats.window.append((now, len(lags), sum(lags)))
+                elif duplicates:
+                    stats.duplicates += len(source_items)
+                else:
+                    stats.dropped += len(source_items)
+            self._completed += len(items)
+            self._done.notify_all()
+    
+    def _on_stage_error(self, items: List[_Message], error: Exception):
+        self._settle(items)
+    
+    def _receive(self, items: List[_Message]) -> List[_Message]:
+        """Skip message IDs already stored; claiming new ones waits for persist"""
+        seen = self.dedup.seen
+        new, duplicates = [], []
+        for item in items:
+            if item.message_id and seen(item.source, item.message_id):
+                print(f"Skipping duplicate message {item.message_id}")
+                duplicates.append(item)
+            else:
+                new.append(item)
+        self._settle(duplicates, duplicates=True)
+        return new
+    
+    def _parse(self, items: List[_Message]) -> List[_Message]:
+        """Find each station by phone number and parse with its template"""
+        found, dropped = [], []
+        for item in items:
+            item.station = self.db.get_station_by_phone(item.phone)
+            if item.station:
+                found.append(item)
+            else:
+                print(f"Unknown phone number: {item.phone}")
+                dropped.append(item)
+        
+        values = self.parser.parse_many([item.text for item in found],
+                                        [item.station.get('message_template') for item in found])
+        parsed = []
+        for item, value in zip(found, values):
+            if value is None:
+                print(f"Could not parse value from: {item.text}")
+                dropped.append(item)
+                continue
+            item.value = value
+            parsed.append(item)
+        
+        # Record dropped IDs too, so a receiver that sees them again skips them
+        ids: Dict[str, List[str]] = {}
+        for item in dropped:
+            if item.message_id:
+                ids.setdefault(item.source, []).append(item.message_id)
+        for source, source_ids in ids.items():
+            self.dedup.add_many(source, source_ids)
+        self._settle(dropped)
+        return parsed
+    
+    def _enrich(self, items: List[_Message]) -> List[_Message]:
+        """
+        Rows to insert: the station's named metrics found in the text, and
+        the station's own reading unless the metrics replace it
+        """
+        for item in items:
+            station = item.station
+            item.rows = []
+            station_metrics = station.get('metrics')
+            if station_metrics:
+                for key, metric_value in self.parser.parse_metrics(item.text).items():
+                    metric = station_metrics.get(key)
+                    if metric:
+                        item.rows.append((station['id'], metric_value, item.text, None, metric['id']))
+                        item.metric_values.append((metric, metric_value))
+            
+            if item.metric_values and not station.get('message_template'):
+                # Without a template the station's value is just the first
+                # number, i.e. a metric already stored and checked above
+                item.value = None
+            else:
+                item.rows.insert(0, (station['id'], item.value, item.text, None))
+        return items
+    
+    def _persist(self, items: List[_Message]) -> List[_Message]:
+        """
+        Claim message IDs with one commit per source, then store every row
+        with one more. Both writes stay on this stage's thread, so the
+        receivers' connections never wait on each other for SQLite's lock.
+        """
+        ids: Dict[str, List[str]] = {}
+        for item in items:
+            if item.message_id:
+                ids.setdefault(item.source, []).append(item.message_id)
+        is_new = {source: iter(self.dedup.add_many(source, source_ids)) for source, source_ids in ids.items()}
+        
+        new, duplicates = [], []
+        for item in items:
+            if item.message_id and not next(is_new[item.source]):
+                print(f"Skipping duplicate message {item.message_id}")
+                duplicates.append(item)
+            else:
+                new.append(item)
+        self._settle(duplicates, duplicates=True)
+        if not new:
+            return []
+        
+        try:
+            self.db.add_readings_bulk([row for item in new for row in item.rows])
+        except Exception as e:
+            print(f"Error saving readings: {e}")
+            # Let a redelivery of these messages try again
+            for item in new:
+                if item.message_id:
+                    self.dedup.discard(item.source, item.message_id)
+            self._settle(new)
+            return []
+        self._settle(new, stored=True)
+        return new
+    
+    def _evaluate(self, items: List[_Message]) -> List[Tuple[Dict, float]]:
+        """Run the UI callback and pass on readings outside their thresholds"""
+        alerts = []
+        for item in items:
+            station, value = item.station, item.value
+            try:
+                if value is None:
+                    print(f"Received readings from {station['name']}: " +
+                          ", ".join(f"{metric['name']} {metric_value}" for metric, metric_value in item.metric_values))
+                else:
+                    print(f"Received reading from {station['name']}: {value}")
+                    
+                    # Callback for UI updates
+                    if self.on_message_callback:
+                        self.on_message_callback(station, value, item.text)
+                    
+                    if value < station['min_value'] or value > station['max_value']:
+                        alerts.append((station, value))
+                
+                for metric, metric_value in item.metric_values:
+                    low, high = metric['min_value'], metric['max_value']
+                    if (low is not None and metric_value < low) or (high is not None and metric_value > high):
+                        # Alert as the station's channel, against the metric's thresholds
+                        alerts.append((dict(
+                            station, name=f"{station['name']} {metric['name']}", metric_id=metric['id'],
+                            min_value=low if low is not None else float("-inf"),
+                            max_value=high if high is not None else float("inf")
+                        ), metric_value))
+            
+            except Exception as e:
+                print(f"Error processing message: {e}")
+        return alerts
+    
+    def _notify(self, alerts: List[Tuple[Dict, float]]) -> List:
+        for station, value in alerts:
+            self._send_alert_notifications(station, value)
+        return []
+    
+    def _send_alert_notifications(self, station, value):
+        """Queue alert notifications; sending happens on the dispatcher's threads"""
+        if self.alert_dispatcher:
+            self.alert_dispatcher.enqueue(station, value)
+            return
+        
+        try:
+            from notifications import NotificationManager
+            
+            notif_manager = NotificationManager(self.config)
+            
+            station_data = {
+                'name': station['name'],
+                'phone_number': station['phone_number'],
+                'min_value': station['min_value'],
+                'max_value': station['max_value'],
+                'value': value
+            }
+            
+            notif_manager.send_alert(station_data, value)
+        except Exception as e:
+            print(f"Error sending notifications: {e}")
+    
+    def get_metrics(self) -> Dict:
+        """
+        Receive queue depth; health, lag and throughput for each source; and
+        queue depth, counts and latency histogram for each stage
+        """
+        stages = {name: self.stages[name].get_metrics() for name in STAGES}
+        now = time.monotonic()
+        with self._lock:
+            sources = {}
+            for source, stats in self._sources.items():
+                stats.trim(now)
+                stored_recently = sum(count for _, count, _ in stats.window)
+                lag_total = sum(lag for _, _, lag in stats.window)
+                sources[source] = {
+                    'healthy': stats.healthy,
+                    'last_error': stats.last_error,
+                    'received': stats.received,
+                    'rejected': stats.rejected,
+                    'stored': stats.stored,
+                    'duplicates': stats.duplicates,
+                    'dropped': stats.dropped,
+                    'processed': stats.stored + stats.duplicates + stats.dropped,
+                    'stored_per_minute': stored_recently * 60 / METRICS_WINDOW,
+                    'lag_avg': lag_total / stored_recently if stored_recently else 0.0,
+                    'lag_last': stats.last_lag,
+                    'last_message_age': time.time() - stats.last_received_at if stats.last_received_at else None
+                }
+            return {
+                'queue_depth': stages["receive"]['queue_depth'],
+                'max_queue': self.max_queue,
+                'sources': sources,
+                'stages': stages
+            }
@@ -1,11 +1,81 @@
 import re
-from typing import Optional, Tuple
+from typing import Dict, List, Optional, Pattern, Sequence, Tuple
+
+# A reading: optional minus, digits, optional decimals
+NUMBER = r'-?\d+(?:\.\d+)?'
+
+# "Station 1", "Stn #4", "Site A2": an identifier, not the reading. It
+# never ends inside a number, so "Station 56.893" has no label.
+_STATION_LABEL = r'\s*(?i:station|stn|site|unit)\s*#?\s*[a-zA-Z0-9]+\b(?!\.?\d)'
+# Default format in one pass: skip a leading station label if another number
+# follows it, then take the first decimal, else the first integer
+_DEFAULT = re.compile(
+    r'(?:' + _STATION_LABEL + r'(?=.*?\d)|)'
+    r'(?:.*?(-?\d+\.\d+)|.*?(-?\d+))',
+    re.DOTALL
+)
+# "pH 7.2", "Temp: 18.4", "Cl2=0.8": a name, then its reading. Digits end a
+# name only before a separator, so "Temp18.4" is temp = 18.4; times such as
+# "at 10:30" are not readings.
+_METRIC_PAIR = re.compile(
+    r'([A-Za-z][A-Za-z_]*(?:\d+(?=\s|[:=]))?)\s*[:=]?\s*(' + NUMBER + r')(?![\d.:])'
+)
+_STATION_LABEL_AT_START = re.compile(_STATION_LABEL)
+_STATION_NAME = re.compile(r'station\s*(\d+|[a-zA-Z0-9]+)', re.IGNORECASE)
+_TEMPLATE_FIELD = re.compile(r'\{(\w*)\}')
 
 class MessageParser:
-    """Parse incoming text messages to extract metric values"""
+    """
+    Parse incoming text messages to extract metric values. Patterns are
+    compiled once. A station can have a message template such as
+    "Reading: {value} ft"; messages that don't match it fall back to the
+    default formats.
+    """
+    
+    def __init__(self):
+        self._templates: Dict[str, Pattern] = {}
+        self._formats: List[Pattern] = []
     
     @staticmethod
-    def parse_value(message: str) -> Optional[float]:
+    def compile_template(template: str) -> Pattern:
+        """
+        Turn a template into a regex. {value} marks the reading and must
+        appear once; any other {field} matches any text. Whitespace is
+        flexible and letters match either case.
+        """
+        parts = _TEMPLATE_FIELD.split(template.strip())
+        fields = parts[1::2]
+        if fields.count("value") != 1:
+            raise ValueError("Template must contain {value} exactly once")
+        
+        pattern = []
+        for i, part in enumerate(parts):
+            if i % 2:
+                pattern.append(f"(?P<value>{NUMBER})" if part == "value" else r'.*?')
+            else:
+                words = part.split()
+                if words:
+                    pattern.append(r'\s*' + r'\s*'.join(re.escape(word) for word in words) + r'\s*')
+        return re.compile("".join(pattern), re.IGNORECASE)
+    
+    def add_format(self, pattern: str):
+        """Try a regex with a (?P<value>...) group before the default formats"""
+        compiled = re.compile(pattern, re.IGNORECASE)
+        if "value" not in compiled.groupindex:
+            raise ValueError("Format needs a (?P<value>...) group")
+        self._formats.append(compiled)
+    
+    def _template(self, template: str) -> Optional[Pattern]:
+        compiled = self._templates.get(template)
+        if compiled is None:
+            try:
+                compiled = self.compile_template(template)
+            except ValueError:
+                return None
+            self._templates[template] = compiled
+        return compiled
+    
+    def parse_value(self, message: str, template: Optional[str] = None) -> Optional[float]:
         """
         Extract numeric value from message.
         Handles formats like:
@@ -14,21 +84,76 @@ class MessageParser:
         - "Reading: 104.295"
         - "Value is 72.5"
         """
-        # Try to find decimal numbers
-        patterns = [
-            r'[-]?\d+\.\d+',  # Decimal number
-            r'[-]?\d+',       # Integer
-        ]
+        if template or self._formats:
+            return self._parse_formatted(message, template)
         
-        for pattern in patterns:
-            match = re.search(pattern, message)
+        # Fast path: no template or added formats, one precompiled match
+        match = _DEFAULT.match(message)
+        if match is None:
+            return None
+        decimal, integer = match.groups()
+        return float(decimal or integer)
+    
+    def _parse_formatted(self, message: str, template: Optional[str]) -> Optional[float]:
+        """Template, then added formats, then the default format"""
+        if template:
+            compiled = self._template(template)
+            match = compiled.search(message) if compiled else None
+            if match:
+                return float(match.group("value"))
+        
+        for compiled in self._formats:
+            match = compiled.search(message)
             if match:
                 try:
-                    return float(match.group())
+                    return float(match.group("value"))
                 except ValueError:
                     continue
         
-        return None
+        match = _DEFAULT.match(message)
+        if match is None:
+            return None
+        decimal, integer = match.groups()
+        return float(decimal or integer)
+    
+    def parse_many(self, messages: Sequence[str],
+                   templates: Optional[Sequence[Optional[str]]] = None) -> List[Optional[float]]:
+        """
+        parse_value over a backlog; templates, if given, is one per message.
+        Messages without a template go through the default format in one
+        tight loop; the rest take the template path.
+        """
+        default = _DEFAULT.match
+        parse_formatted = self._parse_formatted
+        formatted = bool(self._formats)
+        values: List[Optional[float]] = []
+        append = values.append
+        for i, message in enumerate(messages):
+            if formatted or (templates and templates[i]):
+                append(parse_formatted(message, templates[i] if templates else None))
+                continue
+            match = default(message)
+            if match is None:
+                append(None)
+            else:
+                decimal, integer = match.groups()
+                append(float(decimal or integer))
+        return values
+    
+    @staticmethod
+    def parse_metrics(message: str) -> Dict[str, float]:
+        """
+        Named readings in one pass, e.g. "pH 7.2 Temp 18.4 Cl 0.8" gives
+        {"ph": 7.2, "temp": 18.4, "cl": 0.8}. Names are lower case; a
+        leading station label is skipped, and the first value of a repeated
+        name wins.
+        """
+        label = _STATION_LABEL_AT_START.match(message)
+        start = label.end() if label else 0
+        metrics: Dict[str, float] = {}
+        for name, value in _METRIC_PAIR.findall(message, start):
+            metrics.setdefault(name.lower(), float(value))
+        return metrics
     
     @staticmethod
     def parse_station_and_value(message: str) -> Tuple[Optional[str], Optional[float]]:
@@ -37,10 +162,10 @@ class MessageParser:
         Returns (station_name, value)
         """
         # Try to extract station name/number
-        station_match = re.search(r'station\s*(\d+|[a-zA-Z0-9]+)', message, re.IGNORECASE)
+        station_match = _STATION_NAME.search(message)
         station_name = station_match.group(1) if station_match else None
         
         # Extract value
-        value = MessageParser.parse_value(message)
+        value = MessageParser().parse_value(message)
         
         return station_name, value
@@ -0,0 +1,198 @@
+"""
+Notification Outbox - Retry failed notifications from a durable table
+"""
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+from notifications import DeliveryTask
+
+class _TokenBucket:
+    """Allow rate_per_minute sends, with bursts of up to ten seconds' worth"""
+    
+    def __init__(self, rate_per_minute: float):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1.0, self.rate * 10)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+    
+    def reserve(self) -> float:
+        """Take a token. Returns 0, or the seconds to wait if none is available."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+class NotificationOutbox:
+    """
+    Notifications that could not be delivered are stored in the
+    notification_outbox table and resent by a background thread with
+    exponential backoff, so alerts survive provider outages and restarts.
+    
+    Each entry has an idempotency key: the same delivery is stored at most
+    once however many times it is deferred. Sends are rate limited per
+    provider. Delivery is at-least-once: a crash between a successful send
+    and marking it delivered resends it on the next start.
+    """
+    
+    def __init__(self, db, notification_manager, config):
+        outbox_config = config.config.get("notifications", {}).get("outbox", {})
+        self.db = db
+        self.notification_manager = notification_manager
+        self.poll_interval = outbox_config.get("poll_interval", 5)
+        self.batch_size = outbox_config.get("batch_size", 20)
+        self.max_attempts = outbox_config.get("max_attempts", 8)
+        self.backoff_base = outbox_config.get("backoff_base", 30)
+        self.backoff_max = outbox_config.get("backoff_max", 3600)
+        self.retention_days = outbox_config.get("retention_days", 7)
+        self.rate_limits = outbox_config.get("rate_limits", {})
+        
+        self.running = False
+        self.thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._buckets: Dict[str, _TokenBucket] = {}
+        
+        self._metrics_lock = threading.Lock()
+        self._deferred = 0
+        self._duplicates = 0
+        self._delivered = 0
+        self._retried = 0
+        self._failed = 0
+        self._throttled = 0
+        self._recent: deque = deque()  # monotonic times of recent deliveries
+    
+    def start(self):
+        """Start the delivery thread; pending entries from a previous run are picked up"""
+        if self.running:
+            return
+        self.running = True
+        self._stop_event.clear()
+        self.thread = threading.Thread(target=self._worker, name="notification-outbox", daemon=True)
+        self.thread.start()
+    
+    def stop(self, timeout: float = 5):
+        """Stop after the delivery in hand; undelivered entries stay in the table"""
+        self.running = False
+        self._stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=timeout)
+            self.thread = None
+    
+    def enqueue(self, task: DeliveryTask, error: str = "") -> bool:
+        """
+        Store a delivery for retry. A task that already failed (error set)
+        waits one backoff interval; otherwise it is due immediately.
+        Returns False if the key was already stored.
+        """
+        now = time.time()
+        next_attempt_at = now + self._backoff(1) if error else now
+        stored = self.db.enqueue_notification(
+            task.key, task.channel, self.notification_manager.provider_for(task.channel),
+            task.recipient, task.subject, task.message, task.station_data,
+            error=error, attempts=1 if error else 0, next_attempt_at=next_attempt_at
+        )
+        with self._metrics_lock:
+            if stored:
+                self._deferred += 1
+            else:
+                self._duplicates += 1
+        return stored
+    
+    def _backoff(self, attempts: int) -> float:
+        """Seconds to wait after the given number of failed attempts, with jitter"""
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+        return delay * random.uniform(0.8, 1.2)
+    
+    def _bucket(self, provider: str) -> _TokenBucket:
+        bucket = self._buckets.get(provider)
+        if bucket is None:
+            bucket = self._buckets[provider] = _TokenBucket(self.rate_limits.get(provider, 60))
+        return bucket
+    
+    def _worker(self):
+        """Deliver due entries until stopped"""
+        purge_at = 0.0
+        while self.running:
+            try:
+                if time.monotonic() >= purge_at:
+                    self.db.purge_delivered_notifications(self.retention_days)
+                    purge_at = time.monotonic() + 3600
+                processed = self.drain_once()
+            except Exception as e:
+                print(f"Notification outbox error: {e}")
+                processed = 0
+            # A full batch means more may be due; otherwise wait for the next poll
+            if processed < self.batch_size:
+                self._stop_event.wait(self.poll_interval)
+    
+    def drain_once(self) -> int:
+        """Try every due entry once. Returns how many entries were handled."""
+        entries = self.db.get_due_notifications(self.batch_size)
+        for entry in entries:
+            if self._stop_event.is_set():
+                break
+            self._process(entry)
+        return len(entries)
+    
+    def _process(self, entry: Dict):
+        """Send one outbox entry and record the outcome"""
+        wait = self._bucket(entry['provider']).reserve()
+        if wait > 0:
+            # Over the provider's rate: try again when a token is available
+            self.db.reschedule_notification(entry['id'], time.time() + wait, attempted=False)
+            with self._metrics_lock:
+                self._throttled += 1
+            return
+        
+        task = DeliveryTask(entry['channel'], entry['recipient'], entry['subject'] or "",
+                            entry['message'] or "", entry['payload'], entry['idempotency_key'])
+        try:
+            success = self.notification_manager.deliver(task)
+            error = "" if success else "send failed"
+        except Exception as e:
+            success, error = False, str(e)
+        
+        if success:
+            self.db.mark_notification_delivered(entry['id'])
+            with self._metrics_lock:
+                self._delivered += 1
+                self._recent.append(time.monotonic())
+            return
+        
+        attempts = entry['attempts'] + 1
+        if attempts >= self.max_attempts:
+            print(f"Giving up on {task.channel} notification to {task.recipient} "
+                  f"after {attempts} attempts: {error}")
+            self.db.reschedule_notification(entry['id'], time.time(), error, give_up=True)
+            with self._metrics_lock:
+                self._failed += 1
+        else:
+            self.db.reschedule_notification(entry['id'], time.time() + self._backoff(attempts), error)
+            with self._metrics_lock:
+                self._retried += 1
+    
+    def get_metrics(self) -> Dict:
+        """
+        Backlog (entries waiting to be sent), counters, and drain throughput
+        as deliveries in the last minute
+        """
+        counts = self.db.get_outbox_counts()
+        now = time.monotonic()
+        with self._metrics_lock:
+            while self._recent and now - self._recent[0] > 60:
+                self._recent.popleft()
+            return {
+                'backlog': counts['pending'],
+                'failed_total': counts['failed'],
+                'deferred': self._deferred,
+                'duplicates': self._duplicates,
+                'delivered': self._delivered,
+                'retried': self._retried,
+                'gave_up': self._failed,
+                'throttled': self._throttled,
+                'delivered_per_minute': len(self._recent)
+            }
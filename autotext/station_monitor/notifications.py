@@ -1,26 +1,217 @@
 import smtplib
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from typing import Dict, List
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlsplit
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
+from smtp_session import SMTPSession
+
+class DeliveryResult(NamedTuple):
+    """Outcome of sending one notification to one recipient"""
+    channel: str        # email, sms or push
+    recipient: str
+    success: bool
+    latency: float      # seconds
+    error: str = ""
+
+class DeliveryTask(NamedTuple):
+    """One notification to one recipient, with everything needed to resend it"""
+    channel: str
+    recipient: str
+    subject: str
+    message: str
+    station_data: Dict
+    key: str = ""       # idempotency key; tasks with a key go to the outbox on failure
 
 class NotificationManager:
     """Manage sending notifications via email, SMS, and push"""
     
     def __init__(self, config):
         self.config = config
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._sessions: Dict[str, requests.Session] = {}
+        self._sessions_lock = threading.Lock()
+        self._smtp_session: Optional[SMTPSession] = None
+        self._smtp_key = None
+        self._smtp_lock = threading.Lock()
+        # NotificationOutbox that retries failed deliveries, if one is attached
+        self.outbox = None
     
-    def send_alert(self, station_data: Dict, reading_value: float) -> Dict[str, bool]:
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Shared pool that sends every channel and recipient concurrently"""
+        with self._executor_lock:
+            if self._executor is None:
+                workers = self.config.config.get("alert_dispatch", {}).get("fanout_workers", 16)
+                self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="notify")
+            return self._executor
+    
+    def _get_session(self, url: str) -> requests.Session:
         """
-        Send alert via all enabled notification methods
-        Returns dict of {method: success}
+        Long-lived session for a provider host. Connections are kept alive
+        and pooled, so repeat sends skip the TCP and TLS handshakes.
         """
-        results = {}
+        parts = urlsplit(url)
+        host = f"{parts.scheme}://{parts.netloc}"
         
-        notification_config = self.config.config.get("notifications", {})
+        with self._sessions_lock:
+            session = self._sessions.get(host)
+            if session is None:
+                http_config = self.config.config.get("http", {})
+                retries = http_config.get("retries", 2)
+                # Only retry when the provider did not take the message:
+                # connection failures and explicit throttling/unavailable
+                retry = Retry(
+                    total=retries,
+                    connect=retries,
+                    read=0,
+                    status=retries,
+                    status_forcelist=(429, 503),
+                    allowed_methods=frozenset(["GET", "POST"]),
+                    backoff_factor=http_config.get("backoff_factor", 0.5),
+                    raise_on_status=False
+                )
+                pool_size = http_config.get("pool_size", 16)
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._sessions[host] = session
+            return session
+    
+    def _post(self, url: str, **kwargs) -> requests.Response:
+        """POST through the pooled session for the URL's host"""
+        return self._get_session(url).post(url, **kwargs)
+    
+    def close(self):
+        """Shut down the send pool and close pooled HTTP and SMTP connections"""
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+        with self._sessions_lock:
+            sessions, self._sessions = self._sessions, {}
+        for session in sessions.values():
+            session.close()
+        with self._smtp_lock:
+            if self._smtp_session is not None:
+                self._smtp_session.close()
+                self._smtp_session = None
+    
+    def _run_tasks(self, tasks: List[DeliveryTask], deadline: Optional[float] = None) -> List[DeliveryResult]:
+        """
+        Run delivery tasks in parallel and wait at most deadline seconds for
+        all of them. Tasks still running at the deadline are reported as
+        failed. Failed tasks with a key are handed to the outbox for retry.
+        """
+        if not tasks:
+            return []
+        if deadline is None:
+            deadline = self.config.config.get("alert_dispatch", {}).get("deadline", 30)
+        
+        def timed(send: Callable[[], List[bool]], count: int):
+            start = time.perf_counter()
+            try:
+                successes = [bool(success) for success in send()]
+                error = ""
+            except Exception as e:
+                successes, error = [False] * count, str(e)
+            latency = time.perf_counter() - start
+            return [(success, latency, error) for success in successes]
         
-        # Prepare alert message
+        # Emails share one SMTP connection, so they go out as one batch
+        emails = [task for task in tasks if task.channel == "email"]
+        groups = [[task] for task in tasks if task.channel != "email"]
+        if emails:
+            groups.insert(0, emails)
+        
+        executor = self._get_executor()
+        started = time.perf_counter()
+        futures = [executor.submit(timed, lambda group=group: self._deliver_group(group), len(group))
+                   for group in groups]
+        wait(futures, timeout=deadline)
+        
+        results = []
+        for group, future in zip(groups, futures):
+            if future.done():
+                outcomes = future.result()
+            else:
+                future.cancel()
+                outcomes = [(False, time.perf_counter() - started, "deadline exceeded")] * len(group)
+                # Let a late finish still decide whether the outbox retries it
+                future.add_done_callback(lambda done, group=group: self._defer_late(group, done))
+            for task, (success, latency, error) in zip(group, outcomes):
+                if not success:
+                    if error:
+                        print(f"{task.channel} notification to {task.recipient} failed: {error}")
+                    if error != "deadline exceeded":
+                        self._defer(task, error or "send failed")
+                results.append(DeliveryResult(task.channel, task.recipient, success, latency, error))
+        return results
+    
+    def _deliver_group(self, group: List[DeliveryTask]) -> List[bool]:
+        """Send a group from _run_tasks: a batch of emails or a single task"""
+        if group[0].channel == "email":
+            return self.send_email_batch([(task.subject, task.message) for task in group])
+        return [self.deliver(group[0])]
+    
+    def _defer(self, task: DeliveryTask, error: str):
+        """Hand a failed task to the outbox, if there is one"""
+        if self.outbox is not None and task.key:
+            try:
+                self.outbox.enqueue(task, error)
+            except Exception as e:
+                print(f"Could not queue {task.channel} notification for retry: {e}")
+    
+    def _defer_late(self, group: List[DeliveryTask], future):
+        """Defer tasks that overran the deadline if they ended up failing"""
+        if future.cancelled():
+            for task in group:
+                self._defer(task, "deadline exceeded")
+            return
+        for task, (success, _, error) in zip(group, future.result()):
+            if not success:
+                self._defer(task, error or "send failed")
+    
+    def provider_for(self, channel: str) -> str:
+        """Name of the service a channel sends through, for rate limiting"""
+        if channel == "email":
+            return "smtp"
+        if channel == "sms":
+            return self.config.config.get("notifications", {}).get("sms", {}).get("provider", "twilio")
+        return channel
+    
+    def deliver(self, task: DeliveryTask) -> bool:
+        """Send one task once, without retrying or deferring on failure"""
+        if task.channel == "email":
+            return self.send_email_batch([(task.subject, task.message)])[0]
+        if task.channel == "push":
+            return self.send_push_notification(task.subject, task.message, task.station_data)
+        if task.channel == "sms":
+            text = f"{task.subject}\n\n{task.message}" if task.subject else task.message
+            provider = self.provider_for("sms")
+            if provider == "twilio":
+                return self._send_twilio_one(text, task.recipient)
+            if provider == "vonage":
+                return self._send_vonage_one(text, task.recipient)
+            senders = {
+                "aws_sns": self._send_aws_sns_sms,
+                "google_voice": self._send_google_voice_sms,
+                "webhook": self._send_webhook_sms
+            }
+            send = senders.get(provider)
+            return bool(send and send(text, task.recipient.split(", ")))
+        return False
+    
+    def _format_alert(self, station_data: Dict, reading_value: float) -> Tuple[str, str]:
+        """Build the alert subject and message"""
         station_name = station_data.get('name', 'Unknown')
         phone = station_data.get('phone_number', '')
         min_val = station_data.get('min_value', 0)
@@ -43,162 +234,261 @@ Station Phone: {phone}
 
 Action Required: Contact technician to adjust readings.
 """
+        return subject, message
+    
+    def _alert_tasks(self, alerts: List[Tuple[str, str, Dict]]) -> List[DeliveryTask]:
+        """
+        Delivery tasks for (subject, message, station_data) alerts: one per
+        enabled channel and recipient. Each alert gets its own idempotency
+        key, so a retry from the outbox is never sent twice.
+        """
+        notification_config = self.config.config.get("notifications", {})
+        tasks = []
         
-        # Send via enabled methods
-        if notification_config.get("email", {}).get("enabled", False):
-            results["email"] = self.send_email_notification(subject, message)
-        
-        if notification_config.get("sms", {}).get("enabled", False):
-            results["sms"] = self.send_sms_notification(subject, message)
+        for subject, message, station_data in alerts:
+            key = uuid.uuid4().hex
+            if notification_config.get("email", {}).get("enabled", False):
+                to_emails = notification_config.get("email", {}).get("to_emails", [])
+                tasks.append(DeliveryTask("email", ", ".join(to_emails), subject, message,
+                                          station_data, f"{key}:email"))
+            
+            if notification_config.get("sms", {}).get("enabled", False):
+                tasks.extend(self._sms_tasks(subject, message, station_data, key))
+            
+            if notification_config.get("push", {}).get("enabled", False):
+                push_url = notification_config.get("push", {}).get("webhook_url", "")
+                tasks.append(DeliveryTask("push", push_url, subject, message,
+                                          station_data, f"{key}:push"))
         
-        if notification_config.get("push", {}).get("enabled", False):
-            results["push"] = self.send_push_notification(subject, message, station_data)
+        return tasks
+    
+    def dispatch_alerts(self, alerts: List[Tuple[Dict, float]],
+                        deadline: Optional[float] = None) -> List[DeliveryResult]:
+        """
+        Send several (station_data, reading_value) alerts via every enabled
+        channel to every recipient in parallel. Returns one DeliveryResult
+        per alert and recipient.
+        """
+        return self._run_tasks(self._alert_tasks(self._format_alerts(alerts)), deadline)
+    
+    def _format_alerts(self, alerts: List[Tuple[Dict, float]]) -> List[Tuple[str, str, Dict]]:
+        """(subject, message, station_data) for each (station_data, reading_value)"""
+        formatted = []
+        for station_data, reading_value in alerts:
+            subject, message = self._format_alert(station_data, reading_value)
+            formatted.append((subject, message, station_data))
+        return formatted
+    
+    def defer_alerts(self, alerts: List[Tuple[Dict, float]]) -> int:
+        """
+        Put alerts straight into the outbox without trying to send them, e.g.
+        when shutting down with alerts still queued. Returns how many
+        deliveries were stored.
+        """
+        if self.outbox is None:
+            return 0
+        tasks = self._alert_tasks(self._format_alerts(alerts))
+        for task in tasks:
+            self._defer(task, "")
+        return len(tasks)
+    
+    def dispatch_alert(self, station_data: Dict, reading_value: float,
+                       deadline: Optional[float] = None) -> List[DeliveryResult]:
+        """
+        Send an alert via every enabled channel to every recipient in
+        parallel. Returns one DeliveryResult per recipient.
+        """
+        return self.dispatch_alerts([(station_data, reading_value)], deadline)
+    
+    def _format_digest(self, entries: List[Dict]) -> Tuple[str, str]:
+        """Build one subject and message summarizing held alerts per station"""
+        total = sum(entry['count'] for entry in entries)
+        subject = f"⚠️ Alert Digest: {total} alerts at {len(entries)} station{'s' if len(entries) != 1 else ''}"
         
+        lines = ["", f"{total} further out-of-range readings since the last notification:", ""]
+        for entry in entries:
+            station = entry['station']
+            lines.append(
+                f"{station.get('name', 'Unknown')}: {entry['count']} alert{'s' if entry['count'] != 1 else ''}, "
+                f"latest {entry['latest']:.2f}, range seen {entry['lowest']:.2f} - {entry['highest']:.2f} "
+                f"(safe {station.get('min_value', 0):.1f} - {station.get('max_value', 0):.1f})"
+            )
+        lines.extend(["", "Action Required: Contact technicians to adjust readings.", ""])
+        return subject, "\n".join(lines)
+    
+    def dispatch_digest(self, entries: List[Dict],
+                        deadline: Optional[float] = None) -> List[DeliveryResult]:
+        """
+        Send one digest covering alerts held by AlertCoalescer. Each entry has
+        station, count, latest, lowest and highest.
+        """
+        subject, message = self._format_digest(entries)
+        digest_data = {'name': f"{len(entries)} stations", 'type': "digest"}
+        return self._run_tasks(self._alert_tasks([(subject, message, digest_data)]), deadline)
+    
+    def defer_digest(self, entries: List[Dict]) -> int:
+        """Put a digest of held alerts straight into the outbox, as defer_alerts does"""
+        if self.outbox is None:
+            return 0
+        subject, message = self._format_digest(entries)
+        digest_data = {'name': f"{len(entries)} stations", 'type': "digest"}
+        tasks = self._alert_tasks([(subject, message, digest_data)])
+        for task in tasks:
+            self._defer(task, "")
+        return len(tasks)
+    
+    def send_alert(self, station_data: Dict, reading_value: float) -> Dict[str, bool]:
+        """
+        Send alert via all enabled notification methods
+        Returns dict of {method: success}
+        """
+        results = {}
+        for result in self.dispatch_alert(station_data, reading_value):
+            results[result.channel] = results.get(result.channel, False) or result.success
         return results
     
+    def _get_smtp_session(self) -> SMTPSession:
+        """Shared SMTP session, rebuilt if the email settings change"""
+        email_config = self.config.config.get("notifications", {}).get("email", {})
+        key = (
+            email_config.get("smtp_server", ""),
+            email_config.get("smtp_port", 587),
+            email_config.get("from_email", ""),
+            email_config.get("password", ""),
+            email_config.get("use_tls", True),
+            email_config.get("idle_timeout", 60)
+        )
+        with self._smtp_lock:
+            if self._smtp_session is None or self._smtp_key != key:
+                if self._smtp_session is not None:
+                    self._smtp_session.close()
+                server, port, from_email, password, use_tls, idle_timeout = key
+                self._smtp_session = SMTPSession(
+                    server, port, from_email, password,
+                    use_tls=use_tls, idle_timeout=idle_timeout
+                )
+                self._smtp_key = key
+            return self._smtp_session
+    
     def send_email_notification(self, subject: str, message: str) -> bool:
         """Send email notification"""
+        return self.send_email_batch([(subject, message)])[0]
+    
+    def send_email_batch(self, emails: List[Tuple[str, str]]) -> List[bool]:
+        """
+        Send several (subject, message) emails over one authenticated SMTP
+        connection. Returns success per email.
+        """
         try:
             email_config = self.config.config.get("notifications", {}).get("email", {})
             
             smtp_server = email_config.get("smtp_server", "")
-            smtp_port = email_config.get("smtp_port", 587)
             from_email = email_config.get("from_email", "")
-            password = email_config.get("password", "")
             to_emails = email_config.get("to_emails", [])
             
-            if not all([smtp_server, from_email, password, to_emails]):
-                return False
+            if not all([smtp_server, from_email, to_emails]):
+                return [False] * len(emails)
             
-            # Create message
-            msg = MIMEMultipart()
-            msg['From'] = from_email
-            msg['To'] = ", ".join(to_emails)
-            msg['Subject'] = subject
-            
-            msg.attach(MIMEText(message, 'plain'))
-            
-            # Send email
-            with smtplib.SMTP(smtp_server, smtp_port) as server:
-                server.starttls()
-                server.login(from_email, password)
-                server.send_message(msg)
+            messages = []
+            for subject, message in emails:
+                msg = MIMEMultipart()
+                msg['From'] = from_email
+                msg['To'] = ", ".join(to_emails)
+                msg['Subject'] = subject
+                msg.attach(MIMEText(message, 'plain'))
+                messages.append(msg)
             
-            return True
+            return self._get_smtp_session().send_messages(messages)
         
         except Exception as e:
             print(f"Email notification failed: {e}")
-            return False
+            return [False] * len(emails)
     
     def send_sms_notification(self, subject: str, message: str) -> bool:
         """Send SMS notification via configured provider"""
         try:
-            sms_config = self.config.config.get("notifications", {}).get("sms", {})
-            provider = sms_config.get("provider", "twilio")
-            to_numbers = sms_config.get("to_numbers", [])
-            
-            if not to_numbers:
-                return False
-            
-            # Combine subject and message for SMS
-            sms_text = f"{subject}\n\n{message}"
-            
-            # Route to appropriate provider
-            if provider == "twilio":
-                return self._send_twilio_sms(sms_text, to_numbers)
-            elif provider == "vonage":
-                return self._send_vonage_sms(sms_text, to_numbers)
-            elif provider == "aws_sns":
-                return self._send_aws_sns_sms(sms_text, to_numbers)
-            elif provider == "google_voice":
-                return self._send_google_voice_sms(sms_text, to_numbers)
-            elif provider == "webhook":
-                return self._send_webhook_sms(sms_text, to_numbers)
-            
-            return False
+            results = self._run_tasks(self._sms_tasks(subject, message))
+            return any(result.success for result in results)
         
         except Exception as e:
             print(f"SMS notification failed: {e}")
             return False
     
-    def _send_twilio_sms(self, message: str, to_numbers: list) -> bool:
-        """Send SMS via Twilio"""
-        try:
-            twilio_config = self.config.config.get("sms_providers", {}).get("twilio", {})
-            account_sid = twilio_config.get("account_sid", "")
-            auth_token = twilio_config.get("auth_token", "")
-            from_number = twilio_config.get("from_number", "")
-            
-            if not all([account_sid, auth_token, from_number]):
-                return False
-            
-            # Twilio REST API
-            url = f"https://api.twilio.com/2010-04-01/Accounts/{account_sid}/Messages.json"
-            
-            success_count = 0
-            for to_number in to_numbers:
-                try:
-                    response = requests.post(
-                        url,
-                        auth=(account_sid, auth_token),
-                        data={
-                            "From": from_number,
-                            "To": to_number,
-                            "Body": message
-                        },
-                        timeout=10
-                    )
-                    if response.status_code == 201:
-                        success_count += 1
-                except Exception as e:
-                    print(f"Failed to send to {to_number}: {e}")
-            
-            return success_count > 0
+    def _sms_tasks(self, subject: str, message: str, station_data: Optional[Dict] = None,
+                   key: str = "") -> List[DeliveryTask]:
+        """Delivery tasks for the configured SMS provider"""
+        sms_config = self.config.config.get("notifications", {}).get("sms", {})
+        provider = sms_config.get("provider", "twilio")
+        to_numbers = sms_config.get("to_numbers", [])
+        station_data = station_data or {}
         
-        except Exception as e:
-            print(f"Twilio SMS failed: {e}")
+        if not to_numbers:
+            return []
+        
+        # Providers with a per-message REST call get one task per number
+        if provider in ("twilio", "vonage"):
+            return [DeliveryTask("sms", n, subject, message, station_data, f"{key}:sms:{n}" if key else "")
+                    for n in to_numbers]
+        
+        # The rest send to all numbers in one call or session
+        if provider not in ("aws_sns", "google_voice", "webhook"):
+            return []
+        return [DeliveryTask("sms", ", ".join(to_numbers), subject, message, station_data,
+                             f"{key}:sms" if key else "")]
+    
+    def _send_twilio_one(self, message: str, to_number: str) -> bool:
+        """Send one SMS via Twilio"""
+        twilio_config = self.config.config.get("sms_providers", {}).get("twilio", {})
+        account_sid = twilio_config.get("account_sid", "")
+        auth_token = twilio_config.get("auth_token", "")
+        from_number = twilio_config.get("from_number", "")
+        
+        if not all([account_sid, auth_token, from_number]):
             return False
+        
+        # Twilio REST API
+        url = f"https://api.twilio.com/2010-04-01/Accounts/{account_sid}/Messages.json"
+        
+        response = self._post(
+            url,
+            auth=(account_sid, auth_token),
+            data={
+                "From": from_number,
+                "To": to_number,
+                "Body": message
+            },
+            timeout=10
+        )
+        return response.status_code == 201
     
-    def _send_vonage_sms(self, message: str, to_numbers: list) -> bool:
-        """Send SMS via Vonage (Nexmo)"""
-        try:
-            vonage_config = self.config.config.get("sms_providers", {}).get("vonage", {})
-            api_key = vonage_config.get("api_key", "")
-            api_secret = vonage_config.get("api_secret", "")
-            from_number = vonage_config.get("from_number", "")
-            
-            if not all([api_key, api_secret, from_number]):
-                return False
-            
-            # Vonage REST API
-            url = "https://rest.nexmo.com/sms/json"
-            
-            success_count = 0
-            for to_number in to_numbers:
-                try:
-                    response = requests.post(
-                        url,
-                        json={
-                            "api_key": api_key,
-                            "api_secret": api_secret,
-                            "from": from_number,
-                            "to": to_number,
-                            "text": message
-                        },
-                        timeout=10
-                    )
-                    if response.status_code == 200:
-                        result = response.json()
-                        if result.get("messages", [{}])[0].get("status") == "0":
-                            success_count += 1
-                except Exception as e:
-                    print(f"Failed to send to {to_number}: {e}")
-            
-            return success_count > 0
+    def _send_vonage_one(self, message: str, to_number: str) -> bool:
+        """Send one SMS via Vonage (Nexmo)"""
+        vonage_config = self.config.config.get("sms_providers", {}).get("vonage", {})
+        api_key = vonage_config.get("api_key", "")
+        api_secret = vonage_config.get("api_secret", "")
+        from_number = vonage_config.get("from_number", "")
         
-        except Exception as e:
-            print(f"Vonage SMS failed: {e}")
+        if not all([api_key, api_secret, from_number]):
             return False
+        
+        # Vonage REST API
+        url = "https://rest.nexmo.com/sms/json"
+        
+        response = self._post(
+            url,
+            json={
+                "api_key": api_key,
+                "api_secret": api_secret,
+                "from": from_number,
+                "to": to_number,
+                "text": message
+            },
+            timeout=10
+        )
+        if response.status_code == 200:
+            result = response.json()
+            return result.get("messages", [{}])[0].get("status") == "0"
+        return False
     
     def _send_aws_sns_sms(self, message: str, to_numbers: list) -> bool:
         """Send SMS via AWS SNS"""
@@ -277,7 +567,7 @@ Action Required: Contact technician to adjust readings.
                 "type": "alert"
             }
             
-            response = requests.post(
+            response = self._post(
                 url,
                 json=payload,
                 headers=headers,
@@ -324,7 +614,7 @@ Action Required: Contact technician to adjust readings.
                 headers["Authorization"] = f"Bearer {api_key}"
             
             # Send to webhook
-            response = requests.post(
+            response = self._post(
                 webhook_url,
                 json=payload,
                 headers=headers,
@@ -415,7 +705,7 @@ Action Required: Contact technician to adjust readings.
             if api_key:
                 headers["Authorization"] = f"Bearer {api_key}"
             
-            response = requests.post(
+            response = self._post(
                 webhook_url,
                 json=payload,
                 headers=headers,
@@ -0,0 +1,193 @@
+"""
+Pipeline - Bounded stages with worker threads and latency histograms
+"""
+import bisect
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+class LatencyHistogram:
+    """Latency counts in doubling buckets from 0.1 ms to about 100 s"""
+    
+    BOUNDS = [0.0001 * 2 ** i for i in range(21)]
+    
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+    
+    def add(self, seconds: float):
+        self.counts[bisect.bisect_left(self.BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+    
+    def percentile(self, fraction: float) -> float:
+        """Upper bound of the bucket holding this fraction of samples"""
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(self.BOUNDS[i], self.max) if i < len(self.BOUNDS) else self.max
+        return self.max
+    
+    def snapshot(self) -> Dict:
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'p50': self.percentile(0.5),
+            'p95': self.percentile(0.95),
+            'p99': self.percentile(0.99),
+            'max': self.max,
+            'buckets': [(bound, count) for bound, count in zip(self.BOUNDS + [float("inf")], self.counts) if count]
+        }
+
+class Stage:
+    """
+    One pipeline step: a bounded queue drained in batches by worker threads.
+    handler(items) returns the items to pass to the next stage. Workers wait
+    while the next stage is full, so a slow stage holds back the ones before
+    it instead of letting queues grow. Latency is measured per item, from
+    entering this stage's queue until its batch is handled.
+    
+    With no workers the stage has no queue: put() runs the handler on the
+    caller's thread, which saves a thread hand-off for quick CPU-only steps.
+    """
+    
+    def __init__(self, name: str, handler: Callable[[List[Any]], List[Any]], workers: int = 1,
+                 batch_size: int = 100, max_queue: int = 1000,
+                 on_error: Optional[Callable[[List[Any], Exception], None]] = None):
+        self.name = name
+        self.handler = handler
+        self.workers = max(0, workers)
+        self.batch_size = max(1, batch_size)
+        self.max_queue = max(1, max_queue)
+        self.on_error = on_error
+        self.next: Optional["Stage"] = None
+        
+        self._items: Deque[Tuple[float, Any]] = deque()
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._threads: List[threading.Thread] = []
+        self._stopping = False
+        self.histogram = LatencyHistogram()
+        self.processed = 0
+        self.batches = 0
+        self.errors = 0
+    
+    def start(self):
+        if self._threads:
+            return
+        self._stopping = False
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"{self.name}-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+    
+    def stop(self, timeout: float = 10):
+        """Handle what is already queued, then stop the workers"""
+        with self._lock:
+            self._stopping = True
+            self._not_empty.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+    
+    def qsize(self) -> int:
+        with self._lock:
+            return len(self._items)
+    
+    def put(self, items: List[Any], block: bool = True, timeout: Optional[float] = None) -> bool:
+        """
+        Queue items, all or none. With block, waits up to timeout (forever if
+        None) for room; otherwise returns False at once if the queue is full.
+        More items than max_queue never fit at once: blocking without a
+        timeout queues them in max_queue-sized chunks, otherwise they are
+        refused.
+        """
+        if not items:
+            return True
+        if not self.workers:
+            self._handle([(time.monotonic(), item) for item in items])
+            return True
+        
+        if len(items) > self.max_queue:
+            if not block or timeout is not None:
+                return False
+            for start in range(0, len(items), self.max_queue):
+                self._put_chunk(items[start:start + self.max_queue], True, None)
+            return True
+        return self._put_chunk(items, block, timeout)
+    
+    def _put_chunk(self, items: List[Any], block: bool, timeout: Optional[float]) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while self.max_queue - len(self._items) < len(items):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if not block or (remaining is not None and remaining <= 0):
+                    return False
+                self._not_full.wait(remaining)
+            
+            now = time.monotonic()
+            self._items.extend((now, item) for item in items)
+            self._not_empty.notify()
+        return True
+    
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._items and not self._stopping:
+                    self._not_empty.wait(0.5)
+                if not self._items:
+                    return
+                batch = [self._items.popleft() for _ in range(min(self.batch_size, len(self._items)))]
+                self._not_full.notify_all()
+            self._handle(batch)
+    
+    def _handle(self, batch: List[Tuple[float, Any]]):
+        items = [item for _, item in batch]
+        try:
+            forward = self.handler(items)
+        except Exception as e:
+            print(f"Error in {self.name} stage: {e}")
+            forward = []
+            with self._lock:
+                self.errors += 1
+            if self.on_error:
+                self.on_error(items, e)
+        
+        done = time.monotonic()
+        with self._lock:
+            self.processed += len(items)
+            self.batches += 1
+            for entered, _ in batch:
+                self.histogram.add(done - entered)
+        
+        if forward and self.next:
+            self.next.put(forward)
+    
+    def get_metrics(self) -> Dict:
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'batch_size': self.batch_size,
+                'queue_depth': len(self._items),
+                'max_queue': self.max_queue,
+                'processed': self.processed,
+                'batches': self.batches,
+                'errors': self.errors,
+                'latency': self.histogram.snapshot()
+            }
+
+def chain(stages: List[Stage]) -> List[Stage]:
+    """Connect each stage's output to the next one's queue"""
+    for stage, following in zip(stages, stages[1:]):
+        stage.next = following
+    return stages
@@ -3,18 +3,29 @@ SMS Receiver - Poll for incoming messages from various providers
 """
 import time
 import threading
-from typing import Callable, Optional
+from typing import Callable, Dict, List, Optional, Tuple
 from database import Database
-from message_parser import MessageParser
+from alert_dispatcher import AlertDispatcher
+from dedup_store import DedupStore
+from ingestion import IngestionPipeline
 
 class SMSReceiver:
     """Base class for SMS receivers"""
     
-    def __init__(self, config, db: Database, on_message_callback: Optional[Callable] = None):
+    # Namespace for this receiver's message IDs in the dedup store
+    source = "sms"
+    
+    def __init__(self, config, db: Database, on_message_callback: Optional[Callable] = None,
+                 alert_dispatcher: Optional[AlertDispatcher] = None,
+                 dedup_store: Optional[DedupStore] = None,
+                 ingestion: Optional[IngestionPipeline] = None):
         self.config = config
         self.db = db
-        self.parser = MessageParser()
-        self.on_message_callback = on_message_callback
+        self.dedup = dedup_store or DedupStore(db, config)
+        # A receiver on its own runs its own pipeline; ReceiverManager shares one
+        self._owns_ingestion = ingestion is None
+        self.ingestion = ingestion or IngestionPipeline(config, db, self.dedup, on_message_callback, alert_dispatcher)
+        self.ingestion.register(self.source)
         self.running = False
         self.thread = None
     
@@ -23,6 +34,8 @@ class SMSReceiver:
         if self.running:
             return
         
+        if self._owns_ingestion:
+            self.ingestion.start()
         self.running = True
         self.thread = threading.Thread(target=self._poll_loop, daemon=True)
         self.thread.start()
@@ -32,74 +45,44 @@ class SMSReceiver:
         self.running = False
         if self.thread:
             self.thread.join(timeout=5)
+        if self._owns_ingestion:
+            self.ingestion.stop()
     
     def _poll_loop(self):
         """Main polling loop - override in subclasses"""
         raise NotImplementedError
     
-    def _process_message(self, phone_number: str, message_text: str):
-        """Process an incoming message"""
-        try:
-            # Find station by phone number
-            station = self.db.get_station_by_phone(phone_number)
-            
-            if not station:
-                print(f"Unknown phone number: {phone_number}")
-                return
-            
-            # Parse value from message
-            value = self.parser.parse_value(message_text)
-            
-            if value is None:
-                print(f"Could not parse value from: {message_text}")
-                return
-            
-            # Save reading
-            reading_id = self.db.add_reading(station['id'], value, message_text)
-            
-            print(f"Received reading from {station['name']}: {value}")
-            
-            # Callback for UI updates
-            if self.on_message_callback:
-                self.on_message_callback(station, value, message_text)
-            
-            # Check if alert and send notifications
-            is_alert = value < station['min_value'] or value > station['max_value']
-            if is_alert:
-                self._send_alert_notifications(station, value)
-        
-        except Exception as e:
-            print(f"Error processing message: {e}")
+    def _report_health(self, healthy: bool, error: str = ""):
+        self.ingestion.report_health(self.source, healthy, error)
     
-    def _send_alert_notifications(self, station, value):
-        """Send alert notifications"""
-        try:
-            from notifications import NotificationManager
-            from config import Config
-            
-            config = Config()
-            notif_manager = NotificationManager(config)
-            
-            station_data = {
-                'name': station['name'],
-                'phone_number': station['phone_number'],
-                'min_value': station['min_value'],
-                'max_value': station['max_value'],
-                'value': value
-            }
-            
-            notif_manager.send_alert(station_data, value)
-        except Exception as e:
-            print(f"Error sending notifications: {e}")
+    def _process_message(self, phone_number: str, message_text: str,
+                         message_id: Optional[str] = None):
+        """
+        Process an incoming message. A message_id from the provider is
+        recorded, and a message whose ID was already processed is skipped.
+        """
+        self._process_batch([(phone_number, message_text, message_id)])
+    
+    def _process_batch(self, messages: List[Tuple[str, str, Optional[str]]]):
+        """
+        Hand (phone_number, message_text, message_id) messages to the
+        ingestion pipeline, waiting for room if its queue is full. Message IDs
+        are deduplicated as in _process_message.
+        """
+        self.ingestion.submit(self.source, messages)
 
 
 class GoogleVoiceReceiver(SMSReceiver):
     """Receive SMS via Google Voice"""
     
-    def __init__(self, config, db: Database, on_message_callback: Optional[Callable] = None):
-        super().__init__(config, db, on_message_callback)
+    source = "google_voice"
+    
+    def __init__(self, config, db: Database, on_message_callback: Optional[Callable] = None,
+                 alert_dispatcher: Optional[AlertDispatcher] = None,
+                 dedup_store: Optional[DedupStore] = None,
+                 ingestion: Optional[IngestionPipeline] = None):
+        super().__init__(config, db, on_message_callback, alert_dispatcher, dedup_store, ingestion)
         self.voice = None
-        self.processed_ids = set()
     
     def _poll_loop(self):
         """Poll Google Voice for new messages"""
@@ -130,11 +113,12 @@ class GoogleVoiceReceiver(SMSReceiver):
                     self.voice.sms()
                     
                     # Parse messages
+                    batch = []
                     for message in self.voice.sms.html.findAll('div', {'class': 'gc-message-sms-row'}):
                         msg_id = message.get('id')
                         
-                        # Skip if already processed
-                        if msg_id in self.processed_ids:
+                        # Skip if already processed, including before a restart
+                        if self.dedup.seen(self.source, msg_id):
                             continue
                         
                         # Extract phone number and text
@@ -144,32 +128,62 @@ class GoogleVoiceReceiver(SMSReceiver):
                         if phone_span and text_span:
                             phone_number = phone_span.text.strip()
                             message_text = text_span.text.strip()
-                            
-                            # Process message
-                            self._process_message(phone_number, message_text)
-                            
-                            # Mark as processed
-                            self.processed_ids.add(msg_id)
+                            batch.append((phone_number, message_text, msg_id))
+                    
+                    # Process messages; their IDs are recorded as processed
+                    self._process_batch(batch)
+                    self._report_health(True)
                     
                     # Wait before next check
                     time.sleep(check_interval)
                 
                 except Exception as e:
                     print(f"Error checking Google Voice: {e}")
+                    self._report_health(False, str(e))
                     time.sleep(check_interval)
         
         except Exception as e:
             print(f"Google Voice receiver error: {e}")
+            self._report_health(False, str(e))
 
 
 class EmailReceiver(SMSReceiver):
-    """Receive SMS forwarded to email"""
+    """
+    Receive SMS forwarded to email. Keeps one IMAP session open and waits
+    in IDLE for new mail, reconnecting with exponential backoff if the
+    connection drops.
+    """
+    
+    source = "email"
+    
+    def __init__(self, config, db: Database, on_message_callback: Optional[Callable] = None,
+                 alert_dispatcher: Optional[AlertDispatcher] = None,
+                 dedup_store: Optional[DedupStore] = None,
+                 ingestion: Optional[IngestionPipeline] = None):
+        super().__init__(config, db, on_message_callback, alert_dispatcher, dedup_store, ingestion)
+        self.connection = None
+        self.state_name = ""
+        self.uidvalidity = None
+        self.last_uid = 0
+        # UIDs processed but not yet flagged \Seen on the server
+        self._unmarked: List[int] = []
+        self._stop_event = threading.Event()
+    
+    def start(self):
+        self._stop_event.clear()
+        super().start()
+    
+    def stop(self):
+        """Stop receiving messages, ending any IDLE in progress"""
+        self.running = False
+        self._stop_event.set()
+        if self.connection:
+            self.connection.interrupt()
+        super().stop()
     
     def _poll_loop(self):
-        """Poll email for forwarded SMS"""
-        import imaplib
-        import email
-        from email.header import decode_header
+        """Hold an IMAP connection and process forwarded SMS as they arrive"""
+        from imap_client import IMAPConnection
         
         email_config = self.config.config.get("email", {})
         imap_server = email_config.get("imap_server", "")
@@ -177,67 +191,131 @@ class EmailReceiver(SMSReceiver):
         email_address = email_config.get("email_address", "")
         password = email_config.get("password", "")
         check_interval = email_config.get("check_interval", 60)
+        use_idle = email_config.get("use_idle", True)
+        idle_timeout = email_config.get("idle_timeout", 300)
+        max_backoff = email_config.get("reconnect_max_backoff", 300)
         
         if not all([imap_server, email_address, password]):
             print("Email credentials not configured")
+            self._report_health(False, "Email credentials not configured")
             return
         
+        self.connection = IMAPConnection(
+            imap_server, imap_port, email_address, password,
+            use_ssl=email_config.get("imap_ssl", True)
+        )
+        self.state_name = f"imap:{email_address}@{imap_server}/{self.connection.mailbox}"
+        state = self.db.get_receiver_state(self.state_name) or {}
+        self.uidvalidity = state.get('uidvalidity')
+        self.last_uid = state.get('last_uid', 0)
         print("Email receiver started")
-        processed_uids = set()
+        backoff = 1
         
         while self.running:
             try:
-                # Connect to email
-                mail = imaplib.IMAP4_SSL(imap_server, imap_port)
-                mail.login(email_address, password)
-                mail.select("INBOX")
-                
-                # Search for unread messages
-                status, messages = mail.search(None, "UNSEEN")
-                
-                if status == "OK":
-                    for num in messages[0].split():
-                        if num in processed_uids:
-                            continue
-                        
-                        # Fetch message
-                        status, msg_data = mail.fetch(num, "(RFC822)")
-                        
-                        if status == "OK":
-                            email_body = msg_data[0][1]
-                            email_message = email.message_from_bytes(email_body)
-                            
-                            # Extract sender and body
-                            from_header = email_message.get("From", "")
-                            
-                            # Get message body
-                            body = ""
-                            if email_message.is_multipart():
-                                for part in email_message.walk():
-                                    if part.get_content_type() == "text/plain":
-                                        body = part.get_payload(decode=True).decode()
-                                        break
-                            else:
-                                body = email_message.get_payload(decode=True).decode()
-                            
-                            # Try to extract phone number from sender or body
-                            # This is provider-specific and may need customization
-                            phone_number = self._extract_phone_from_email(from_header, body)
-                            
-                            if phone_number and body:
-                                self._process_message(phone_number, body)
-                            
-                            processed_uids.add(num)
-                
-                mail.close()
-                mail.logout()
+                self.connection.connect()
+                if not use_idle:
+                    self.connection.supports_idle = False
+                backoff = 1
+                self._report_health(True)
                 
-                # Wait before next check
-                time.sleep(check_interval)
+                while self.running:
+                    self._check_inbox()
+                    # Returns as soon as the server reports new mail
+                    self.connection.wait_for_mail(idle_timeout, check_interval)
             
             except Exception as e:
-                print(f"Error checking email: {e}")
-                time.sleep(check_interval)
+                if not self.running:
+                    break
+                print(f"Error checking email: {e}; reconnecting in {backoff}s")
+                self._report_health(False, str(e))
+                self.connection.close()
+                self._stop_event.wait(backoff)
+                backoff = min(backoff * 2, max_backoff)
+        
+        self.connection.close()
+    
+    def _check_inbox(self):
+        """
+        Process messages that arrived since the last check. Progress is kept
+        as (UIDVALIDITY, last UID) in the database, so nothing is fetched
+        twice, even across restarts. Stored messages are flagged as read, so
+        a mailbox reset only replays the ones never processed.
+        """
+        connection = self.connection
+        previous = (self.uidvalidity, self.last_uid)
+        
+        if self.uidvalidity != connection.uidvalidity:
+            # First run, or the mailbox was recreated and old UIDs mean
+            # nothing: process the unread messages, then follow new ones
+            uids = connection.search_uids("UNSEEN")
+            messages = []
+            for i in range(0, len(uids), 100):
+                messages.extend(connection.fetch(",".join(str(uid) for uid in uids[i:i + 100])))
+            baseline = max(uids[-1] if uids else 0, (connection.uidnext or 1) - 1)
+            self.uidvalidity = connection.uidvalidity
+            self.last_uid = 0
+        else:
+            messages = connection.fetch_since(self.last_uid)
+            baseline = 0
+        
+        batch = []
+        for message in messages:
+            try:
+                sms = self._read_email(message)
+                if sms:
+                    batch.append(sms)
+            except Exception as e:
+                print(f"Error reading email {message.uid}: {e}")
+            self.last_uid = max(self.last_uid, message.uid)
+            self._unmarked.append(message.uid)
+        self.last_uid = max(self.last_uid, baseline)
+        
+        if (self.uidvalidity, self.last_uid) != previous:
+            self._process_batch(batch)
+            # Only move past these UIDs once their readings are stored
+            flush_timeout = self.config.config.get("email", {}).get("flush_timeout", 60)
+            if not self.ingestion.flush(flush_timeout):
+                print("Readings not stored yet; keeping the email position until they are")
+                return
+            self.db.set_receiver_state(self.state_name, {
+                'uidvalidity': self.uidvalidity,
+                'last_uid': self.last_uid
+            })
+        if self._unmarked:
+            uids, self._unmarked = self._unmarked, []
+            connection.mark_seen(uids)
+    
+    def _read_email(self, message) -> Optional[Tuple[str, str, str]]:
+        """(phone, body, message ID) of a fetched email, or None if it has no SMS"""
+        import email
+        
+        # The fetched headers include Content-Type, so multipart bodies parse
+        email_message = email.message_from_bytes(message.header.rstrip(b"\r\n") + b"\r\n\r\n" + message.text)
+        # Message-ID survives a UIDVALIDITY reset; the UID is a fallback
+        message_id = (email_message.get("Message-ID", "").strip()
+                      or f"{self.uidvalidity}:{message.uid}")
+        
+        # Extract sender and body
+        from_header = email_message.get("From", "")
+        
+        # Get message body
+        body = ""
+        if email_message.is_multipart():
+            for part in email_message.walk():
+                if part.get_content_type() == "text/plain":
+                    body = part.get_payload(decode=True).decode(errors="replace")
+                    break
+        else:
+            body = email_message.get_payload(decode=True).decode(errors="replace")
+        
+        # Try to extract phone number from sender or body
+        # This is provider-specific and may need customization
+        phone_number = self._extract_phone_from_email(from_header, body)
+        
+        if phone_number and body:
+            return phone_number, body, message_id
+        return None
     
     def _extract_phone_from_email(self, from_header: str, body: str) -> Optional[str]:
         """Extract phone number from email - customize based on your carrier"""
@@ -268,33 +346,104 @@ class EmailReceiver(SMSReceiver):
 
 
 class ReceiverManager:
-    """Manage SMS receivers"""
+    """
+    Run a receiver for every configured SMS method at once. All of them feed
+    one staged ingestion pipeline, whose persist stage batches the database
+    commits; metrics are kept per source and per stage.
+    """
     
-    def __init__(self, config, db: Database):
+    def __init__(self, config, db: Database, notification_manager=None, alert_coalescer=None):
+        from notifications import NotificationManager
+        from alert_coalescer import AlertCoalescer
+        
         self.config = config
         self.db = db
-        self.receiver = None
+        self.receivers: Dict[str, SMSReceiver] = {}
+        self.dedup_store = DedupStore(db, config)
+        
+        # Share the caller's manager and coalescer so cooldowns span every alert source
+        if alert_coalescer is None:
+            notification_manager = notification_manager or NotificationManager(config)
+            alert_coalescer = AlertCoalescer(notification_manager, config)
+        self.alert_dispatcher = AlertDispatcher(
+            config, alert_coalescer.notification_manager, coalescer=alert_coalescer
+        )
+        self.ingestion = IngestionPipeline(config, db, self.dedup_store, alert_dispatcher=self.alert_dispatcher)
     
-    def start(self, on_message_callback: Optional[Callable] = None):
-        """Start appropriate receiver based on config"""
-        self.stop()  # Stop any existing receiver
+    def _create_receiver(self, method: str) -> Optional[SMSReceiver]:
+        args = (self.config, self.db, None, self.alert_dispatcher, self.dedup_store, self.ingestion)
+        if method == "google_voice":
+            return GoogleVoiceReceiver(*args)
+        if method == "email":
+            return EmailReceiver(*args)
+        if method == "webhook":
+            from webhook_receiver import WebhookReceiver
+            return WebhookReceiver(*args)
+        if method == "twilio":
+            from webhook_receiver import TwilioReceiver
+            return TwilioReceiver(*args)
+        # Add other receivers as needed
+        print(f"No receiver for SMS method: {method}")
+        return None
+    
+    def start(self, on_message_callback: Optional[Callable] = None, methods: Optional[List[str]] = None):
+        """Start a receiver for each method, by default the configured ones"""
+        self.stop()  # Stop any existing receivers
         
-        sms_method = self.config.get_sms_method()
+        methods = list(methods if methods is not None else self.config.get_receiver_methods())
+        self.ingestion.on_message_callback = on_message_callback
         
-        if sms_method == "google_voice":
-            self.receiver = GoogleVoiceReceiver(self.config, self.db, on_message_callback)
-            self.receiver.start()
-        elif sms_method == "email":
-            self.receiver = EmailReceiver(self.config, self.db, on_message_callback)
-            self.receiver.start()
-        # Add other receivers as needed
+        for method in methods:
+            if method in self.receivers:
+                continue
+            receiver = self._create_receiver(method)
+            if receiver:
+                self.receivers[method] = receiver
+        
+        # Twilio posts to the webhook port, so one server answers both
+        if "webhook" in self.receivers and "twilio" in self.receivers:
+            twilio = self.receivers["twilio"]
+            twilio.serve_json("/webhook", "webhook")
+            self.receivers["webhook"] = twilio
+        
+        if self.receivers:
+            self.alert_dispatcher.start()
+            self.ingestion.start()
+            for receiver in self._unique_receivers():
+                receiver.start()
+    
+    def _unique_receivers(self) -> List[SMSReceiver]:
+        unique = []
+        for receiver in self.receivers.values():
+            if receiver not in unique:
+                unique.append(receiver)
+        return unique
     
     def stop(self):
-        """Stop current receiver"""
-        if self.receiver:
-            self.receiver.stop()
-            self.receiver = None
+        """Stop all receivers, then store what they already queued"""
+        for receiver in self._unique_receivers():
+            receiver.stop()
+        self.receivers = {}
+        self.ingestion.stop()
+        self.alert_dispatcher.stop()
     
     def is_running(self) -> bool:
-        """Check if receiver is running"""
-        return self.receiver is not None and self.receiver.running
+        """Check if any receiver is running"""
+        return any(receiver.running for receiver in self.receivers.values())
+    
+    def get_ingestion_metrics(self) -> Dict:
+        """Queue depth, plus status, lag and throughput for each receiver source"""
+        metrics = self.ingestion.get_metrics()
+        for source, source_metrics in metrics['sources'].items():
+            receiver = self.receivers.get(source)
+            if receiver is None or not receiver.running:
+                source_metrics['status'] = "stopped"
+            elif not source_metrics['healthy']:
+                source_metrics['status'] = "error"
+            else:
+                source_metrics['status'] = "running"
+        return metrics
+    
+    def get_alert_metrics(self) -> Dict:
+        """Alert queue depth and dispatch latency"""
+        return self.alert_dispatcher.get_metrics()
@@ -0,0 +1,114 @@
+"""
+SMTP Session - Reusable authenticated SMTP connection
+"""
+import smtplib
+import threading
+from email.message import Message
+from typing import List, Optional
+
+class SMTPSession:
+    """
+    One SMTP connection kept open between sends. The STARTTLS and login
+    handshake happens once, then is reused until the connection has been
+    idle for idle_timeout seconds. A send that fails on a dropped
+    connection reconnects and retries once.
+    """
+    
+    def __init__(self, host: str, port: int = 587, username: str = "", password: str = "",
+                 use_tls: bool = True, idle_timeout: float = 60, timeout: float = 10):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        
+        self._server: Optional[smtplib.SMTP] = None
+        self._lock = threading.Lock()
+        self._idle_timer: Optional[threading.Timer] = None
+        self.connects = 0  # handshakes performed, for diagnostics
+    
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.use_tls:
+                server.starttls()
+            if self.password:
+                server.login(self.username, self.password)
+        except Exception:
+            server.close()
+            raise
+        self.connects += 1
+        return server
+    
+    def _disconnect(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                self._server.close()
+            self._server = None
+    
+    def _schedule_idle_close(self):
+        if self._idle_timer is not None:
+            self._idle_timer.cancel()
+        self._idle_timer = threading.Timer(self.idle_timeout, self._close_if_idle)
+        self._idle_timer.daemon = True
+        self._idle_timer.start()
+    
+    def _close_if_idle(self):
+        with self._lock:
+            self._disconnect()
+    
+    def _send_one(self, msg: Message):
+        """Send on the open connection, reconnecting once if it was dropped"""
+        if self._server is None:
+            self._server = self._connect()
+        # Only a stale connection (server idle timeout, network blip, 421
+        # "closing channel") is worth a fresh connection; rejections are not
+        try:
+            self._server.send_message(msg)
+            return
+        except smtplib.SMTPServerDisconnected:
+            pass
+        except smtplib.SMTPResponseException as e:
+            if e.smtp_code != 421:
+                raise
+        except smtplib.SMTPException:
+            # e.g. SMTPRecipientsRefused; these subclass OSError too
+            raise
+        except OSError:
+            pass
+        self._server.close()
+        self._server = self._connect()
+        self._server.send_message(msg)
+    
+    def send_messages(self, messages: List[Message]) -> List[bool]:
+        """Send several messages over one authenticated connection"""
+        results = []
+        with self._lock:
+            for msg in messages:
+                try:
+                    self._send_one(msg)
+                    results.append(True)
+                except Exception as e:
+                    print(f"Email notification failed: {e}")
+                    if self._server is not None:
+                        self._server.close()
+                        self._server = None
+                    results.append(False)
+            if self._server is not None:
+                self._schedule_idle_close()
+        return results
+    
+    def send_message(self, msg: Message) -> bool:
+        return self.send_messages([msg])[0]
+    
+    def close(self):
+        """Close the connection now"""
+        with self._lock:
+            if self._idle_timer is not None:
+                self._idle_timer.cancel()
+                self._idle_timer = None
+            self._disconnect()
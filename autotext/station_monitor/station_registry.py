@@ -0,0 +1,69 @@
+"""
+Station Registry - In-memory index of station metadata
+"""
+import threading
+from typing import Callable, Dict, List, Optional
+
+class StationRegistry:
+    """
+    Cache of station rows, each with its metrics by key, indexed by id,
+    phone number and name.
+    Loaded on first use and reloaded only after invalidate(), which Database
+    calls whenever a station is added, updated or deleted.
+    """
+    
+    def __init__(self, loader: Callable[[], List[Dict]]):
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._stations: Optional[List[Dict]] = None
+        self._by_id: Dict[int, Dict] = {}
+        self._by_phone: Dict[str, Dict] = {}
+        self._by_name: Dict[str, Dict] = {}
+    
+    def invalidate(self):
+        """Drop the cache so the next lookup reloads from the database"""
+        with self._lock:
+            self._stations = None
+    
+    def _ensure_loaded(self) -> List[Dict]:
+        with self._lock:
+            if self._stations is None:
+                stations = self._loader()
+                self._by_id = {s['id']: s for s in stations}
+                self._by_phone = {s['phone_number']: s for s in stations}
+                # Names are not unique; keep the first, matching a scan of the list
+                self._by_name = {}
+                for station in stations:
+                    self._by_name.setdefault(station['name'], station)
+                self._stations = stations
+            return self._stations
+    
+    def all(self) -> List[Dict]:
+        """All stations ordered by name"""
+        return [dict(s) for s in self._ensure_loaded()]
+    
+    def by_id(self, station_id: int) -> Optional[Dict]:
+        self._ensure_loaded()
+        station = self._by_id.get(station_id)
+        return dict(station) if station else None
+    
+    def by_phone(self, phone_number: str) -> Optional[Dict]:
+        self._ensure_loaded()
+        station = self._by_phone.get(phone_number)
+        return dict(station) if station else None
+    
+    def by_name(self, name: str) -> Optional[Dict]:
+        self._ensure_loaded()
+        station = self._by_name.get(name)
+        return dict(station) if station else None
+    
+    def ranges(self) -> Dict[int, tuple]:
+        """Map of station id to (min_value, max_value)"""
+        self._ensure_loaded()
+        return {station_id: (s['min_value'], s['max_value']) for station_id, s in self._by_id.items()}
+    
+    def metric_ranges(self) -> Dict[int, tuple]:
+        """Map of metric id to (min_value, max_value); either may be None"""
+        self._ensure_loaded()
+        return {metric['id']: (metric['min_value'], metric['max_value'])
+                for s in self._by_id.values() for metric in s.get('metrics', {}).values()}
@@ -0,0 +1,109 @@
+"""
+Tests for the schema migrations, applied to a database made by the first
+release. Run from the station_monitor directory:
+
+    python -m unittest discover tests
+"""
+import contextlib
+import io
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import MIGRATIONS, Database
+
+# Schema and data as the first release left them, before any migration
+BASELINE = """
+CREATE TABLE stations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    phone_number TEXT NOT NULL UNIQUE,
+    min_value REAL NOT NULL,
+    max_value REAL NOT NULL,
+    enabled INTEGER DEFAULT 1,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE readings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    station_id INTEGER NOT NULL,
+    value REAL NOT NULL,
+    raw_message TEXT,
+    is_alert INTEGER DEFAULT 0,
+    received_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (station_id) REFERENCES stations (id)
+);
+CREATE TABLE alerts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    reading_id INTEGER NOT NULL,
+    acknowledged INTEGER DEFAULT 0,
+    acknowledged_at TIMESTAMP,
+    resolution_notes TEXT,
+    resolved_by TEXT,
+    FOREIGN KEY (reading_id) REFERENCES readings (id)
+);
+INSERT INTO stations (name, phone_number, min_value, max_value) VALUES ('Lift 1', '+15550000001', 0, 10);
+INSERT INTO readings (station_id, value, raw_message, is_alert, received_at)
+VALUES (1, 5.0, '5.0', 0, '2024-01-01 00:00:00'),
+       (1, 12.0, '12.0', 1, '2024-01-01 00:00:30');
+INSERT INTO alerts (reading_id) VALUES (2);
+"""
+
+
+class MigrationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "monitoring.db")
+        conn = sqlite3.connect(self.path)
+        conn.executescript(BASELINE)
+        conn.close()
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.db = Database(self.path)
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp.cleanup()
+
+    def test_upgrades_to_the_latest_version(self):
+        self.assertEqual(self.db.get_schema_version(), MIGRATIONS[-1][0])
+
+    def test_reopening_applies_nothing(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            Database(self.path).close()
+        self.assertNotIn("migrated", output.getvalue())
+
+    def test_existing_readings_are_carried_over(self):
+        latest, = self.db.get_latest_readings()
+        self.assertEqual((latest['name'], latest['value'], latest['is_alert']), ("Lift 1", 12.0, 1))
+
+        conn = sqlite3.connect(self.path)
+        minute = conn.execute(
+            "SELECT count, min_value, max_value FROM reading_rollups WHERE station_id=1 AND resolution=60"
+        ).fetchall()
+        conn.close()
+        self.assertEqual(minute, [(2, 5.0, 12.0)])
+
+        alert, = self.db.get_active_alerts()
+        self.assertEqual((alert['name'], alert['value']), ("Lift 1", 12.0))
+
+    def test_metric_readings_leave_the_station_reading_alone(self):
+        self.db.set_station_metrics(1, [("ph", 6.5, 8.5)])
+        metric_id = self.db.get_all_stations()[0]['metrics']['ph']['id']
+        self.db.add_readings_bulk([(1, 9.0, "pH 9.0", None, metric_id)])
+
+        latest, = self.db.get_latest_readings()
+        self.assertEqual(latest['value'], 12.0)
+        names = sorted(alert['name'] for alert in self.db.get_active_alerts())
+        self.assertEqual(names, ["Lift 1", "Lift 1 ph"])
+
+        self.db.set_station_metrics(1, [])
+        self.assertEqual([alert['name'] for alert in self.db.get_active_alerts()], ["Lift 1"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+"""
+Tests for DedupStore and how the ingestion pipeline records message IDs.
+Run from the station_monitor directory:
+
+    python -m unittest discover tests
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from database import Database
+from dedup_store import DedupStore
+from ingestion import IngestionPipeline
+
+
+def wait_for_prune():
+    """Join the background prune, so it never outlives the test's database"""
+    for thread in threading.enumerate():
+        if thread.name == "dedup-prune":
+            thread.join()
+
+
+class DedupStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.db = Database(os.path.join(self.tmp.name, "test.db"))
+
+    def tearDown(self):
+        wait_for_prune()
+        self.db.close()
+        self.tmp.cleanup()
+
+    def test_add_claims_once(self):
+        store = DedupStore(self.db)
+        self.assertTrue(store.add("email", "m1"))
+        self.assertFalse(store.add("email", "m1"))
+        self.assertTrue(store.seen("email", "m1"))
+        self.assertFalse(store.seen("webhook", "m1"))
+
+    def test_add_many_reports_new_ids(self):
+        store = DedupStore(self.db)
+        store.add("email", "m1")
+        self.assertEqual(store.add_many("email", ["m1", "m2", "m3"]), [False, True, True])
+
+    def test_stored_ids_are_seen_before_the_filter_is_built(self):
+        self.db.add_processed_messages("email", ["m1"])
+        store = DedupStore(self.db)
+        self.assertTrue(store.seen("email", "m1"))
+        wait_for_prune()
+        self.assertTrue(store.seen("email", "m1"))
+        self.assertFalse(store.seen("email", "m2"))
+
+    def test_discard_allows_a_retry(self):
+        store = DedupStore(self.db)
+        store.add("email", "m1")
+        store.discard("email", "m1")
+        self.assertTrue(store.add("email", "m1"))
+
+
+class IngestionDedupTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        # The stages print as they go, on their own threads
+        self.quiet = contextlib.redirect_stdout(io.StringIO())
+        self.quiet.__enter__()
+        self.db = Database(os.path.join(self.tmp.name, "test.db"))
+        self.db.add_station("Station 1", "+15550000001", 0, 100)
+        self.dedup = DedupStore(self.db)
+        self.pipeline = IngestionPipeline(Config(os.path.join(self.tmp.name, "config.json")),
+                                          self.db, self.dedup)
+        self.pipeline.start()
+
+    def tearDown(self):
+        self.pipeline.stop()
+        wait_for_prune()
+        self.db.close()
+        self.quiet.__exit__(None, None, None)
+        self.tmp.cleanup()
+
+    def submit(self, messages):
+        self.pipeline.submit("google_voice", messages)
+        self.assertTrue(self.pipeline.flush(5))
+
+    def test_dropped_messages_are_recorded(self):
+        batch = [("+15559999999", "5.5", "gv-1"), ("+15550000001", "no number", "gv-2")]
+        self.submit(batch)
+        self.assertTrue(self.dedup.seen("google_voice", "gv-1"))
+        self.assertTrue(self.dedup.seen("google_voice", "gv-2"))
+
+        self.submit(batch)
+        source = self.pipeline.get_metrics()['sources']["google_voice"]
+        self.assertEqual(source['dropped'], 2)
+        self.assertEqual(source['duplicates'], 2)
+
+    def test_stored_messages_are_not_stored_again(self):
+        self.submit([("+15550000001", "42", "gv-3")])
+        self.submit([("+15550000001", "42", "gv-3")])
+        source = self.pipeline.get_metrics()['sources']["google_voice"]
+        self.assertEqual(source['stored'], 1)
+        self.assertEqual(source['duplicates'], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+"""
+Tests for MessageParser. Run from the station_monitor directory:
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from message_parser import MessageParser
+
+
+class ParseMetricsTest(unittest.TestCase):
+
+    def test_named_values(self):
+        self.assertEqual(MessageParser.parse_metrics("pH 7.2 Temp 18.4 Cl 0.8"),
+                         {"ph": 7.2, "temp": 18.4, "cl": 0.8})
+
+    def test_station_label_is_not_a_metric(self):
+        self.assertEqual(MessageParser.parse_metrics("Station 5 pH 7.2"), {"ph": 7.2})
+
+    def test_first_value_of_a_repeated_name_wins(self):
+        self.assertEqual(MessageParser.parse_metrics("Stn 3 Temp -2.5 temp 4"), {"temp": -2.5})
+
+    def test_bare_number_has_no_metrics(self):
+        self.assertEqual(MessageParser.parse_metrics("56.893"), {})
+
+
+class ParseValueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = MessageParser()
+
+    def test_station_labels(self):
+        cases = [
+            ("Station 56.893", 56.893),
+            ("Site 12.5", 12.5),
+            ("station 7.25 ft", 7.25),
+            ("Stn 3.5", 3.5),
+            ("Unit 42 psi", 42.0),
+            ("Station 3", 3.0),
+            ("Station 1 - 56.893", 56.893),
+            ("Stn #4: 12", 12.0),
+            ("Site A2 7.5", 7.5),
+        ]
+        for message, expected in cases:
+            with self.subTest(message=message):
+                self.assertEqual(self.parser.parse_value(message), expected)
+
+    def test_template_falls_back_to_default_formats(self):
+        template = "Reading: {value} ft"
+        self.assertEqual(self.parser.parse_value("Reading: 12.5 ft", template), 12.5)
+        self.assertEqual(self.parser.parse_value("Level 4", template), 4.0)
+
+    def test_no_number(self):
+        self.assertIsNone(self.parser.parse_value("no number"))
+
+
+if __name__ == "__main__":
+    unittest.main()
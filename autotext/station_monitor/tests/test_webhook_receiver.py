@@ -0,0 +1,92 @@
+"""
+Tests for request validation in the webhook server. Run from the
+station_monitor directory:
+
+    python -m unittest discover tests
+"""
+import contextlib
+import io
+import json
+import os
+import socket
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from database import Database
+from sms_receiver import ReceiverManager
+
+MESSAGE = json.dumps({"phone": "+15550000001", "message": "5"}).encode()
+
+
+class WebhookTest(unittest.TestCase):
+
+    api_key = "s3cret"
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.quiet = contextlib.redirect_stdout(io.StringIO())
+        self.quiet.__enter__()
+        self.db = Database(os.path.join(self.tmp.name, "test.db"))
+        self.db.add_station("Station 1", "+15550000001", 0, 100)
+        config = Config(os.path.join(self.tmp.name, "config.json"))
+        config.config["webhook"].update({"host": "127.0.0.1", "port": 0, "api_key": self.api_key})
+        config.config["receivers"] = ["webhook"]
+        self.manager = ReceiverManager(config, self.db)
+        self.manager.start()
+        self.receiver = self.manager.receivers["webhook"]
+        self.assertTrue(self.receiver.ready.wait(5))
+
+    def tearDown(self):
+        self.manager.stop()
+        self.db.close()
+        self.quiet.__exit__(None, None, None)
+        self.tmp.cleanup()
+
+    def request(self, head: str, body: bytes = b"") -> int:
+        """Send one raw request and return the response status"""
+        with socket.create_connection(("127.0.0.1", self.receiver.port), timeout=5) as sock:
+            sock.sendall(head.encode() + b"\r\n\r\n" + body)
+            response = b""
+            while b"\r\n" not in response:
+                chunk = sock.recv(4096)
+                if not chunk:
+                    break
+                response += chunk
+        return int(response.split(b" ", 2)[1])
+
+    def post(self, body: bytes = MESSAGE, content_length=None, authorization=None) -> int:
+        lines = ["POST /webhook HTTP/1.1", "Connection: close"]
+        lines.append(f"Content-Length: {len(body) if content_length is None else content_length}")
+        lines.append(f"Authorization: {authorization or 'Bearer ' + self.api_key}")
+        return self.request("\r\n".join(lines), body)
+
+    def test_accepts_a_message(self):
+        self.assertEqual(self.post(), 202)
+        self.assertTrue(self.manager.ingestion.flush(5))
+        self.assertEqual(self.db.get_latest_readings()[0]['value'], 5.0)
+
+    def test_bad_content_length(self):
+        for content_length in ["-5", "abc", "1_0", "+5"]:
+            with self.subTest(content_length=content_length):
+                self.assertEqual(self.post(content_length=content_length), 400)
+
+    def test_body_too_large(self):
+        self.assertEqual(self.post(content_length=self.receiver.max_body + 1), 413)
+
+    def test_wrong_api_key(self):
+        self.assertEqual(self.post(authorization="Bearer nope"), 401)
+        self.assertEqual(self.post(authorization="Bearer s3cret-but-longer"), 401)
+
+    def test_no_api_key_is_refused_on_the_network(self):
+        self.receiver.api_key = ""
+        self.assertEqual(self.post(), 202)
+        self.receiver.host = "0.0.0.0"
+        self.assertEqual(self.post(), 403)
+
+
+if __name__ == "__main__":
+    unittest.main()
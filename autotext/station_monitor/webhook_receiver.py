@@ -0,0 +1,318 @@
+"""
+Webhook Receiver - Accept readings as JSON over HTTP
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import ipaddress
+import json
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+from database import Database
+from ingestion import IngestionPipeline
+from sms_receiver import SMSReceiver
+
+# Reply to Twilio that sends nothing back to the technician
+EMPTY_TWIML = b'<?xml version="1.0" encoding="UTF-8"?><Response></Response>'
+
+class WebhookReceiver(SMSReceiver):
+    """
+    Small asyncio HTTP/1.1 server for POST /webhook. The body is one message
+    {"phone": ..., "message": ..., "id": optional}, a list of them, or
+    {"messages": [...]}. Requests are answered 202 as soon as the messages
+    are on the ingestion pipeline's receive queue; later stages store them in
+    batches, so a burst of requests never waits on the database. A full queue is
+    answered 503 with Retry-After. Without an api_key, JSON messages are
+    only accepted when the server listens on the loopback interface.
+    """
+    
+    source = "webhook"
+    
+    def __init__(self, config, db: Database, on_message_callback: Optional[Callable] = None,
+                 alert_dispatcher=None, dedup_store=None, ingestion: Optional[IngestionPipeline] = None):
+        super().__init__(config, db, on_message_callback, alert_dispatcher, dedup_store, ingestion)
+        webhook_config = config.config.get("webhook", {})
+        self.host = webhook_config.get("host", "0.0.0.0")
+        self.port = webhook_config.get("port", 5000)
+        self.api_key = webhook_config.get("api_key", "")
+        self.max_body = webhook_config.get("max_body", 1024 * 1024)
+        # path: (source the messages are counted under, handler)
+        self.routes: Dict[str, Tuple[str, Callable]] = {"/webhook": (self.source, self._handle_json)}
+        self.ready = threading.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._shutdown: Optional[asyncio.Event] = None
+        
+        self._metrics_lock = threading.Lock()
+        self.requests = 0
+    
+    def add_route(self, path: str, source: str, handler: Callable):
+        """
+        Serve another path on this server. handler(source, target, headers,
+        body) returns (status, content type, reply); its messages are
+        counted under source.
+        """
+        self.routes[path] = (source, handler)
+        self.ingestion.register(source)
+    
+    def serve_json(self, path: str = "/webhook", source: str = "webhook"):
+        """Also accept JSON messages here, e.g. when another receiver owns the port"""
+        self.add_route(path, source, self._handle_json)
+    
+    def _loopback_only(self) -> bool:
+        """Whether the server is reachable from this computer only"""
+        if self.host == "localhost":
+            return True
+        try:
+            return ipaddress.ip_address(self.host).is_loopback
+        except ValueError:
+            return False
+    
+    def stop(self):
+        """Stop accepting requests; what is already queued is still stored"""
+        self.running = False
+        if self._loop and self._shutdown:
+            self._loop.call_soon_threadsafe(self._shutdown.set)
+        super().stop()
+    
+    def _report_health(self, healthy: bool, error: str = ""):
+        for source in {source for source, _ in self.routes.values()}:
+            self.ingestion.report_health(source, healthy, error)
+    
+    def _poll_loop(self):
+        """Run the HTTP server until stopped"""
+        try:
+            asyncio.run(self._serve())
+        except Exception as e:
+            print(f"Webhook receiver error: {e}")
+            self._report_health(False, str(e))
+            self.running = False
+        finally:
+            self.ready.set()
+    
+    async def _serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._shutdown = asyncio.Event()
+        server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        # Port 0 picks a free port; report the real one
+        self.port = server.sockets[0].getsockname()[1]
+        print(f"Webhook receiver listening on port {self.port}")
+        if not self.api_key and not self._loopback_only() and any(
+                handler == self._handle_json for _, handler in self.routes.values()):
+            print(f"Refusing JSON readings on {self.host}: set webhook.api_key to accept them from the network")
+        self._report_health(True)
+        self.ready.set()
+        async with server:
+            await self._shutdown.wait()
+    
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve requests on one keep-alive connection"""
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except asyncio.LimitOverrunError:
+                    writer.write(self._response(431, {"error": "headers too large"}, False))
+                    break
+                
+                try:
+                    request_line, *header_lines = head[:-4].decode("latin-1").split("\r\n")
+                    method, target, version = request_line.split(" ", 2)
+                except ValueError:
+                    writer.write(self._response(400, {"error": "malformed request"}, False))
+                    break
+                headers = {}
+                for line in header_lines:
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                
+                if "transfer-encoding" in headers:
+                    writer.write(self._response(411, {"error": "Content-Length required"}, False))
+                    break
+                # Only plain digits: int() would also take "-5", "+5" and "1_0"
+                content_length = headers.get("content-length") or "0"
+                if not (content_length.isascii() and content_length.isdigit()):
+                    writer.write(self._response(400, {"error": "bad Content-Length"}, False))
+                    break
+                length = int(content_length)
+                if length > self.max_body:
+                    writer.write(self._response(413, {"error": "body too large"}, False))
+                    break
+                body = await reader.readexactly(length) if length else b""
+                
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                status, content_type, reply = self._handle_request(method, target, headers, body)
+                writer.write(self._response(status, reply, keep_alive, content_type))
+                if not keep_alive:
+                    break
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            try:
+                await writer.drain()
+                writer.close()
+            except ConnectionError:
+                pass
+    
+    @staticmethod
+    def _response(status: int, payload, keep_alive: bool, content_type: str = "application/json") -> bytes:
+        """Serialize a reply; payload is a dict sent as JSON, or raw bytes"""
+        reasons = {200: "OK", 202: "Accepted", 400: "Bad Request", 401: "Unauthorized",
+                   403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed",
+                   411: "Length Required", 413: "Payload Too Large",
+                   431: "Request Header Fields Too Large", 503: "Service Unavailable"}
+        body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        head = [
+            f"HTTP/1.1 {status} {reasons.get(status, '')}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {len(body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}"
+        ]
+        if status == 503:
+            head.append("Retry-After: 1")
+        return ("\r\n".join(head) + "\r\n\r\n").encode() + body
+    
+    def _handle_request(self, method: str, target: str, headers: Dict[str, str],
+                        body: bytes) -> Tuple[int, str, object]:
+        """Status, content type and reply for one request; runs on the event loop"""
+        with self._metrics_lock:
+            self.requests += 1
+        
+        path = target.split("?", 1)[0]
+        if path == "/health" and method == "GET":
+            return 200, "application/json", {"status": "ok", "queue_depth": self.ingestion.qsize()}
+        route = self.routes.get(path)
+        if route is None:
+            return 404, "application/json", {"error": "not found"}
+        if method != "POST":
+            return 405, "application/json", {"error": "use POST"}
+        source, handler = route
+        return handler(source, target, headers, body)
+    
+    def _enqueue(self, source: str, messages: List[Tuple[str, str, Optional[str]]]) -> bool:
+        """Queue messages for the pipeline, all or none. Returns False if the queue is full."""
+        # Never block the event loop; the client is told to retry instead
+        return self.ingestion.submit(source, messages, block=False)
+    
+    def _handle_json(self, source: str, target: str, headers: Dict[str, str],
+                     body: bytes) -> Tuple[int, str, object]:
+        """POST /webhook with a JSON message or batch"""
+        if not self.api_key and not self._loopback_only():
+            # Anyone on the network could inject readings
+            return 403, "application/json", {"error": "webhook.api_key must be set to accept readings"}
+        if self.api_key and not hmac.compare_digest(headers.get("authorization", "").encode("utf-8"),
+                                                    f"Bearer {self.api_key}".encode("utf-8")):
+            return 401, "application/json", {"error": "unauthorized"}
+        
+        try:
+            messages = self._parse_messages(json.loads(body))
+        except (ValueError, TypeError, KeyError) as e:
+            return 400, "application/json", {"error": f"invalid payload: {e}"}
+        if len(messages) > self.ingestion.max_queue:
+            # Would never fit in the queue; retrying cannot help
+            return 413, "application/json", {"error": f"at most {self.ingestion.max_queue} messages per request"}
+        
+        if not self._enqueue(source, messages):
+            return 503, "application/json", {"error": "ingestion queue full"}
+        return 202, "application/json", {"accepted": len(messages)}
+    
+    @staticmethod
+    def _parse_messages(data) -> List[Tuple[str, str, Optional[str]]]:
+        """(phone, message, id) for each message in a single or batched payload"""
+        if isinstance(data, dict) and "messages" in data:
+            data = data["messages"]
+        items = data if isinstance(data, list) else [data]
+        
+        messages = []
+        for item in items:
+            phone = str(item["phone"]).strip()
+            text = str(item["message"]).strip()
+            if not phone or not text:
+                raise ValueError("phone and message are required")
+            message_id = item.get("id")
+            messages.append((phone, text, str(message_id) if message_id is not None else None))
+        return messages
+    
+    def get_metrics(self) -> Dict:
+        """Requests served, and the ingestion counters of the sources served here"""
+        ingestion = self.ingestion.get_metrics()
+        served = [ingestion['sources'][source] for source in {source for source, _ in self.routes.values()}
+                  if source in ingestion['sources']]
+        with self._metrics_lock:
+            requests = self.requests
+        return {
+            'requests': requests,
+            'accepted': sum(source['received'] for source in served),
+            'rejected': sum(source['rejected'] for source in served),
+            'processed': sum(source['processed'] for source in served),
+            'queue_depth': ingestion['queue_depth']
+        }
+
+
+class TwilioReceiver(WebhookReceiver):
+    """
+    Inbound SMS from Twilio. Point the number's "A message comes in" webhook
+    at http(s)://<host>:<port>/twilio/sms (HTTP POST). Requests must carry a
+    valid X-Twilio-Signature; the reply is empty TwiML, so Twilio sends no
+    auto-reply. Messages go through the same ingestion pipeline as the JSON
+    webhook.
+    """
+    
+    source = "twilio"
+    
+    def __init__(self, config, db: Database, on_message_callback: Optional[Callable] = None,
+                 alert_dispatcher=None, dedup_store=None, ingestion: Optional[IngestionPipeline] = None):
+        super().__init__(config, db, on_message_callback, alert_dispatcher, dedup_store, ingestion)
+        twilio_config = config.config.get("twilio", {})
+        self.auth_token = twilio_config.get("auth_token", "")
+        # The URL as entered in the Twilio console; it is part of the signature
+        self.public_url = twilio_config.get("webhook_url", "")
+        self.validate_signature = twilio_config.get("validate_signature", True)
+        path = twilio_config.get("webhook_path", "/twilio/sms")
+        self.routes = {}
+        self.add_route(path, self.source, self._handle_twilio)
+    
+    @staticmethod
+    def compute_signature(auth_token: str, url: str, params: List[Tuple[str, str]]) -> str:
+        """X-Twilio-Signature: base64 HMAC-SHA1 of the URL and the sorted POST parameters"""
+        data = url + "".join(name + value for name, value in sorted(params))
+        digest = hmac.new(auth_token.encode("utf-8"), data.encode("utf-8"), hashlib.sha1).digest()
+        return base64.b64encode(digest).decode("ascii")
+    
+    def _signature_valid(self, target: str, headers: Dict[str, str], params: List[Tuple[str, str]]) -> bool:
+        signature = headers.get("x-twilio-signature", "")
+        if not signature or not self.auth_token:
+            return False
+        if self.public_url:
+            urls = [self.public_url]
+        else:
+            # Rebuild the URL Twilio called, as seen through any proxy
+            scheme = headers.get("x-forwarded-proto", "http")
+            urls = [f"{scheme}://{headers.get('host', '')}{target}"]
+        return any(hmac.compare_digest(self.compute_signature(self.auth_token, url, params), signature)
+                   for url in urls)
+    
+    def _handle_twilio(self, source: str, target: str, headers: Dict[str, str],
+                       body: bytes) -> Tuple[int, str, object]:
+        """POST from Twilio with a form-encoded inbound message"""
+        try:
+            params = parse_qsl(body.decode("utf-8"), keep_blank_values=True)
+        except UnicodeDecodeError:
+            return 400, "application/json", {"error": "invalid form body"}
+        
+        if self.validate_signature and not self._signature_valid(target, headers, params):
+            return 403, "application/json", {"error": "invalid signature"}
+        
+        form = dict(params)
+        phone = form.get("From", "").strip()
+        text = form.get("Body", "").strip()
+        if not phone or not text:
+            return 400, "application/json", {"error": "From and Body are required"}
+        
+        if not self._enqueue(source, [(phone, text, form.get("MessageSid") or None)]):
+            return 503, "application/json", {"error": "ingestion queue full"}
+        return 200, "text/xml", EMPTY_TWIML